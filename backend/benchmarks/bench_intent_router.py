@@ -0,0 +1,119 @@
+"""
+Benchmark the action node's intent and entity extraction: the compiled
+single-pass router against the per-keyword substring scans and uncompiled
+regex searches it replaced.
+
+Both extractors run over a corpus of support messages (support_messages.txt,
+one per line, or --corpus) and must agree on every message before timings
+are reported:
+
+    python benchmarks/bench_intent_router.py --repeat 2000
+"""
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from graph.intent_router import route_message  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "support_messages.txt")
+
+
+def keyword_scan(message: str):
+    """The extraction action_node used to do inline, rebuilt for comparison."""
+    message = message.lower()
+    intents = set()
+    number = None
+    customer_identifier = None
+
+    if any(keyword in message for keyword in ["order", "status", "tracking", "shipment", "delivery", "shipped"]):
+        intents.add("order")
+        order_match = re.search(r'#?(\d+)', message)
+        if order_match:
+            number = order_match.group(1)
+    if any(phrase in message for phrase in ["my order", "my orders", "order status"]):
+        intents.add("my_order")
+
+    if any(keyword in message for keyword in ["history", "orders", "past orders", "previous orders", "order list"]):
+        intents.add("order_history")
+        customer_patterns = [
+            r'customer(\d+)',
+            r'customer\s+(\d+)',
+            r'for\s+([a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+)',
+            r'user\s+id[:\s]+([a-zA-Z0-9-]+)',
+        ]
+        for pattern in customer_patterns:
+            match = re.search(pattern, message)
+            if match:
+                if '@' in match.group(1):
+                    customer_identifier = match.group(1)
+                else:
+                    customer_identifier = f"customer{match.group(1)}"
+                break
+
+    if any(keyword in message for keyword in ["pay", "payment", "invoice", "bill", "charge", "transaction"]):
+        intents.add("payment")
+        invoice_match = re.search(r'#?(\d+)', message)
+        if invoice_match:
+            number = invoice_match.group(1)
+
+    if any(keyword in message for keyword in ["customer", "account", "profile", "information"]):
+        intents.add("customer_info")
+    for keyword in ("cancel", "subscription", "refund"):
+        if keyword in message:
+            intents.add(keyword)
+
+    return frozenset(intents), number, customer_identifier
+
+
+def router(message: str):
+    routed = route_message(message)
+    return routed.intents, routed.number, routed.customer_identifier
+
+
+def time_extractor(extract: Callable[[str], object], messages: List[str], repeat: int, rounds: int) -> List[float]:
+    """Microseconds per message for each round of `repeat` passes over the corpus."""
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for message in messages:
+                extract(message)
+        samples.append((time.perf_counter() - start) / (repeat * len(messages)) * 1e6)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="file with one support message per line")
+    parser.add_argument("--repeat", type=int, default=1000, help="passes over the corpus per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as corpus:
+        messages = [line.strip() for line in corpus if line.strip()]
+
+    mismatches = [message for message in messages if keyword_scan(message) != router(message)]
+    if mismatches:
+        for message in mismatches:
+            print(f"MISMATCH {message!r}: scan={keyword_scan(message)} router={router(message)}")
+        sys.exit(1)
+
+    print(f"{len(messages)} messages, {args.repeat} passes x {args.rounds} rounds; extractors agree on every message\n")
+    print(f"{'extractor':<14}{'median us/msg':>15}{'best us/msg':>13}")
+    results = {}
+    for name, extract in (("keyword_scan", keyword_scan), ("router", router)):
+        samples = time_extractor(extract, messages, args.repeat, args.rounds)
+        results[name] = statistics.median(samples)
+        print(f"{name:<14}{results[name]:>15.2f}{min(samples):>13.2f}")
+    print(f"\nspeedup: {results['keyword_scan'] / results['router']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark recall and search latency of the conversation collection's storage
+configurations: float32 in RAM, int8 scalar quantization (with and without
+on-disk originals), product quantization and a larger HNSW graph.
+
+Each configuration is built by QdrantService exactly as initialize_collections
+would create it, loaded with the same synthetic CLIP-sized clustered vectors,
+and searched with the service's search parameters. Recall@k is measured
+against an exact (brute force) search. Needs a Qdrant server; temporary
+collections are dropped afterwards:
+
+    QDRANT_URL=http://localhost:6333 python benchmarks/bench_qdrant_storage.py --points 50000
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from qdrant_client import AsyncQdrantClient  # noqa: E402
+from qdrant_client.models import (  # noqa: E402
+    Distance, HnswConfigDiff, PointStruct, SearchParams, VectorParams,
+)
+
+from services.qdrant_client import QdrantService  # noqa: E402
+
+CONFIGURATIONS = {
+    "float32":             {},
+    "scalar_int8":         {"quantization": "scalar"},
+    "scalar_int8_on_disk": {"quantization": "scalar", "vectors_on_disk": True, "payload_on_disk": True},
+    "product_x16":         {"quantization": "product"},
+    "float32_m32_ef200":   {"hnsw_m": 32, "hnsw_ef_construct": 200},
+}
+
+COMPRESSION = {"x4": 4, "x8": 8, "x16": 16, "x32": 32, "x64": 64}
+
+
+def synthetic_embeddings(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Unit vectors scattered around cluster centers, like embeddings of similar messages."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(0, clusters, count)] + rng.normal(scale=0.6, size=(count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def vector_ram_mb(service: QdrantService, points: int, dim: int) -> float:
+    """Approximate RAM held by vectors: originals unless on disk, plus the quantized copy."""
+    ram = 0 if service.vectors_on_disk else points * dim * 4
+    if service.quantization == "scalar":
+        ram += points * dim
+    elif service.quantization == "product":
+        ram += points * dim * 4 / COMPRESSION[service.product_compression.value]
+    return ram / 1024 / 1024
+
+
+async def build_collection(client: AsyncQdrantClient, service: QdrantService, vectors: np.ndarray, batch: int,
+                           local: bool):
+    await client.create_collection(
+        collection_name=service.collection_name,
+        vectors_config=VectorParams(size=vectors.shape[1], distance=Distance.COSINE, on_disk=service.vectors_on_disk),
+        hnsw_config=HnswConfigDiff(m=service.hnsw_m, ef_construct=service.hnsw_ef_construct),
+        quantization_config=service.quantization_config(),
+        on_disk_payload=service.payload_on_disk,
+    )
+    for start in range(0, len(vectors), batch):
+        await client.upsert(
+            collection_name=service.collection_name,
+            points=[
+                PointStruct(id=i, vector=vectors[i].tolist(), payload={"type": "conversation"})
+                for i in range(start, min(start + batch, len(vectors)))
+            ],
+        )
+
+    # Wait for the HNSW index (and quantized vectors) to be built; the local client has no index
+    while not local:
+        info = await client.get_collection(service.collection_name)
+        if info.status == "green" and (info.indexed_vectors_count or 0) >= len(vectors) * 0.99:
+            break
+        await asyncio.sleep(1)
+
+
+async def search(client: AsyncQdrantClient, collection: str, queries: np.ndarray, limit: int,
+                 params) -> Tuple[List[List[int]], List[float]]:
+    ids, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = await client.query_points(
+            collection_name=collection, query=query.tolist(), limit=limit, search_params=params,
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append([point.id for point in result.points])
+    return ids, latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default=os.getenv("QDRANT_URL", "http://localhost:6333"),
+                        help='Qdrant URL, or ":memory:" for a smoke run on the local client')
+    parser.add_argument("--points", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--configs", default=",".join(CONFIGURATIONS))
+    args = parser.parse_args()
+
+    if args.url == ":memory:":
+        client = AsyncQdrantClient(location=":memory:")
+    else:
+        client = AsyncQdrantClient(url=args.url, api_key=os.getenv("QDRANT_API_KEY"), timeout=300)
+
+    vectors = synthetic_embeddings(args.points, args.dim, args.clusters, seed=1)
+    queries = synthetic_embeddings(args.queries, args.dim, args.clusters, seed=2)
+    exact_ids = None
+
+    try:
+        for name in args.configs.split(","):
+            service = QdrantService()
+            for attribute, value in CONFIGURATIONS[name].items():
+                setattr(service, attribute, value)
+            service.collection_name = f"bench_storage_{name}"
+            await client.delete_collection(service.collection_name)
+
+            start = time.perf_counter()
+            await build_collection(client, service, vectors, args.batch, local=args.url == ":memory:")
+            build_s = time.perf_counter() - start
+
+            if exact_ids is None:
+                exact_ids, _ = await search(client, service.collection_name, queries, args.limit, SearchParams(exact=True))
+
+            # Warm up, then measure with the parameters the service searches with
+            await search(client, service.collection_name, queries[:20], args.limit, service.search_params())
+            ids, latencies = await search(client, service.collection_name, queries, args.limit, service.search_params())
+            recall = statistics.mean(len(set(found) & set(truth)) / args.limit for found, truth in zip(ids, exact_ids))
+
+            latencies.sort()
+            print(
+                f"{name:<22} recall@{args.limit}={recall:.3f} p50={statistics.median(latencies):7.2f}ms "
+                f"p95={latencies[int(len(latencies) * 0.95) - 1]:7.2f}ms "
+                f"vector_ram~{vector_ram_mb(service, args.points, args.dim):7.1f}MB build={build_s:6.1f}s",
+                flush=True,
+            )
+            await client.delete_collection(service.collection_name)
+    finally:
+        await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""
+Benchmark concurrent payment intent creation against a local fake Stripe API
+(tests/fake_stripe.py) with a fixed per-request latency:
+
+- blocking: the synchronous SDK called from the event loop, as StripeService
+  used to; every call stalls the loop for a full round-trip
+- executor: the synchronous SDK on the default thread pool
+- async: StripeService's async client on one pooled httpx connection pool
+
+Reports wall time, throughput and the TCP connections each mode opened:
+
+    python benchmarks/bench_stripe_client.py --requests 50 --latency-ms 50
+"""
+
+import argparse
+import asyncio
+import functools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stripe  # noqa: E402
+
+from services.stripe_client import StripeService  # noqa: E402
+from tests.fake_stripe import FakeStripeServer  # noqa: E402
+
+API_KEY = "sk_test_fake"
+PARAMS = {"amount": 1000, "currency": "usd", "metadata": {"invoice_number": "123"}}
+
+
+async def run_blocking(server: FakeStripeServer, requests: int):
+    async def create():
+        return stripe.PaymentIntent.create(api_key=API_KEY, **PARAMS)
+    await asyncio.gather(*(create() for _ in range(requests)))
+
+
+async def run_executor(server: FakeStripeServer, requests: int):
+    loop = asyncio.get_running_loop()
+    create = functools.partial(stripe.PaymentIntent.create, api_key=API_KEY, **PARAMS)
+    await asyncio.gather(*(loop.run_in_executor(None, create) for _ in range(requests)))
+
+
+async def run_async(server: FakeStripeServer, requests: int):
+    service = StripeService()
+    service.api_key = API_KEY
+    service.api_base = server.url
+    try:
+        await asyncio.gather(*(service.create_payment_intent(**PARAMS) for _ in range(requests)))
+    finally:
+        await service.close()
+
+
+MODES = {"blocking": run_blocking, "executor": run_executor, "async": run_async}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50, help="concurrent payment intents per mode")
+    parser.add_argument("--latency-ms", type=float, default=50, help="fake server latency per request")
+    args = parser.parse_args()
+
+    print(f"{args.requests} concurrent payment intents, {args.latency_ms:g}ms server latency\n")
+    print(f"{'mode':<10}{'wall s':>9}{'req/s':>10}{'connections':>13}")
+    for name, run in MODES.items():
+        with FakeStripeServer(latency_seconds=args.latency_ms / 1000) as server:
+            stripe.api_base = server.url
+            start = time.perf_counter()
+            asyncio.run(run(server, args.requests))
+            elapsed = time.perf_counter() - start
+            print(f"{name:<10}{elapsed:>9.3f}{args.requests / elapsed:>10.1f}{server.connections:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 
 from typing import Dict, Any
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
 from langgraph.checkpoint.memory import MemorySaver
 
 from .nodes import ingest_node, sentiment_node, action_node, policy_node, memory_node
+from .state import CustomerServiceState
 
 
 def should_continue(state: Dict[str, Any]) -> str:
@@ -13,11 +14,21 @@ def should_continue(state: Dict[str, Any]) -> str:
     return "continue"
 
 
-def build_customer_service_graph():
-    """Build the LangGraph workflow for customer service."""
+def build_customer_service_graph(checkpointer=None):
+    """
+    Build the LangGraph workflow for customer service.
+    
+    ingest (I/O-bound retrieval), sentiment (CPU-bound inference) and action
+    (tool calls) only depend on the request, so they run as parallel branches
+    that join before policy.
+    
+    Args:
+        checkpointer: Checkpoint saver for conversation persistence
+            (see graph.checkpointer); defaults to an in-process MemorySaver
+    """
     
     # Create the state graph
-    workflow = StateGraph(dict)
+    workflow = StateGraph(CustomerServiceState)
     
     # Add nodes
     workflow.add_node("ingest", ingest_node)
@@ -26,13 +37,13 @@ def build_customer_service_graph():
     workflow.add_node("policy", policy_node)
     workflow.add_node("memory", memory_node)
     
-    # Set entry point
-    workflow.set_entry_point("ingest")
+    # Fan out from the entry point
+    workflow.add_edge(START, "ingest")
+    workflow.add_edge(START, "sentiment")
+    workflow.add_edge(START, "action")
     
-    # Add edges
-    workflow.add_edge("ingest", "sentiment")
-    workflow.add_edge("sentiment", "action")
-    workflow.add_edge("action", "policy")
+    # Join: policy waits for all three branches
+    workflow.add_edge(["ingest", "sentiment", "action"], "policy")
     
     # Add conditional edge for the policy node
     workflow.add_conditional_edges(
@@ -48,9 +59,10 @@ def build_customer_service_graph():
     workflow.add_edge("memory", END)
     
     # Add memory for conversation persistence
-    memory = MemorySaver()
+    if checkpointer is None:
+        checkpointer = MemorySaver()
     
     # Compile the graph
-    graph = workflow.compile(checkpointer=memory)
+    graph = workflow.compile(checkpointer=checkpointer)
     
     return graph
@@ -0,0 +1,123 @@
+"""
+Intent and entity extraction for the action node.
+
+All keywords are compiled into one regex, factored as a prefix trie so each
+position of the message is rejected after a character or two, and wrapped in
+a zero-width lookahead so a single scan reports the longest keyword starting
+at every position, overlapping ones included. Each keyword maps to the
+intents of every keyword it contains, which keeps the result identical to
+testing `keyword in message` for each keyword separately.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+# Intent -> keywords that trigger it (matched as substrings of the lowercased message)
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    "order": ["order", "status", "tracking", "shipment", "delivery", "shipped"],
+    "my_order": ["my order", "my orders", "order status"],
+    "order_history": ["history", "orders", "past orders", "previous orders", "order list"],
+    "payment": ["pay", "payment", "invoice", "bill", "charge", "transaction"],
+    "customer_info": ["customer", "account", "profile", "information"],
+    "cancel": ["cancel"],
+    "subscription": ["subscription"],
+    "refund": ["refund"],
+}
+
+# Order or invoice number, shared by order lookups and payments. The first run
+# of digits, with or without a leading '#'
+NUMBER_PATTERN = re.compile(r"\d+")
+
+# Customer identifiers for order history requests, in priority order
+CUSTOMER_PATTERNS = [
+    re.compile(r"customer(\d+)"),  # customer123, customer1, etc.
+    re.compile(r"customer\s+(\d+)"),  # customer 123, customer 1, etc.
+    re.compile(r"for\s+([a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+)"),  # email addresses
+    re.compile(r"user\s+id[:\s]+([a-zA-Z0-9-]+)"),  # user id: xxx
+]
+
+
+def _trie_pattern(keywords: List[str]) -> str:
+    """Regex matching any of the keywords, factored by shared prefixes.
+
+    Optional suffixes are greedy, so the longest keyword at a position wins;
+    shorter keywords starting at the same position are its prefixes.
+    """
+    trie: Dict[str, Any] = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+def _compile_keywords(intent_keywords: Dict[str, List[str]]) -> Tuple["re.Pattern", Dict[str, FrozenSet[str]]]:
+    """Build the keyword matcher and the intents implied by each keyword it can report."""
+    keywords = {keyword for words in intent_keywords.values() for keyword in words}
+    matcher = re.compile("(?=(" + _trie_pattern(sorted(keywords)) + "))")
+
+    implied = {
+        keyword: frozenset(
+            intent
+            for intent, words in intent_keywords.items()
+            if any(word in keyword for word in words)
+        )
+        for keyword in keywords
+    }
+    return matcher, implied
+
+
+KEYWORD_MATCHER, KEYWORD_INTENTS = _compile_keywords(INTENT_KEYWORDS)
+
+
+@dataclass(frozen=True)
+class RoutedMessage:
+    """Intents and entities extracted from one (lowercased) message."""
+
+    intents: FrozenSet[str]
+    number: Optional[str] = None
+    customer_identifier: Optional[str] = None
+
+    def has(self, intent: str) -> bool:
+        return intent in self.intents
+
+
+def extract_customer_identifier(message: str) -> Optional[str]:
+    """Customer an order history request names: an email, or a customerNNN id."""
+    for pattern in CUSTOMER_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            if "@" in match.group(1):
+                return match.group(1)  # email
+            return f"customer{match.group(1)}"  # customer123 format
+    return None
+
+
+def route_message(message: str) -> RoutedMessage:
+    """Scan a message once for intents, then extract the entities those intents need."""
+    message = message.lower()
+
+    intents = set()
+    for keyword in KEYWORD_MATCHER.findall(message):
+        intents |= KEYWORD_INTENTS[keyword]
+
+    number = None
+    if "order" in intents or "payment" in intents:
+        number_match = NUMBER_PATTERN.search(message)
+        number = number_match.group() if number_match else None
+
+    customer_identifier = None
+    if "order_history" in intents:
+        customer_identifier = extract_customer_identifier(message)
+
+    return RoutedMessage(frozenset(intents), number, customer_identifier)
@@ -1,16 +1,18 @@
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Awaitable, Optional, Tuple
 import asyncio
 import os
-import re
 from pathlib import Path
 
-from services.qdrant_client import QdrantService
-from services.embeddings import EmbeddingService
-from services.stripe_client import StripeService
+from services.qdrant_client import qdrant_service
+from services.embeddings import embedding_service
+from services.stripe_client import stripe_service
 from services.mcp_client import mcp_client
+from services.sentiment import sentiment_service
+from services.analytics import sentiment_analytics
+from graph.intent_router import RoutedMessage, route_message
 import openai
-from transformers import pipeline
+from langgraph.config import get_stream_writer
 from dotenv import load_dotenv
 
 # Load environment variables from .env file in project root
@@ -19,14 +21,17 @@ load_dotenv(dotenv_path=env_path)
 
 logger = logging.getLogger(__name__)
 
-# Initialize services
-qdrant_service = QdrantService()
-embedding_service = EmbeddingService()
-stripe_service = StripeService()
-
 # Initialize OpenAI client lazily
 openai_client = None
-sentiment_analyzer = None
+
+
+def get_token_writer():
+    """Writer for streamed response tokens; a no-op outside a streaming graph run."""
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        return lambda content: None
+    return lambda content: writer({"type": "token", "content": content})
 
 
 async def get_openai_client():
@@ -47,72 +52,103 @@ async def get_openai_client():
     return openai_client
 
 
-async def get_sentiment_analyzer():
-    """Lazy initialization of sentiment analyzer."""
-    global sentiment_analyzer
-    if sentiment_analyzer is None:
-        sentiment_analyzer = pipeline(
-            "sentiment-analysis",
-            model="cardiffnlp/twitter-roberta-base-sentiment-latest",
-            return_all_scores=True,
-        )
-    return sentiment_analyzer
+# Per-source timeouts for the ingest retrieval stage; a slow source degrades to empty context
+INGEST_RETRIEVAL_TIMEOUT_SECONDS = float(os.getenv("INGEST_RETRIEVAL_TIMEOUT_SECONDS", "2.0"))
+INGEST_STORE_TIMEOUT_SECONDS = float(os.getenv("INGEST_STORE_TIMEOUT_SECONDS", "5.0"))
+
+
+async def _run_ingest_source(source: str, coro, timeout: float, default: Any):
+    """Run one ingest source with a timeout, returning (result, error) instead of raising."""
+    try:
+        return await asyncio.wait_for(coro, timeout=timeout), None
+    except asyncio.TimeoutError:
+        logger.warning(f"Ingest source '{source}' timed out after {timeout}s")
+        return default, f"{source} timed out"
+    except Exception as e:
+        logger.error(f"Ingest source '{source}' failed: {e}")
+        return default, f"{source} failed: {str(e)}"
 
 
 async def ingest_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    """Ingest and store the interaction in Qdrant for future retrieval."""
+    """Ingest and store the interaction in Qdrant for future retrieval; returns the retrieved context."""
     logger.info(f"Ingest node processing for user: {state['user_id']}")
     
-    try:
-        # Generate embedding for the user message
-        message_embedding = await embedding_service.get_text_embedding(state["message"])
-        
-        # Store in Qdrant with metadata
-        await qdrant_service.store_conversation(
+    session_id = state.get("session_id", f"session_{state['user_id']}")
+    
+    # The embedding is only needed by the write and the similarity search,
+    # so the history scrolls start immediately alongside it
+    embedding_task = asyncio.ensure_future(
+        embedding_service.get_text_embedding(state["message"])
+    )
+    
+    async def store():
+        message_embedding = await asyncio.shield(embedding_task)
+        return await qdrant_service.store_conversation(
             user_id=state["user_id"],
             message=state["message"],
-            response="",  # Will be updated later
+            response="",  # Set by memory_node once the response is final
             sentiment=state.get("sentiment", {}),
             embedding=message_embedding,
             session_id=state.get("session_id"),
+            wait=False,
         )
-        
-        # Retrieve actual conversation history for this session
-        # This gives us the chronological conversation history for the current session
-        session_conversations = await qdrant_service.get_session_conversations(
-            session_id=state.get("session_id", f"session_{state['user_id']}"),
-            limit=10  # Get last 10 conversations in this session for context
-        )
-        
-        # Also get recent conversations from this user (across sessions) for broader context
-        user_conversations = await qdrant_service.get_user_conversations(
-            user_id=state["user_id"],
-            limit=5  # Get last 5 conversations from user across all sessions
-        )
-        
-        # Also get semantically similar conversations for additional context
-        similar_conversations = await qdrant_service.search_similar(
+    
+    async def similar():
+        message_embedding = await asyncio.shield(embedding_task)
+        return await qdrant_service.search_similar(
             query_embedding=message_embedding,
             limit=3,
             user_filter=state["user_id"],
         )
-        
-        # Prioritize session conversations, then user conversations
-        state["conversation_history"] = session_conversations
-        state["user_conversations"] = user_conversations
-        state["similar_conversations"] = similar_conversations
-        state["actions_taken"].append("stored_interaction")
-        
-        logger.info(f"Successfully ingested interaction for user: {state['user_id']}, session: {state.get('session_id')}, retrieved {len(session_conversations)} session conversations")
-        
-    except Exception as e:
-        logger.error(f"Error in ingest node: {e}")
-        state["actions_taken"].append(f"ingest_error: {str(e)}")
-        state["conversation_history"] = []
-        state["user_conversations"] = []
-        state["similar_conversations"] = []
     
-    return state
+    # Write and reads run concurrently; each source fails or times out independently
+    (
+        (point_id, store_error),
+        (session_conversations, session_error),
+        (user_conversations, user_error),
+        (similar_conversations, similar_error),
+    ) = await asyncio.gather(
+        _run_ingest_source("store", store(), INGEST_STORE_TIMEOUT_SECONDS, None),
+        # Chronological conversation history for the current session (last 10)
+        _run_ingest_source(
+            "session_history",
+            qdrant_service.get_session_conversations(session_id=session_id, limit=10),
+            INGEST_RETRIEVAL_TIMEOUT_SECONDS,
+            [],
+        ),
+        # Recent conversations from this user across sessions (last 5)
+        _run_ingest_source(
+            "user_history",
+            qdrant_service.get_user_conversations(user_id=state["user_id"], limit=5),
+            INGEST_RETRIEVAL_TIMEOUT_SECONDS,
+            [],
+        ),
+        # Semantically similar conversations for additional context
+        _run_ingest_source("similar", similar(), INGEST_RETRIEVAL_TIMEOUT_SECONDS, []),
+    )
+    
+    if not embedding_task.done():
+        embedding_task.cancel()
+    
+    actions = []
+    if store_error is None:
+        actions.append("stored_interaction")
+    
+    for error in (store_error, session_error, user_error, similar_error):
+        if error:
+            actions.append(f"ingest_error: {error}")
+    
+    logger.info(f"Ingested interaction for user: {state['user_id']}, session: {state.get('session_id')}, retrieved {len(session_conversations)} session conversations")
+    
+    return {
+        # memory_node writes the final response onto this point
+        "point_id": point_id,
+        # Prioritize session conversations, then user conversations
+        "conversation_history": session_conversations,
+        "user_conversations": user_conversations,
+        "similar_conversations": similar_conversations,
+        "actions_taken": actions,
+    }
 
 
 async def sentiment_node(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -120,244 +156,273 @@ async def sentiment_node(state: Dict[str, Any]) -> Dict[str, Any]:
     logger.info(f"Sentiment analysis for user: {state['user_id']}")
     
     try:
-        analyzer = await get_sentiment_analyzer()
-        sentiment_scores = analyzer(state["message"])
-        
-        # Convert to a more readable format
-        sentiment_dict = {}
-        for score in sentiment_scores[0]:  # First (and only) result
-            sentiment_dict[score["label"]] = score["score"]
-        
-        state["sentiment"] = sentiment_dict
-        state["actions_taken"].append("sentiment_analyzed")
+        # Batched with concurrent chats on the sentiment inference pool
+        sentiment_dict = await sentiment_service.analyze(state["message"])
         
         logger.info(f"Sentiment analysis completed: {sentiment_dict}")
         
+        return {"sentiment": sentiment_dict, "actions_taken": ["sentiment_analyzed"]}
+        
     except Exception as e:
         logger.error(f"Error in sentiment node: {e}")
-        state["sentiment"] = {"error": str(e)}
-        state["actions_taken"].append(f"sentiment_error: {str(e)}")
-    
-    return state
+        return {"sentiment": {"error": str(e)}, "actions_taken": [f"sentiment_error: {str(e)}"]}
 
 
-async def action_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    """Handle business transactions and actions (e.g., Stripe payments, order lookups)."""
-    logger.info(f"Action node processing for user: {state['user_id']}")
+def parse_action_timeouts(value: str) -> Dict[str, float]:
+    """Parse an "action=seconds,action=seconds" override string, skipping malformed entries."""
+    timeouts = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, seconds = item.partition("=")
+        try:
+            timeout = float(seconds)
+        except ValueError:
+            timeout = 0
+        if not name.strip() or timeout <= 0:
+            logger.warning(f"Ignoring invalid ACTION_TIMEOUTS entry: {item.strip()!r}")
+            continue
+        timeouts[name.strip()] = timeout
+    return timeouts
+
+
+# Independent actions of a turn run concurrently, each with its own timeout
+ACTION_TIMEOUT_SECONDS = float(os.getenv("ACTION_TIMEOUT_SECONDS", "5.0"))
+# Per-action overrides in seconds, e.g. payment=10,order_history=3
+ACTION_TIMEOUTS = parse_action_timeouts(os.getenv("ACTION_TIMEOUTS", ""))
+
+# Users with these roles can access any customer's data
+AUTHORIZED_AGENT_ROLES = [
+    "customer_service_agent",
+    "support_agent",
+    "admin",
+    "cs_agent",
+    "agent",
+]
+
+# An action's outcome: state updates and entries for actions_taken
+ActionResult = Tuple[Dict[str, Any], List[str]]
+
+
+async def _note_action(*actions: str) -> ActionResult:
+    """Action that only records its entries, for intents with nothing to execute."""
+    return {}, list(actions)
+
+
+async def _order_lookup_action(order_number: str) -> ActionResult:
+    """Fetch order details from the database via MCP."""
+    logger.info(f"Detected order query for order #{order_number}")
     
-    message = state["message"].lower()
+    order_result = await mcp_client.get_order_details(order_number)
     
-    try:
-        # Initialize MCP client if needed
-        if not mcp_client.client:
-            await mcp_client.initialize()
+    if order_result.get("success") and order_result.get("result", {}).get("success"):
+        logger.info(f"Successfully retrieved order data for #{order_number}")
+        return {"order_data": order_result["result"]}, [f"order_lookup_success: {order_number}"]
+    
+    error_msg = order_result.get("result", {}).get("error", "Unknown error")
+    logger.warning(f"Order lookup failed for #{order_number}: {error_msg}")
+    return {"order_lookup_error": error_msg}, [f"order_lookup_failed: {order_number} - {error_msg}"]
+
+
+async def _order_history_action(state: Dict[str, Any], customer_identifier: Optional[str]) -> ActionResult:
+    """Fetch order history for the named customer, or the requesting user's own history."""
+    # Authorization check: Ensure user can only access their own data
+    requesting_user = state.get("user_id", "").lower()
+    is_authorized_agent = any(role in requesting_user for role in AUTHORIZED_AGENT_ROLES)
+    
+    if customer_identifier:
+        # Check if user is requesting their own data or if they're an authorized agent
+        is_own_data = False
         
-        # Check for order-related queries
-        order_keywords = ["order", "status", "tracking", "shipment", "delivery", "shipped"]
-        if any(keyword in message for keyword in order_keywords):
-            # Extract order number from message
-            order_match = re.search(r'#?(\d+)', message)
-            
-            if order_match:
-                order_number = order_match.group(1)
-                logger.info(f"Detected order query for order #{order_number}")
-                
-                # Fetch order details from database via MCP
-                order_result = await mcp_client.get_order_details(order_number)
-                
-                if order_result.get("success") and order_result.get("result", {}).get("success"):
-                    order_data = order_result["result"]
-                    state["order_data"] = order_data
-                    state["actions_taken"].append(f"order_lookup_success: {order_number}")
-                    logger.info(f"Successfully retrieved order data for #{order_number}")
-                else:
-                    error_msg = order_result.get("result", {}).get("error", "Unknown error")
-                    state["order_lookup_error"] = error_msg
-                    state["actions_taken"].append(f"order_lookup_failed: {order_number} - {error_msg}")
-                    logger.warning(f"Order lookup failed for #{order_number}: {error_msg}")
-            else:
-                # Check if user is asking about "my order" or similar without specific number
-                if any(phrase in message for phrase in ["my order", "my orders", "order status"]):
-                    state["actions_taken"].append("order_query_without_number")
-                    logger.info("User asking about orders but no order number provided")
+        if customer_identifier == requesting_user:
+            is_own_data = True
+        elif customer_identifier.startswith("customer") and customer_identifier.replace("customer", "") in requesting_user:
+            is_own_data = True
+        elif "@" in customer_identifier and customer_identifier == requesting_user:
+            is_own_data = True
         
-        # Check for order history queries (e.g., "show me order history for customer123")
-        history_keywords = ["history", "orders", "past orders", "previous orders", "order list"]
-        if any(keyword in message for keyword in history_keywords):
-            # Look for customer identifier in the message
-            customer_patterns = [
-                r'customer(\d+)',  # customer123, customer1, etc.
-                r'customer\s+(\d+)',  # customer 123, customer 1, etc.
-                r'for\s+([a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+)',  # email addresses
-                r'user\s+id[:\s]+([a-zA-Z0-9-]+)',  # user id: xxx
-            ]
-            
-            customer_identifier = None
-            for pattern in customer_patterns:
-                match = re.search(pattern, message)
-                if match:
-                    if '@' in match.group(1):
-                        customer_identifier = match.group(1)  # email
-                    else:
-                        customer_identifier = f"customer{match.group(1)}"  # customer123 format
-                    break
-            
-            # Authorization check: Ensure user can only access their own data
-            requesting_user = state.get("user_id", "").lower()
-            
-            # Define authorized roles that can access any customer's data
-            authorized_agent_users = [
-                "customer_service_agent",
-                "support_agent", 
-                "admin",
-                "cs_agent",
-                "agent"
-            ]
-            
-            is_authorized_agent = any(role in requesting_user for role in authorized_agent_users)
+        # Allow access only if it's own data or user is an authorized agent
+        if not (is_own_data or is_authorized_agent):
+            logger.warning(f"SECURITY: Unauthorized access attempt - User {requesting_user} tried to access order history for {customer_identifier}")
+            return {
+                "unauthorized_access_attempt": {
+                    "requested_customer": customer_identifier,
+                    "requesting_user": requesting_user,
+                    "reason": "User attempted to access another customer's order history"
+                }
+            }, [f"unauthorized_access_blocked: {requesting_user} tried to access {customer_identifier}"]
+        
+        logger.info(f"Authorized order history request for customer: {customer_identifier} by user: {requesting_user}")
+        
+        # Resolve the customer and fetch their order history in one MCP call
+        history_result = await mcp_client.get_customer_with_orders(customer_identifier, limit=10)
+        
+        if history_result.get("success") and history_result.get("result", {}).get("success"):
+            customer_info = history_result["result"]["customer"]
+            orders = history_result["result"]["orders"]
             
-            if customer_identifier:
-                # Check if user is requesting their own data or if they're an authorized agent
-                is_own_data = False
-                
-                if customer_identifier == requesting_user:
-                    is_own_data = True
-                elif customer_identifier.startswith("customer") and customer_identifier.replace("customer", "") in requesting_user:
-                    is_own_data = True
-                elif "@" in customer_identifier and customer_identifier == requesting_user:
-                    is_own_data = True
-                
-                # Allow access only if it's own data or user is an authorized agent
-                if is_own_data or is_authorized_agent:
-                    logger.info(f"Authorized order history request for customer: {customer_identifier} by user: {requesting_user}")
-                    
-                    # First, get customer info to validate and get details
-                    customer_result = await mcp_client.get_customer_by_identifier(customer_identifier)
-                    
-                    if customer_result.get("success") and customer_result.get("result", {}).get("success"):
-                        customer_info = customer_result["result"]["customer"]
-                        
-                        # Now get order history for this customer
-                        orders_result = await mcp_client.get_customer_orders(customer_info["email"], limit=10)
-                        
-                        if orders_result.get("success") and orders_result.get("result", {}).get("success"):
-                            state["customer_order_history"] = {
-                                "customer": customer_info,
-                                "orders": orders_result["result"]["orders"],
-                                "total_orders": orders_result["result"]["total_orders"]
-                            }
-                            state["actions_taken"].append(f"order_history_retrieved: {customer_identifier}")
-                            logger.info(f"Successfully retrieved order history for {customer_identifier}: {len(orders_result['result']['orders'])} orders")
-                        else:
-                            error_msg = orders_result.get("result", {}).get("error", "Unknown error")
-                            state["order_history_error"] = error_msg
-                            state["actions_taken"].append(f"order_history_failed: {customer_identifier} - {error_msg}")
-                            logger.warning(f"Order history lookup failed for {customer_identifier}: {error_msg}")
-                    else:
-                        error_msg = customer_result.get("result", {}).get("error", "Customer not found")
-                        state["customer_lookup_error"] = error_msg
-                        state["actions_taken"].append(f"customer_lookup_failed: {customer_identifier} - {error_msg}")
-                        logger.warning(f"Customer lookup failed for {customer_identifier}: {error_msg}")
-                else:
-                    # Unauthorized access attempt
-                    state["unauthorized_access_attempt"] = {
-                        "requested_customer": customer_identifier,
-                        "requesting_user": requesting_user,
-                        "reason": "User attempted to access another customer's order history"
+            if orders:
+                logger.info(f"Successfully retrieved order history for {customer_identifier}: {len(orders)} orders")
+                return {
+                    "customer_order_history": {
+                        "customer": customer_info,
+                        "orders": orders,
+                        "total_orders": history_result["result"]["total_orders"]
                     }
-                    state["actions_taken"].append(f"unauthorized_access_blocked: {requesting_user} tried to access {customer_identifier}")
-                    logger.warning(f"SECURITY: Unauthorized access attempt - User {requesting_user} tried to access order history for {customer_identifier}")
-            else:
-                # Generic order history request without specific customer
-                # For non-agents, assume they want their own order history
-                if not is_authorized_agent:
-                    customer_identifier = requesting_user
-                    logger.info(f"User {requesting_user} requesting their own order history")
-                    
-                    # Get customer info for the requesting user
-                    customer_result = await mcp_client.get_customer_by_identifier(customer_identifier)
-                    
-                    if customer_result.get("success") and customer_result.get("result", {}).get("success"):
-                        customer_info = customer_result["result"]["customer"]
-                        
-                        # Get order history for this customer
-                        orders_result = await mcp_client.get_customer_orders(customer_info["email"], limit=10)
-                        
-                        if orders_result.get("success") and orders_result.get("result", {}).get("success"):
-                            state["customer_order_history"] = {
-                                "customer": customer_info,
-                                "orders": orders_result["result"]["orders"],
-                                "total_orders": orders_result["result"]["total_orders"]
-                            }
-                            state["actions_taken"].append(f"own_order_history_retrieved: {customer_identifier}")
-                            logger.info(f"Successfully retrieved own order history for {customer_identifier}")
-                        else:
-                            state["actions_taken"].append("order_history_query_no_orders_found")
-                            logger.info(f"No order history found for user {requesting_user}")
-                    else:
-                        state["actions_taken"].append("order_history_query_user_not_found")
-                        logger.info(f"User {requesting_user} not found in customer database")
-                else:
-                    state["actions_taken"].append("order_history_query_without_customer")
-                    logger.info("Agent asking about order history but no customer identifier found")
+                }, [f"order_history_retrieved: {customer_identifier}"]
+            
+            error_msg = f"No orders found for customer {customer_info['email']}"
+            logger.warning(f"Order history lookup failed for {customer_identifier}: {error_msg}")
+            return {"order_history_error": error_msg}, [f"order_history_failed: {customer_identifier} - {error_msg}"]
         
-        # Check if the message contains payment-related keywords
-        payment_keywords = ["pay", "payment", "invoice", "bill", "charge", "transaction"]
+        error_msg = history_result.get("result", {}).get("error", "Customer not found")
+        logger.warning(f"Customer lookup failed for {customer_identifier}: {error_msg}")
+        return {"customer_lookup_error": error_msg}, [f"customer_lookup_failed: {customer_identifier} - {error_msg}"]
+    
+    # Generic order history request without specific customer
+    if is_authorized_agent:
+        logger.info("Agent asking about order history but no customer identifier found")
+        return {}, ["order_history_query_without_customer"]
+    
+    # For non-agents, assume they want their own order history
+    customer_identifier = requesting_user
+    logger.info(f"User {requesting_user} requesting their own order history")
+    
+    # Get customer info and order history for the requesting user in one MCP call
+    history_result = await mcp_client.get_customer_with_orders(customer_identifier, limit=10)
+    
+    if history_result.get("success") and history_result.get("result", {}).get("success"):
+        orders = history_result["result"]["orders"]
         
-        if any(keyword in message for keyword in payment_keywords):
-            # Extract potential invoice/bill number
-            invoice_match = re.search(r'#?(\d+)', message)
-            
-            if invoice_match:
-                invoice_number = invoice_match.group(1)
-                
-                # Create a test Stripe payment intent
-                payment_result = await stripe_service.create_payment_intent(
-                    amount=1000,  # $10.00 in cents
-                    currency="usd",
-                    metadata={
-                        "user_id": state["user_id"],
-                        "invoice_number": invoice_number,
-                        "session_id": state["session_id"],
-                    },
-                )
-                
-                state["payment_intent"] = payment_result
-                state["actions_taken"].append(f"payment_intent_created: {payment_result['id']}")
-                
-                logger.info(f"Payment intent created: {payment_result['id']}")
-            else:
-                state["actions_taken"].append("payment_requested_but_no_invoice_found")
+        if orders:
+            logger.info(f"Successfully retrieved own order history for {customer_identifier}")
+            return {
+                "customer_order_history": {
+                    "customer": history_result["result"]["customer"],
+                    "orders": orders,
+                    "total_orders": history_result["result"]["total_orders"]
+                }
+            }, [f"own_order_history_retrieved: {customer_identifier}"]
         
-        # Check for customer information queries
-        customer_keywords = ["customer", "account", "profile", "information"]
-        if any(keyword in message for keyword in customer_keywords):
-            # Try to get customer info if we have an email
-            user_id = state.get("user_id")
-            if user_id and "@" in user_id:  # Assuming user_id might be email
-                customer_result = await mcp_client.get_customer_info(user_id)
-                if customer_result.get("success") and customer_result.get("result", {}).get("success"):
-                    state["customer_data"] = customer_result["result"]
-                    state["actions_taken"].append("customer_info_retrieved")
+        logger.info(f"No order history found for user {requesting_user}")
+        return {}, ["order_history_query_no_orders_found"]
+    
+    logger.info(f"User {requesting_user} not found in customer database")
+    return {}, ["order_history_query_user_not_found"]
+
+
+async def _payment_action(state: Dict[str, Any], invoice_number: str) -> ActionResult:
+    """Create a test Stripe payment intent for the invoice."""
+    payment_result = await stripe_service.create_payment_intent(
+        amount=1000,  # $10.00 in cents
+        currency="usd",
+        metadata={
+            "user_id": state["user_id"],
+            "invoice_number": invoice_number,
+            "session_id": state["session_id"],
+        },
+        # Repeating the request in the same session returns the same intent
+        idempotency_key=f"payment_intent:{state['session_id']}:{invoice_number}",
+    )
+    
+    logger.info(f"Payment intent created: {payment_result['id']}")
+    return {"payment_intent": payment_result}, [f"payment_intent_created: {payment_result['id']}"]
+
+
+async def _customer_info_action(email: str) -> ActionResult:
+    """Fetch the customer's profile via MCP."""
+    customer_result = await mcp_client.get_customer_info(email)
+    if customer_result.get("success") and customer_result.get("result", {}).get("success"):
+        return {"customer_data": customer_result["result"]}, ["customer_info_retrieved"]
+    return {}, []
+
+
+def plan_actions(state: Dict[str, Any], routed: RoutedMessage) -> List[Tuple[str, Awaitable[ActionResult]]]:
+    """Independent actions for the message's intents, in the order their results are merged."""
+    plan = []
+    
+    # Order-related queries
+    if routed.has("order"):
+        if routed.number:
+            plan.append(("order_lookup", _order_lookup_action(routed.number)))
+        elif routed.has("my_order"):
+            # User asking about "my order" or similar without specific number
+            logger.info("User asking about orders but no order number provided")
+            plan.append(("order_lookup", _note_action("order_query_without_number")))
+    
+    # Order history queries (e.g., "show me order history for customer123")
+    if routed.has("order_history"):
+        plan.append(("order_history", _order_history_action(state, routed.customer_identifier)))
+    
+    # Payment-related queries, with a potential invoice/bill number
+    if routed.has("payment"):
+        if routed.number:
+            plan.append(("payment", _payment_action(state, routed.number)))
+        else:
+            plan.append(("payment", _note_action("payment_requested_but_no_invoice_found")))
+    
+    # Customer information queries, answerable if the user_id is an email
+    user_id = state.get("user_id")
+    if routed.has("customer_info") and user_id and "@" in user_id:
+        plan.append(("customer_info", _customer_info_action(user_id)))
+    
+    # Requests recorded for the policy node and follow-up by staff
+    if routed.has("cancel") and routed.has("subscription"):
+        plan.append(("subscription_cancellation", _note_action("subscription_cancellation_requested")))
+    
+    if routed.has("refund"):
+        plan.append(("refund", _note_action("refund_requested")))
+    
+    return plan
+
+
+async def _run_action(name: str, action: Awaitable[ActionResult], timeout: float) -> ActionResult:
+    """Run one planned action with a timeout, turning failures into action_error entries."""
+    try:
+        return await asyncio.wait_for(action, timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Action '{name}' timed out after {timeout}s")
+        return {}, [f"action_error: {name} timed out"]
+    except Exception as e:
+        logger.error(f"Action '{name}' failed: {e}")
+        return {}, [f"action_error: {name} failed: {str(e)}"]
+
+
+async def action_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Handle business transactions and actions (e.g., Stripe payments, order lookups)."""
+    logger.info(f"Action node processing for user: {state['user_id']}")
+    
+    update = {"actions_taken": []}
+    
+    try:
+        plan = plan_actions(state, route_message(state["message"]))
         
-        # Check for other action keywords
-        if "cancel" in message and "subscription" in message:
-            state["actions_taken"].append("subscription_cancellation_requested")
+        # Actions are independent, so a multi-intent turn waits for the slowest
+        # one; results are merged in plan order regardless of completion order.
+        # Their MCP lookups start together and go out as one batched request.
+        with mcp_client.batch():
+            results = await asyncio.gather(*(
+                _run_action(name, action, ACTION_TIMEOUTS.get(name, ACTION_TIMEOUT_SECONDS))
+                for name, action in plan
+            ))
         
-        if "refund" in message:
-            state["actions_taken"].append("refund_requested")
+        for updates, actions in results:
+            update.update(updates)
+            update["actions_taken"].extend(actions)
             
     except Exception as e:
         logger.error(f"Error in action node: {e}")
-        state["actions_taken"].append(f"action_error: {str(e)}")
+        update["actions_taken"].append(f"action_error: {str(e)}")
     
-    return state
+    return update
 
 
 async def policy_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """Apply business policies and generate response using OpenAI ChatGPT o1."""
     logger.info(f"Policy node processing for user: {state['user_id']}")
     
+    write_token = get_token_writer()
+    
     try:
         api_key = os.getenv("OPENAI_API_KEY")
         logger.info(f"API key check: key='{api_key}', length={len(api_key) if api_key else 0}, starts_with_sk_test={api_key.startswith('sk-test') if api_key else False}")
@@ -447,6 +512,8 @@ async def policy_node(state: Dict[str, Any]) -> Dict[str, Any]:
             elif sentiment.get("LABEL_0", 0) > 0.7:  # Negative sentiment
                 ai_response += " We understand your concern and want to make this right for you."
             
+            write_token(ai_response)
+            
         else:
             # Use OpenAI API when valid key is available
             # Prepare context from conversation history
@@ -598,33 +665,41 @@ Customer Information:
             
             # Generate response using OpenAI
             client = await get_openai_client()
-            response = await client.chat.completions.create(
+            stream = await client.chat.completions.create(
                 model="gpt-4o-mini",  # Use gpt-4o-mini for better performance and higher rate limits
                 messages=context_messages,
                 max_tokens=500,
                 temperature=0.7,
+                stream=True,
             )
             
-            ai_response = response.choices[0].message.content
+            # Forward tokens as they arrive so streaming clients see the first byte early
+            response_parts = []
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    response_parts.append(chunk.choices[0].delta.content)
+                    write_token(chunk.choices[0].delta.content)
+            
+            ai_response = "".join(response_parts)
             
             # Check if payment was processed and add confirmation
             if any("payment_intent_created" in action for action in state.get("actions_taken", [])):
                 payment_intent = state.get("payment_intent", {})
-                ai_response += f"\n\nI've initiated a payment process for you. Payment ID: {payment_intent.get('id', 'N/A')}"
-        
-        state["response"] = ai_response
-        state["is_final"] = True
-        state["actions_taken"].append("response_generated")
+                confirmation = f"\n\nI've initiated a payment process for you. Payment ID: {payment_intent.get('id', 'N/A')}"
+                ai_response += confirmation
+                write_token(confirmation)
         
         logger.info(f"Response generated for user: {state['user_id']}")
         
+        return {"response": ai_response, "is_final": True, "actions_taken": ["response_generated"]}
+        
     except Exception as e:
         logger.error(f"Error in policy node: {e}")
-        state["response"] = "I apologize, but I encountered an error while processing your request. Please try again or contact support."
-        state["is_final"] = True
-        state["actions_taken"].append(f"policy_error: {str(e)}")
-    
-    return state
+        return {
+            "response": "I apologize, but I encountered an error while processing your request. Please try again or contact support.",
+            "is_final": True,
+            "actions_taken": [f"policy_error: {str(e)}"],
+        }
 
 
 async def memory_node(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -632,21 +707,26 @@ async def memory_node(state: Dict[str, Any]) -> Dict[str, Any]:
     logger.info(f"Memory node updating for user: {state['user_id']}")
     
     try:
-        # Update the stored conversation with the final response
+        # Roll the turn's sentiment into the dashboard analytics
+        sentiment_analytics.record(state.get("sentiment", {}))
+        
+        # Update the point stored at ingest with the final response
+        if not state.get("point_id"):
+            logger.warning(f"No stored interaction to update for user: {state['user_id']}")
+            return {"actions_taken": ["memory_skipped: no stored interaction"]}
+        
         if state.get("response"):
             await qdrant_service.update_conversation_response(
-                user_id=state["user_id"],
-                session_id=state["session_id"],
+                point_id=state["point_id"],
                 response=state["response"],
                 final_sentiment=state.get("sentiment", {}),
+                wait=False,
             )
         
-        state["actions_taken"].append("memory_updated")
-        
         logger.info(f"Memory updated for user: {state['user_id']}")
         
+        return {"actions_taken": ["memory_updated"]}
+        
     except Exception as e:
         logger.error(f"Error in memory node: {e}")
-        state["actions_taken"].append(f"memory_error: {str(e)}")
-    
-    return state
+        return {"actions_taken": [f"memory_error: {str(e)}"]}
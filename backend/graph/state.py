@@ -0,0 +1,76 @@
+"""
+State schema for the customer service workflow.
+
+ingest, sentiment and action run as parallel branches, so each node returns
+only the keys it changed. actions_taken is the one key several branches
+write in the same step; its reducer concatenates their entries. Every other
+key has a single writer per step.
+"""
+
+import operator
+from typing import Annotated, Any, Dict, List, Optional, TypedDict
+
+from langgraph.types import Overwrite
+
+
+class CustomerServiceState(TypedDict, total=False):
+    # Request
+    user_id: str
+    message: str
+    session_id: str
+
+    # ingest: stored point and retrieved context
+    point_id: Optional[str]
+    conversation_history: List[Dict[str, Any]]
+    user_conversations: List[Dict[str, Any]]
+    similar_conversations: List[Dict[str, Any]]
+
+    # sentiment
+    sentiment: Dict[str, Any]
+
+    # action: tool results and errors
+    order_data: Optional[Dict[str, Any]]
+    order_lookup_error: Optional[str]
+    customer_order_history: Optional[Dict[str, Any]]
+    order_history_error: Optional[str]
+    customer_lookup_error: Optional[str]
+    unauthorized_access_attempt: Optional[Dict[str, Any]]
+    payment_intent: Optional[Dict[str, Any]]
+    customer_data: Optional[Dict[str, Any]]
+
+    # policy
+    response: Optional[str]
+    is_final: bool
+
+    # Appended to by every node, in step order
+    actions_taken: Annotated[List[str], operator.add]
+
+
+def new_turn_state(user_id: str, message: str, session_id: str) -> Dict[str, Any]:
+    """
+    Graph input for a new turn on a (possibly checkpointed) thread.
+
+    Checkpointed keys persist across turns, so every turn-scoped key is
+    reset here; actions_taken is overwritten rather than appended to.
+    """
+    return {
+        "user_id": user_id,
+        "message": message,
+        "session_id": session_id,
+        "point_id": None,
+        "conversation_history": [],
+        "user_conversations": [],
+        "similar_conversations": [],
+        "sentiment": {},
+        "order_data": None,
+        "order_lookup_error": None,
+        "customer_order_history": None,
+        "order_history_error": None,
+        "customer_lookup_error": None,
+        "unauthorized_access_attempt": None,
+        "payment_intent": None,
+        "customer_data": None,
+        "response": None,
+        "is_final": False,
+        "actions_taken": Overwrite([]),
+    }
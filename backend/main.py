@@ -1,21 +1,27 @@
 import os
+import json
 import logging
 from contextlib import asynccontextmanager
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from pathlib import Path
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import stripe
 from dotenv import load_dotenv
 
 from graph.build_graph import build_customer_service_graph
-from services.qdrant_client import QdrantService
-from services.stripe_client import StripeService
-from services.embeddings import EmbeddingService
+from graph.checkpointer import checkpointer_manager
+from graph.state import new_turn_state
+from services.qdrant_client import qdrant_service
+from services.stripe_client import stripe_service
+from services.stripe_events import stripe_event_store
+from services.embeddings import embedding_service
 from services.mcp_client import mcp_client
+from services.sentiment import sentiment_service
+from services.analytics import sentiment_analytics
 
 # Load environment variables from .env file in project root
 env_path = Path(__file__).parent.parent / ".env"
@@ -25,11 +31,6 @@ load_dotenv(dotenv_path=env_path)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize services
-qdrant_service = QdrantService()
-embedding_service = EmbeddingService()
-stripe_service = StripeService()
-
 # Initialize Stripe
 stripe.api_key = os.getenv("STRIPE_API_KEY")
 
@@ -40,8 +41,12 @@ customer_service_graph = build_customer_service_graph()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize services on startup."""
+    global customer_service_graph
     logger.info("Starting Customer Service SaaS backend...")
     
+    # Rebuild the workflow on the configured checkpointer backend
+    customer_service_graph = build_customer_service_graph(await checkpointer_manager.open())
+    
     # Initialize Qdrant collections
     await qdrant_service.initialize_collections()
     
@@ -51,11 +56,24 @@ async def lifespan(app: FastAPI):
     # Initialize MCP client
     await mcp_client.initialize()
     
+    # Open the sentiment analytics rollups
+    await sentiment_analytics.open()
+    
+    # Open the Stripe event store and start its catch-up sync
+    await stripe_event_store.open()
+    
     logger.info("All services initialized successfully")
     yield
     
     # Cleanup
+    await qdrant_service.close()
+    await sentiment_analytics.close()
+    await stripe_event_store.close()
     await mcp_client.close()
+    await stripe_service.close()
+    await embedding_service.close()
+    await sentiment_service.close()
+    await checkpointer_manager.close()
     logger.info("Shutting down services...")
 
 
@@ -101,6 +119,11 @@ class SearchResponse(BaseModel):
     total_count: int
 
 
+class CacheInvalidationRequest(BaseModel):
+    order_number: Optional[str] = None
+    customer_email: Optional[str] = None
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -134,45 +157,55 @@ async def health_check():
         raise HTTPException(status_code=503, detail="Service unavailable")
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """In-process performance metrics for tuning."""
+    return {
+        "embeddings": embedding_service.get_stats(),
+        "sentiment": sentiment_service.get_stats(),
+        "mcp": mcp_client.get_stats(),
+        "qdrant": qdrant_service.get_stats(),
+        "analytics": sentiment_analytics.get_stats(),
+        "stripe_events": stripe_event_store.get_stats(),
+    }
+
+
+def build_graph_input(request: ChatRequest):
+    """Create the initial graph state and checkpointer config for a chat request."""
+    initial_state = new_turn_state(
+        user_id=request.user,
+        message=request.message,
+        session_id=request.session_id or f"session_{request.user}",
+    )
+    
+    # Configuration for the checkpointer
+    config = {
+        "configurable": {
+            "thread_id": request.session_id or f"thread_{request.user}",
+        }
+    }
+    
+    return initial_state, config
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Format a Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest, background_tasks: BackgroundTasks):
+async def chat_endpoint(request: ChatRequest):
     """Main chat endpoint that processes customer messages through the LangGraph workflow."""
     try:
         logger.info(f"Processing chat request from user: {request.user}")
         
-        # Create initial state for the graph
-        initial_state = {
-            "user_id": request.user,
-            "message": request.message,
-            "session_id": request.session_id or f"session_{request.user}",
-            "conversation_history": [],
-            "sentiment": {},
-            "actions_taken": [],
-            "is_final": False,
-        }
-        
-        # Configuration for the checkpointer
-        config = {
-            "configurable": {
-                "thread_id": request.session_id or f"thread_{request.user}",
-            }
-        }
+        initial_state, config = build_graph_input(request)
         
         # Run the LangGraph workflow
         final_state = await customer_service_graph.ainvoke(initial_state, config=config)
         
-        # Store conversation in background
-        background_tasks.add_task(
-            qdrant_service.store_conversation,
-            user_id=request.user,
-            message=request.message,
-            response=final_state.get("response", ""),
-            sentiment=final_state.get("sentiment", {}),
-            session_id=final_state.get("session_id", request.session_id),
-        )
-        
         return ChatResponse(
-            response=final_state.get("response", "I apologize, but I encountered an error processing your request."),
+            response=final_state.get("response") or "I apologize, but I encountered an error processing your request.",
             sentiment=final_state.get("sentiment", {}),
             actions_taken=final_state.get("actions_taken", []),
             session_id=final_state.get("session_id", request.session_id),
@@ -183,6 +216,54 @@ async def chat_endpoint(request: ChatRequest, background_tasks: BackgroundTasks)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Streaming chat endpoint using Server-Sent Events.
+    
+    Emits a "node" event as each workflow node completes, "token" events as the
+    response is generated, and a final "done" event carrying the full ChatResponse.
+    """
+    logger.info(f"Processing streaming chat request from user: {request.user}")
+    
+    initial_state, config = build_graph_input(request)
+    
+    async def event_stream():
+        final_state = initial_state
+        
+        try:
+            async for mode, chunk in customer_service_graph.astream(
+                initial_state,
+                config=config,
+                stream_mode=["updates", "custom", "values"],
+            ):
+                if mode == "custom" and chunk.get("type") == "token":
+                    yield format_sse("token", {"content": chunk["content"]})
+                elif mode == "updates":
+                    for node in chunk:
+                        yield format_sse("node", {"node": node, "status": "completed"})
+                elif mode == "values":
+                    final_state = chunk
+        except Exception as e:
+            logger.error(f"Error processing streaming chat request: {e}")
+            yield format_sse("error", {"detail": "Internal server error"})
+            return
+        
+        session_id = final_state.get("session_id", request.session_id)
+        yield format_sse("done", ChatResponse(
+            response=final_state.get("response") or "I apologize, but I encountered an error processing your request.",
+            sentiment=final_state.get("sentiment", {}),
+            actions_taken=final_state.get("actions_taken", []),
+            session_id=session_id,
+        ).model_dump())
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/search", response_model=SearchResponse)
 async def semantic_search(request: SearchRequest):
     """Semantic search endpoint using CLIP embeddings."""
@@ -224,6 +305,9 @@ async def stripe_webhook(request: Request, background_tasks: BackgroundTasks):
         
         logger.info(f"Received Stripe webhook: {event['type']}")
         
+        # Keep the dashboard's event feed current without polling Stripe
+        await stripe_event_store.record_webhook_event(event)
+        
         # Process webhook in background
         background_tasks.add_task(stripe_service.process_webhook_event, event)
         
@@ -240,6 +324,13 @@ async def stripe_webhook(request: Request, background_tasks: BackgroundTasks):
         raise HTTPException(status_code=500, detail="Webhook processing failed")
 
 
+@app.post("/cache/invalidate")
+async def invalidate_cache(request: CacheInvalidationRequest):
+    """Drop cached MCP tool results after an order update (everything if no filter is given)."""
+    removed = mcp_client.invalidate(order_number=request.order_number, customer_email=request.customer_email)
+    return {"status": "success", "invalidated": removed}
+
+
 @app.get("/conversations/{user_id}")
 async def get_user_conversations(user_id: str, limit: int = 50):
     """Get conversation history for a user."""
@@ -253,9 +344,9 @@ async def get_user_conversations(user_id: str, limit: int = 50):
 
 @app.get("/analytics/sentiment")
 async def get_sentiment_analytics(days: int = 7):
-    """Get sentiment analytics for the dashboard."""
+    """Get sentiment analytics for the dashboard, read from the per-day rollups."""
     try:
-        analytics = await qdrant_service.get_sentiment_analytics(days)
+        analytics = await sentiment_analytics.get_summary(days)
         return analytics
     except Exception as e:
         logger.error(f"Error fetching sentiment analytics: {e}")
@@ -263,11 +354,14 @@ async def get_sentiment_analytics(days: int = 7):
 
 
 @app.get("/stripe/events")
-async def get_stripe_events(limit: int = 50):
-    """Get recent Stripe events for the dashboard."""
+async def get_stripe_events(limit: int = 50, starting_after: Optional[str] = None):
+    """
+    Get recent Stripe events for the dashboard, served from the local event store.
+    
+    Pages newest first; pass next_cursor back as starting_after for older events.
+    """
     try:
-        events = await stripe_service.get_recent_events(limit)
-        return {"events": events}
+        return await stripe_event_store.list_events(max(1, min(limit, 100)), starting_after)
     except Exception as e:
         logger.error(f"Error fetching Stripe events: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch Stripe events")
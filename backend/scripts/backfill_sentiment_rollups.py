@@ -0,0 +1,70 @@
+"""
+Rebuild the sentiment analytics rollups from conversations stored in Qdrant.
+
+New turns are rolled up as they complete; this one-off job seeds the rollups
+with history recorded before they existed. It replaces any existing rollups,
+so it can be re-run safely. Run scripts.compact_conversations first so
+duplicate turns are not counted twice.
+
+Usage (from the backend directory):
+    python -m scripts.backfill_sentiment_rollups
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file in project root
+load_dotenv(dotenv_path=Path(__file__).parent.parent.parent / ".env")
+
+from qdrant_client.models import FieldCondition, Filter, MatchValue  # noqa: E402
+
+from services.analytics import sentiment_analytics  # noqa: E402
+from services.qdrant_client import qdrant_service  # noqa: E402
+
+
+async def main(page_size: int):
+    await qdrant_service.initialize()
+    await sentiment_analytics.open()
+    await sentiment_analytics.reset()
+
+    scanned = 0
+    offset = None
+    try:
+        while True:
+            records, offset = await qdrant_service.client.scroll(
+                collection_name=qdrant_service.collection_name,
+                scroll_filter=Filter(must=[FieldCondition(key="type", match=MatchValue(value="conversation"))]),
+                limit=page_size,
+                offset=offset,
+                with_payload=["sentiment", "timestamp"],
+            )
+            for record in records:
+                payload = record.payload or {}
+                timestamp = payload.get("timestamp")
+                sentiment_analytics.record(
+                    payload.get("sentiment", {}),
+                    datetime.fromisoformat(timestamp) if timestamp else None,
+                )
+            scanned += len(records)
+            await sentiment_analytics.flush()
+            if offset is None:
+                break
+    finally:
+        await sentiment_analytics.close()
+        await qdrant_service.close()
+
+    print(json.dumps({"scanned": scanned}))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=512)
+    args = parser.parse_args()
+    asyncio.run(main(args.page_size))
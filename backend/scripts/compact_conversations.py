@@ -0,0 +1,39 @@
+"""
+One-off job merging duplicate conversation points in Qdrant.
+
+Older versions stored every chat turn twice: once at ingest with the message
+embedding and again after the response with a zero vector. This copies each
+response onto its ingest point and deletes the duplicate.
+
+Usage (from the backend directory):
+    python -m scripts.compact_conversations [--dry-run]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file in project root
+load_dotenv(dotenv_path=Path(__file__).parent.parent.parent / ".env")
+
+from services.qdrant_client import qdrant_service  # noqa: E402
+
+
+async def main(dry_run: bool):
+    try:
+        result = await qdrant_service.compact_conversations(dry_run=dry_run)
+    finally:
+        await qdrant_service.close()
+    print(json.dumps({**result, "dry_run": dry_run}))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Report duplicate pairs without changing anything")
+    args = parser.parse_args()
+    asyncio.run(main(args.dry_run))
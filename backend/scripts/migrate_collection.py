@@ -0,0 +1,40 @@
+"""
+Apply the configured storage settings to the existing conversations collection.
+
+Compares the live collection with QDRANT_QUANTIZATION, QDRANT_VECTORS_ON_DISK,
+QDRANT_PAYLOAD_ON_DISK and QDRANT_HNSW_M/EF_CONSTRUCT and updates whatever
+differs. Qdrant rebuilds the affected segments in the background while the
+collection keeps serving searches.
+
+Usage (from the backend directory):
+    python -m scripts.migrate_collection [--dry-run]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file in project root
+load_dotenv(dotenv_path=Path(__file__).parent.parent.parent / ".env")
+
+from services.qdrant_client import qdrant_service  # noqa: E402
+
+
+async def main(dry_run: bool):
+    try:
+        changes = await qdrant_service.migrate_collection(dry_run=dry_run)
+    finally:
+        await qdrant_service.close()
+    print(json.dumps({"changes": changes, "dry_run": dry_run}))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Report differing settings without changing anything")
+    args = parser.parse_args()
+    asyncio.run(main(args.dry_run))
@@ -0,0 +1,234 @@
+"""
+Micro-batching for model inference shared by the embedding and sentiment services.
+Concurrent requests are coalesced so the model pays its per-call overhead once per batch.
+The write-behind buffer applies the same idea to vector store writes.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Micro-batcher that coalesces concurrent model inference requests.
+    
+    Requests are queued and flushed as one batch once either max_batch_size
+    items are waiting or max_wait_ms has elapsed since the first queued
+    request. The blocking process_batch callable runs in the given executor
+    (the loop's default executor if None) and each caller receives its own
+    slice of the results.
+    """
+    
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        executor: Optional[Executor] = None,
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.executor = executor
+        self.batch_size_histogram = Histogram([1, 2, 4, 8, 16, 32, 64, 128])
+        self.latency_histogram = Histogram([1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500])
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    async def submit(self, item: Any) -> Any:
+        """Queue an item for the next batch and wait for its result."""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+    
+    def _ensure_worker(self):
+        """Start the flush loop on the running event loop if needed."""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+    
+    async def _collect_batch(self) -> List[Tuple[Any, asyncio.Future, float]]:
+        """Wait for the first request, then gather more until full or timed out."""
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        
+        return batch
+    
+    async def _run(self):
+        """Flush loop: process each collected batch in the executor."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            items = [item for item, _, _ in batch]
+            self.batch_size_histogram.observe(len(batch))
+            
+            try:
+                results = await loop.run_in_executor(self.executor, self.process_batch, items)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            finished = time.perf_counter()
+            for (_, future, enqueued), result in zip(batch, results):
+                self.latency_histogram.observe((finished - enqueued) * 1000.0)
+                if not future.done():
+                    future.set_result(result)
+    
+    async def close(self):
+        """Stop the flush loop."""
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return batch-size and per-request latency (ms) histograms."""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "pending": self._queue.qsize() if self._queue else 0,
+            "batch_size": self.batch_size_histogram.snapshot(),
+            "latency_ms": self.latency_histogram.snapshot(),
+        }
+
+
+class WriteBehindBuffer:
+    """
+    Write-behind buffer that turns individual writes into bulk writes.
+    
+    Items are queued and written by the async write_batch callable once
+    max_batch_size items are waiting or flush_interval_ms has elapsed since
+    the first queued item. At most max_pending items may be queued; further
+    submits wait for room (backpressure). Callers either wait for their
+    item's batch to be written or return as soon as it is queued.
+    """
+    
+    def __init__(
+        self,
+        write_batch: Callable[[List[Any]], Awaitable[Any]],
+        max_batch_size: int = 64,
+        flush_interval_ms: float = 50.0,
+        max_pending: int = 1000,
+    ):
+        self.write_batch = write_batch
+        self.max_batch_size = max_batch_size
+        self.flush_interval_ms = flush_interval_ms
+        self.max_pending = max_pending
+        self.batch_size_histogram = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256])
+        self.latency_histogram = Histogram([1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500])
+        self.written = 0
+        self.failed = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    async def submit(self, item: Any, wait: bool = True):
+        """Queue an item; with wait=True, return once its batch has been written."""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future() if wait else None
+        await self._queue.put((item, future, time.perf_counter()))
+        if future is not None:
+            await future
+    
+    def _ensure_worker(self):
+        """Start the flush loop on the running event loop if needed."""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._worker = loop.create_task(self._run())
+    
+    async def _collect_batch(self) -> List[Tuple[Any, Optional[asyncio.Future], float]]:
+        """Wait for the first item, then gather more until full or the interval elapses."""
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.flush_interval_ms / 1000.0
+        
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        
+        return batch
+    
+    async def _run(self):
+        """Flush loop: write each collected batch."""
+        while True:
+            batch = await self._collect_batch()
+            self.batch_size_histogram.observe(len(batch))
+            
+            try:
+                await self.write_batch([item for item, _, _ in batch])
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error(f"Write-behind flush of {len(batch)} items failed: {e}")
+                for _, future, _ in batch:
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+            else:
+                self.written += len(batch)
+                finished = time.perf_counter()
+                for _, future, enqueued in batch:
+                    self.latency_histogram.observe((finished - enqueued) * 1000.0)
+                    if future is not None and not future.done():
+                        future.set_result(None)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    async def flush(self):
+        """Wait until every queued item has been written."""
+        if self._queue is not None and self._worker is not None and not self._worker.done():
+            await self._queue.join()
+    
+    async def close(self):
+        """Flush queued items, then stop the flush loop."""
+        await self.flush()
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return queue depth, write counts, batch-size and queue-to-write latency (ms) histograms."""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "flush_interval_ms": self.flush_interval_ms,
+            "max_pending": self.max_pending,
+            "pending": self._queue.qsize() if self._queue else 0,
+            "written": self.written,
+            "failed": self.failed,
+            "batch_size": self.batch_size_histogram.snapshot(),
+            "latency_ms": self.latency_histogram.snapshot(),
+        }
@@ -1,7 +1,10 @@
 
+import hashlib
 import logging
 import os
-from typing import List, Union
+import time
+from collections import OrderedDict
+from typing import List, Union, Optional, Tuple, Dict, Any
 import asyncio
 
 import torch
@@ -9,18 +12,139 @@ from transformers import CLIPProcessor, CLIPModel
 from PIL import Image
 import numpy as np
 
+from .batching import MicroBatcher
+
 logger = logging.getLogger(__name__)
 
 
+class EmbeddingCache:
+    """
+    Bounded LRU cache of embeddings keyed by a content hash.
+    
+    Entries expire after ttl_seconds (0 disables expiry). When spill_path is
+    set, the cache is snapshotted to disk on shutdown and reloaded on startup
+    so warm entries survive restarts.
+    """
+    
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 86400, spill_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.spill_path = spill_path
+        self._entries: "OrderedDict[str, Tuple[List[float], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loaded = False
+    
+    @staticmethod
+    def text_key(model_name: str, text: str) -> str:
+        """Hash normalized text (case and whitespace insensitive, like the CLIP tokenizer)."""
+        normalized = " ".join(text.split()).lower()
+        return hashlib.sha256(f"{model_name}\x00text\x00{normalized}".encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def image_key(model_name: str, image: Union[Image.Image, str]) -> str:
+        """Hash raw image bytes (file contents for paths, pixel data for PIL images)."""
+        digest = hashlib.sha256(f"{model_name}\x00image\x00".encode("utf-8"))
+        if isinstance(image, str):
+            with open(image, "rb") as f:
+                digest.update(f.read())
+        else:
+            digest.update(f"{image.mode}{image.size}".encode("utf-8"))
+            digest.update(image.tobytes())
+        return digest.hexdigest()
+    
+    def get(self, key: str) -> Optional[List[float]]:
+        """Return a copy of the cached embedding, or None on miss/expiry."""
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl_seconds and time.time() - entry[1] > self.ttl_seconds:
+            del self._entries[key]
+            entry = None
+        
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return list(entry[0])
+    
+    def put(self, key: str, embedding: List[float], created: Optional[float] = None):
+        """Insert an embedding, evicting the least recently used entries if full."""
+        self._entries[key] = (list(embedding), created or time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def load(self):
+        """Load a previously spilled snapshot, dropping expired entries."""
+        self.loaded = True
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        
+        try:
+            with np.load(self.spill_path) as snapshot:
+                keys, vectors, created = snapshot["keys"], snapshot["vectors"], snapshot["created"]
+            now = time.time()
+            for key, vector, ts in zip(keys, vectors, created):
+                if not self.ttl_seconds or now - float(ts) <= self.ttl_seconds:
+                    self.put(str(key), vector.tolist(), float(ts))
+            logger.info(f"Loaded {len(self._entries)} cached embeddings from {self.spill_path}")
+        except Exception as e:
+            logger.error(f"Error loading embedding cache from {self.spill_path}: {e}")
+    
+    def save(self):
+        """Spill the current cache contents to disk."""
+        if not self.spill_path or not self._entries:
+            return
+        
+        try:
+            keys = list(self._entries.keys())
+            vectors = np.array([self._entries[k][0] for k in keys], dtype=np.float32)
+            created = np.array([self._entries[k][1] for k in keys], dtype=np.float64)
+            with open(self.spill_path, "wb") as f:
+                np.savez(f, keys=np.array(keys), vectors=vectors, created=created)
+            logger.info(f"Saved {len(keys)} cached embeddings to {self.spill_path}")
+        except Exception as e:
+            logger.error(f"Error saving embedding cache to {self.spill_path}: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
 class EmbeddingService:
     def __init__(self):
         self.model = None
         self.processor = None
         self.model_name = os.getenv("CLIP_MODEL", "openai/clip-vit-base-patch32")
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.text_batcher = MicroBatcher(
+            lambda texts: self._generate_text_embeddings(texts),
+            max_batch_size=int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "32")),
+            max_wait_ms=float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5")),
+        )
+        self.cache = EmbeddingCache(
+            max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000")),
+            ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "86400")),
+            spill_path=os.getenv("EMBEDDING_CACHE_PATH") or None,
+        )
         
     async def initialize(self):
         """Initialize the CLIP model and processor."""
+        if not self.cache.loaded:
+            self.cache.load()
+        
         if self.model is None:
             try:
                 logger.info(f"Loading CLIP model: {self.model_name}")
@@ -53,12 +177,15 @@ class EmbeddingService:
         """Generate CLIP embedding for text."""
         await self.initialize()
         
+        cache_key = EmbeddingCache.text_key(self.model_name, text)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            # Run in executor to avoid blocking the event loop
-            loop = asyncio.get_event_loop()
-            embedding = await loop.run_in_executor(
-                None, self._generate_text_embedding, text
-            )
+            # Coalesce with concurrent callers into one batched forward pass
+            embedding = await self.text_batcher.submit(text)
+            self.cache.put(cache_key, embedding)
             return embedding
             
         except Exception as e:
@@ -68,25 +195,35 @@ class EmbeddingService:
     
     def _generate_text_embedding(self, text: str) -> List[float]:
         """Generate text embedding (runs in thread pool)."""
+        return self._generate_text_embeddings([text])[0]
+    
+    def _generate_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for a padded batch of texts (runs in thread pool)."""
         with torch.no_grad():
-            inputs = self.processor(text=[text], return_tensors="pt", padding=True)
+            inputs = self.processor(text=texts, return_tensors="pt", padding=True)
             inputs = {k: v.to(self.device) for k, v in inputs.items()}
             
             text_features = self.model.get_text_features(**inputs)
             text_features = text_features / text_features.norm(dim=-1, keepdim=True)
             
-            return text_features.cpu().numpy().flatten().tolist()
+            return text_features.cpu().numpy().tolist()
     
     async def get_image_embedding(self, image: Union[Image.Image, str]) -> List[float]:
         """Generate CLIP embedding for an image."""
         await self.initialize()
         
         try:
+            cache_key = EmbeddingCache.image_key(self.model_name, image)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+            
             # Run in executor to avoid blocking the event loop
             loop = asyncio.get_event_loop()
             embedding = await loop.run_in_executor(
                 None, self._generate_image_embedding, image
             )
+            self.cache.put(cache_key, embedding)
             return embedding
             
         except Exception as e:
@@ -108,6 +245,18 @@ class EmbeddingService:
             
             return image_features.cpu().numpy().flatten().tolist()
     
+    async def close(self):
+        """Stop background batching and spill the cache to disk."""
+        await self.text_batcher.close()
+        self.cache.save()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return embedding batcher and cache statistics."""
+        return {
+            "text_batcher": self.text_batcher.get_stats(),
+            "cache": self.cache.get_stats(),
+        }
+    
     async def get_multimodal_similarity(
         self, text: str, image: Union[Image.Image, str]
     ) -> float:
@@ -124,3 +273,7 @@ class EmbeddingService:
         )
         
         return float(similarity)
+
+
+# Global embedding service instance shared by the API and graph nodes
+embedding_service = EmbeddingService()
@@ -3,34 +3,452 @@ MCP Client for calling database tools through the MCP server.
 This service provides a clean interface for the backend to access customer service data.
 """
 
+import contextvars
+import copy
+import json
 import logging
 import os
+import random
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 import httpx
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Set, Tuple
 import asyncio
 
+from .metrics import Histogram
+
 logger = logging.getLogger(__name__)
 
+# Gateway/overload responses worth retrying for idempotent tools
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+
+# Seconds a successful result of each read-only tool stays cached.
+# Tools not listed here are never cached.
+DEFAULT_TOOL_CACHE_TTLS = {
+    "get_order_details": 30,
+    "get_customer_orders": 30,
+    "get_customer_orders_by_id": 30,
+    "get_customer_with_orders": 30,
+    "get_customer_by_identifier": 300,
+    "get_customer_info": 300,
+    "get_support_tickets": 30,
+    "search_orders": 15,
+}
+
+
+# Read-only tools that are safe to retry
+IDEMPOTENT_TOOLS = set(DEFAULT_TOOL_CACHE_TTLS)
+
+
+def parse_tool_ttls(value: str) -> Dict[str, float]:
+    """Parse a "tool=seconds,tool=seconds" override string."""
+    ttls = {}
+    for item in value.split(","):
+        if "=" in item:
+            tool_name, seconds = item.split("=", 1)
+            ttls[tool_name.strip()] = float(seconds)
+    return ttls
+
+
+class ToolResultCache:
+    """
+    Bounded LRU cache of MCP tool results keyed by tool name and parameters.
+    
+    Successful results are kept for the tool's TTL and "not found" results for
+    negative_ttl_seconds; transport and database errors are never cached.
+    Entries are tagged with the order numbers and customer emails they
+    mention so order or payment events can invalidate them.
+    """
+    
+    def __init__(self, ttls: Dict[str, float], negative_ttl_seconds: float = 10, max_entries: int = 1000):
+        self.ttls = ttls
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float, Set[str]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        # Bumped on every invalidation so in-flight fetches started earlier are not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+    
+    def cacheable(self, tool_name: str) -> bool:
+        return self.ttls.get(tool_name, 0) > 0
+    
+    @staticmethod
+    def key(tool_name: str, parameters: Dict[str, Any]) -> str:
+        """Canonical key: sorted parameters with unset (None) values dropped."""
+        canonical = {k: v for k, v in parameters.items() if v is not None}
+        return f"{tool_name}:{json.dumps(canonical, sort_keys=True, separators=(',', ':'), default=str)}"
+    
+    def ttl_for(self, tool_name: str, response: Dict[str, Any]) -> float:
+        """TTL for a tool response, or 0 if it must not be cached."""
+        if not response.get("success"):
+            return 0
+        result = response.get("result") or {}
+        if result.get("success", True):
+            return self.ttls.get(tool_name, 0)
+        error = str(result.get("error", "")).lower()
+        if "not found" in error:
+            return self.negative_ttl_seconds
+        return 0
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached response, or None on miss/expiry."""
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() > entry[1]:
+            self._remove(key)
+            entry = None
+        
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(entry[0])
+    
+    def put(self, key: str, tool_name: str, parameters: Dict[str, Any], response: Dict[str, Any],
+            generation: Optional[int] = None):
+        """Store a tool response if it is cacheable and no invalidation happened since generation."""
+        ttl = self.ttl_for(tool_name, response)
+        if ttl <= 0 or (generation is not None and generation != self.generation):
+            return
+        
+        self._remove(key)
+        tags = self._collect_tags(parameters, response.get("result") or {})
+        self._entries[key] = (copy.deepcopy(response), time.monotonic() + ttl, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+    
+    def invalidate(self, order_number: Optional[str] = None, customer_email: Optional[str] = None) -> int:
+        """Drop entries mentioning an order or customer (everything if neither is given)."""
+        self.generation += 1
+        self.invalidations += 1
+        
+        if order_number is None and customer_email is None:
+            removed = len(self._entries)
+            self._entries.clear()
+            self._tags.clear()
+            return removed
+        
+        keys = set()
+        if order_number is not None:
+            keys |= self._tags.get(f"order:{order_number}", set())
+        if customer_email is not None:
+            keys |= self._tags.get(f"customer:{customer_email.lower()}", set())
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+    
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+    
+    @staticmethod
+    def _collect_tags(parameters: Dict[str, Any], result: Dict[str, Any]) -> Set[str]:
+        """Order numbers and customer emails referenced by a call or its result."""
+        order_numbers = {parameters.get("order_number"), result.get("order_number")}
+        emails = {
+            parameters.get("customer_email"),
+            parameters.get("email"),
+            result.get("customer_email"),
+            result.get("email"),
+            (result.get("customer") or {}).get("email"),
+            (result.get("customer_info") or {}).get("email"),
+        }
+        if "@" in str(parameters.get("identifier", "")):
+            emails.add(parameters["identifier"])
+        
+        for row in (result.get("orders") or []) + (result.get("results") or []) + (result.get("tickets") or []):
+            order_numbers.add(row.get("order_number"))
+            emails.add(row.get("customer_email"))
+        
+        tags = {f"order:{number}" for number in order_numbers if number}
+        tags |= {f"customer:{email.lower()}" for email in emails if email}
+        return tags
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class ToolCallBatch:
+    """
+    Collects tool calls made in the same event-loop iteration and sends them
+    in one request: /tools/batch for several, the regular cached path for one.
+    
+    Callers started together (e.g. by asyncio.gather) each await their own
+    result. A caller that is cancelled only stops waiting; the shared request
+    still completes for the others.
+    """
+    
+    def __init__(self, client: "MCPClient"):
+        self.client = client
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._requests: Set[asyncio.Task] = set()
+    
+    async def call_tool(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(({"tool_name": tool_name, "parameters": parameters}, future))
+        if len(self._pending) == 1:
+            # Runs after every caller already scheduled in this iteration has queued its call;
+            # an empty context so the request itself is not batched again
+            loop.call_soon(self._send, context=contextvars.Context())
+        return await future
+    
+    def _send(self):
+        pending, self._pending = self._pending, []
+        calls = [call for call, _ in pending]
+        if len(calls) == 1:
+            request = asyncio.ensure_future(self.client.call_tool(calls[0]["tool_name"], calls[0]["parameters"]))
+        else:
+            request = asyncio.ensure_future(self.client.call_tools(calls))
+        self._requests.add(request)
+        request.add_done_callback(lambda done: self._resolve(done, pending))
+    
+    def _resolve(self, request: asyncio.Task, pending: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        self._requests.discard(request)
+        if request.cancelled() or request.exception() is not None:
+            error = request.exception() if not request.cancelled() else asyncio.CancelledError()
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        
+        results = request.result()
+        if len(pending) == 1:
+            results = [results]
+        for (_, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+
+# Set by MCPClient.batch() for the calls made inside it
+_current_batch: contextvars.ContextVar[Optional[ToolCallBatch]] = contextvars.ContextVar(
+    "mcp_tool_call_batch", default=None
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised when the MCP server circuit breaker rejects a call."""
+
+
+class CircuitBreaker:
+    """
+    Fails fast while the MCP server is down.
+    
+    After failure_threshold consecutive failures the circuit opens and calls
+    are rejected for reset_timeout_seconds. Then a single trial call is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+    
+    def allow(self) -> bool:
+        """Return whether a call may be attempted now."""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout_seconds:
+                self.rejected += 1
+                return False
+            self.state = "half_open"
+            self.trial_in_flight = False
+        
+        if self.state == "half_open":
+            if self.trial_in_flight:
+                self.rejected += 1
+                return False
+            self.trial_in_flight = True
+        
+        return True
+    
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.trial_in_flight = False
+    
+    def release_trial(self):
+        """Let another call be the trial after one ended without an outcome (e.g. it was cancelled)."""
+        if self.state == "half_open":
+            self.trial_in_flight = False
+    
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                logger.warning(f"MCP circuit breaker opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
 
 class MCPClient:
     def __init__(self):
         self.mcp_url = os.getenv("MCP_SERVER_URL", "http://localhost:8001")
         self.client = None
+        
+        ttls = dict(DEFAULT_TOOL_CACHE_TTLS)
+        ttls.update(parse_tool_ttls(os.getenv("MCP_CACHE_TTLS", "")))
+        if os.getenv("MCP_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+            ttls = {}
+        self.cache = ToolResultCache(
+            ttls,
+            negative_ttl_seconds=float(os.getenv("MCP_CACHE_NEGATIVE_TTL_SECONDS", "10")),
+            max_entries=int(os.getenv("MCP_CACHE_SIZE", "1000")),
+        )
+        self._inflight: Dict[str, asyncio.Task] = {}
+        
+        # Shared transport configuration
+        self.limits = httpx.Limits(
+            max_connections=int(os.getenv("MCP_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv("MCP_MAX_KEEPALIVE_CONNECTIONS", "10")),
+            keepalive_expiry=float(os.getenv("MCP_KEEPALIVE_EXPIRY_SECONDS", "30")),
+        )
+        self.timeout = httpx.Timeout(
+            connect=float(os.getenv("MCP_CONNECT_TIMEOUT_SECONDS", "2")),
+            read=float(os.getenv("MCP_READ_TIMEOUT_SECONDS", "10")),
+            write=float(os.getenv("MCP_WRITE_TIMEOUT_SECONDS", "10")),
+            pool=float(os.getenv("MCP_POOL_TIMEOUT_SECONDS", "5")),
+        )
+        self.http2 = os.getenv("MCP_HTTP2", "false").lower() in ("1", "true", "yes")
+        self.max_retries = int(os.getenv("MCP_MAX_RETRIES", "2"))
+        self.retry_base_delay = float(os.getenv("MCP_RETRY_BASE_DELAY_SECONDS", "0.1"))
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("MCP_CIRCUIT_FAILURE_THRESHOLD", "5")),
+            reset_timeout_seconds=float(os.getenv("MCP_CIRCUIT_RESET_SECONDS", "30")),
+        )
+        self._init_lock = None
+        
+        # Pool utilization metrics
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.latency_histogram = Histogram([5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000])
     
     async def initialize(self):
-        """Initialize HTTP client."""
-        self.client = httpx.AsyncClient(timeout=30.0)
-        logger.info(f"MCP Client initialized with URL: {self.mcp_url}")
+        """Create the shared HTTP client once; later calls reuse it."""
+        if self.client is not None:
+            return
+        
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+        
+        async with self._init_lock:
+            if self.client is not None:
+                return
+            
+            http2 = self.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("MCP_HTTP2 is enabled but the h2 package is not installed; using HTTP/1.1")
+                    http2 = False
+            self.http2 = http2
+            
+            self.client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout, http2=http2)
+            logger.info(f"MCP Client initialized with URL: {self.mcp_url} (http2={http2}, limits={self.limits})")
     
     async def close(self):
         """Close HTTP client."""
         if self.client:
             await self.client.aclose()
+            self.client = None
             logger.info("MCP Client closed")
     
+    async def _request(self, method: str, path: str, idempotent: bool = False, **kwargs) -> httpx.Response:
+        """
+        Send a request to the MCP server through the circuit breaker.
+        
+        Idempotent requests are retried on transport errors and gateway
+        responses with full-jitter exponential backoff.
+        """
+        if not self.client:
+            await self.initialize()
+        
+        attempts = 1 + (self.max_retries if idempotent else 0)
+        for attempt in range(attempts):
+            if attempt:
+                self.retries += 1
+                await asyncio.sleep(random.uniform(0, self.retry_base_delay * 2 ** (attempt - 1)))
+            
+            if not self.breaker.allow():
+                raise CircuitOpenError("MCP server circuit breaker is open")
+            trial = self.breaker.state == "half_open"
+            
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            start = time.perf_counter()
+            try:
+                response = await getattr(self.client, method)(f"{self.mcp_url}{path}", **kwargs)
+            except httpx.TransportError:
+                self.breaker.record_failure()
+                if attempt == attempts - 1:
+                    raise
+                continue
+            finally:
+                self.in_flight -= 1
+                self.latency_histogram.observe((time.perf_counter() - start) * 1000)
+                if trial:
+                    # Released on every exit, including cancellation; a recorded outcome
+                    # below then closes or re-opens the circuit
+                    self.breaker.release_trial()
+            
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+                if response.status_code in RETRYABLE_STATUS_CODES and attempt < attempts - 1:
+                    continue
+            else:
+                self.breaker.record_success()
+            return response
+    
     async def call_tool(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Call a tool on the MCP server.
+        Call a tool on the MCP server, reading through the result cache.
+        
+        Concurrent identical calls share a single request to the MCP server.
+        Inside batch(), the call is sent together with the others made at the
+        same time.
         
         Args:
             tool_name: Name of the tool to call
@@ -39,14 +457,77 @@ class MCPClient:
         Returns:
             Tool execution result
         """
-        try:
-            if not self.client:
-                await self.initialize()
+        batch = _current_batch.get()
+        if batch is not None:
+            return await batch.call_tool(tool_name, parameters)
+        
+        if not self.cache.cacheable(tool_name):
+            return await self._call_tool(tool_name, parameters)
+        
+        key = self.cache.key(tool_name, parameters)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_and_cache(key, tool_name, parameters))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.cache.coalesced += 1
+        
+        # Shielded so one cancelled caller does not cancel the request for the others
+        return copy.deepcopy(await asyncio.shield(task))
+    
+    async def _fetch_and_cache(self, key: str, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        generation = self.cache.generation
+        result = await self._call_tool(tool_name, parameters)
+        self.cache.put(key, tool_name, parameters, result, generation=generation)
+        return result
+    
+    def invalidate(self, order_number: Optional[str] = None, customer_email: Optional[str] = None) -> int:
+        """
+        Drop cached tool results after an order or payment changes.
+        
+        Args:
+            order_number: Order whose cached lookups should be dropped
+            customer_email: Customer whose cached lookups should be dropped
             
+        Returns:
+            Number of cache entries removed (everything if neither is given)
+        """
+        removed = self.cache.invalidate(order_number=order_number, customer_email=customer_email)
+        logger.info(f"Invalidated {removed} cached MCP results (order={order_number}, customer={customer_email})")
+        return removed
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return tool result cache, connection pool and circuit breaker statistics."""
+        return {
+            "cache": self.cache.get_stats(),
+            "pool": {
+                "http2": self.http2,
+                "max_connections": self.limits.max_connections,
+                "max_keepalive_connections": self.limits.max_keepalive_connections,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "utilization": round(self.in_flight / self.limits.max_connections, 3) if self.limits.max_connections else 0.0,
+                "requests": self.requests,
+                "retries": self.retries,
+                "latency_ms": self.latency_histogram.snapshot(),
+            },
+            "circuit_breaker": self.breaker.get_stats(),
+        }
+    
+    async def _call_tool(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a single tool call to the MCP server."""
+        try:
             logger.info(f"Calling MCP tool: {tool_name} with parameters: {parameters}")
             
-            response = await self.client.post(
-                f"{self.mcp_url}/tools/call",
+            response = await self._request(
+                "post",
+                "/tools/call",
+                idempotent=tool_name in IDEMPOTENT_TOOLS,
                 json={
                     "tool_name": tool_name,
                     "parameters": parameters
@@ -64,6 +545,12 @@ class MCPClient:
                     "error": f"MCP server error: {response.status_code}"
                 }
                 
+        except CircuitOpenError as e:
+            logger.warning(f"Skipping MCP tool {tool_name}: {e}")
+            return {
+                "success": False,
+                "error": f"MCP server unavailable: {str(e)}"
+            }
         except httpx.RequestError as e:
             logger.error(f"Network error calling MCP tool {tool_name}: {e}")
             return {
@@ -77,6 +564,101 @@ class MCPClient:
                 "error": f"Unexpected error: {str(e)}"
             }
     
+    @contextmanager
+    def batch(self):
+        """
+        Send tool calls made together inside this block in one round-trip.
+        
+        Applies to calls from tasks created inside the block, so independent
+        lookups started with asyncio.gather share a single /tools/batch request.
+        """
+        token = _current_batch.set(ToolCallBatch(self))
+        try:
+            yield
+        finally:
+            _current_batch.reset(token)
+    
+    async def call_tools(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Call several tools on the MCP server in a single round-trip.
+        
+        Cached results are served locally; only the remaining calls are sent.
+        
+        Args:
+            calls: List of {"tool_name": ..., "parameters": ...} dictionaries
+            
+        Returns:
+            Tool execution results in the same order as calls; a failed call
+            yields an error result without affecting the others
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(calls)
+        pending = []
+        for index, call in enumerate(calls):
+            if self.cache.cacheable(call["tool_name"]):
+                cached = self.cache.get(self.cache.key(call["tool_name"], call.get("parameters", {})))
+                if cached is not None:
+                    results[index] = cached
+                    continue
+            pending.append(index)
+        
+        if pending:
+            # Only cache misses go to the MCP server
+            generation = self.cache.generation
+            fetched = await self._call_tools([calls[index] for index in pending])
+            for index, result in zip(pending, fetched):
+                tool_name, parameters = calls[index]["tool_name"], calls[index].get("parameters", {})
+                if self.cache.cacheable(tool_name):
+                    self.cache.put(self.cache.key(tool_name, parameters), tool_name, parameters, result,
+                                   generation=generation)
+                results[index] = result
+        
+        return results
+    
+    async def _call_tools(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Send a batch of tool calls to the MCP server."""
+        if not calls:
+            return []
+        
+        try:
+            logger.info(f"Calling {len(calls)} MCP tools in batch: {[call['tool_name'] for call in calls]}")
+            
+            response = await self._request(
+                "post",
+                "/tools/batch",
+                idempotent=all(call["tool_name"] in IDEMPOTENT_TOOLS for call in calls),
+                json={"calls": calls}
+            )
+            
+            if response.status_code == 200:
+                return response.json()["results"]
+            else:
+                logger.error(f"MCP batch tool call failed with status {response.status_code}: {response.text}")
+                error = {
+                    "success": False,
+                    "error": f"MCP server error: {response.status_code}"
+                }
+                
+        except CircuitOpenError as e:
+            logger.warning(f"Skipping MCP tool batch: {e}")
+            error = {
+                "success": False,
+                "error": f"MCP server unavailable: {str(e)}"
+            }
+        except httpx.RequestError as e:
+            logger.error(f"Network error calling MCP tools in batch: {e}")
+            error = {
+                "success": False,
+                "error": f"Network error: {str(e)}"
+            }
+        except Exception as e:
+            logger.error(f"Unexpected error calling MCP tools in batch: {e}")
+            error = {
+                "success": False,
+                "error": f"Unexpected error: {str(e)}"
+            }
+        
+        return [dict(error) for _ in calls]
+    
     async def get_order_details(self, order_number: str) -> Dict[str, Any]:
         """
         Get detailed order information.
@@ -155,10 +737,7 @@ class MCPClient:
     async def health_check(self) -> str:
         """Check MCP server health."""
         try:
-            if not self.client:
-                await self.initialize()
-            
-            response = await self.client.get(f"{self.mcp_url}/health")
+            response = await self._request("get", "/health")
             if response.status_code == 200:
                 return "healthy"
             else:
@@ -194,6 +773,22 @@ class MCPClient:
             Customer information or error information
         """
         return await self.call_tool("get_customer_by_identifier", {"identifier": identifier})
+    
+    async def get_customer_with_orders(self, identifier: str, limit: int = 10) -> Dict[str, Any]:
+        """
+        Get customer information and recent orders in a single MCP call.
+        
+        Args:
+            identifier: Customer identifier (email, UUID, friendly name like 'customer123', or customer name)
+            limit: Maximum number of orders to return
+            
+        Returns:
+            Customer information with orders, or error information
+        """
+        return await self.call_tool("get_customer_with_orders", {
+            "identifier": identifier,
+            "limit": limit
+        })
 
 
 # Global MCP client instance
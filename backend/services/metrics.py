@@ -0,0 +1,36 @@
+"""
+Lightweight in-process metrics used to tune the backend services.
+These are intentionally dependency-free and are exposed through the /metrics endpoint.
+"""
+
+import bisect
+from typing import Dict, Any, Sequence
+
+
+class Histogram:
+    """Fixed-bucket histogram recording observation counts per upper bound."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = sorted(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        """Record a single observation."""
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a JSON-serializable view of the histogram."""
+        labels = [f"le_{bound:g}" for bound in self.buckets] + ["le_inf"]
+        return {
+            "buckets": dict(zip(labels, self.bucket_counts)),
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "mean": round(self.sum / self.count, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+        }
@@ -1,7 +1,7 @@
 import logging
 import os
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import List, Dict, Any, Optional
 
 from qdrant_client import AsyncQdrantClient
@@ -14,17 +14,82 @@ from qdrant_client.models import (
     FieldCondition,
     MatchValue,
     Range,
+    PointsList,
+    PointIdsList,
+    SetPayload,
+    UpsertOperation,
+    SetPayloadOperation,
+    DeleteOperation,
+    PayloadSchemaType,
+    OrderBy,
+    Direction,
+    HnswConfigDiff,
+    VectorParamsDiff,
+    CollectionParamsDiff,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    ProductQuantization,
+    ProductQuantizationConfig,
+    CompressionRatio,
+    Disabled,
+    SearchParams,
+    QuantizationSearchParams,
 )
 import numpy as np
 
+from .batching import WriteBehindBuffer
+
 logger = logging.getLogger(__name__)
 
+# Payload indexes backing the history filters and the server-side timestamp ordering
+PAYLOAD_INDEXES = {
+    "user_id": PayloadSchemaType.KEYWORD,
+    "session_id": PayloadSchemaType.KEYWORD,
+    "type": PayloadSchemaType.KEYWORD,
+    "timestamp": PayloadSchemaType.DATETIME,
+}
+
 
 class QdrantService:
+    """
+    Qdrant access for conversation storage and retrieval.
+    
+    Conversation points are written through a write-behind buffer that
+    coalesces concurrent stores into bulk upserts (QDRANT_WRITE_BEHIND=false
+    upserts each point directly). Response updates go through the same
+    buffer, so an update is never applied before the point it modifies.
+    QDRANT_UPSERT_WAIT=false acknowledges writes before Qdrant has applied them.
+    
+    The collection's storage layout is configurable: QDRANT_QUANTIZATION
+    ("none", "scalar" for int8, or "product"), on-disk vectors and payload,
+    and the HNSW m/ef_construct parameters. Quantized searches rescore an
+    oversampled candidate set with the original vectors. Existing
+    collections are brought in line by migrate_collection.
+    """
+    
     def __init__(self):
         self.client = None
         self.collection_name = "customer_conversations"
         self.vector_size = 512  # CLIP embedding size
+        self.write_behind = os.getenv("QDRANT_WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+        self.upsert_wait = os.getenv("QDRANT_UPSERT_WAIT", "true").lower() in ("1", "true", "yes")
+        self.write_buffer = WriteBehindBuffer(
+            self._write_operations,
+            max_batch_size=int(os.getenv("QDRANT_WRITE_BATCH_SIZE", "64")),
+            flush_interval_ms=float(os.getenv("QDRANT_WRITE_FLUSH_INTERVAL_MS", "50")),
+            max_pending=int(os.getenv("QDRANT_WRITE_MAX_PENDING", "1000")),
+        )
+        self.quantization = os.getenv("QDRANT_QUANTIZATION", "none").lower()
+        self.quantization_quantile = float(os.getenv("QDRANT_QUANTIZATION_QUANTILE", "0.99"))
+        self.quantization_always_ram = os.getenv("QDRANT_QUANTIZATION_ALWAYS_RAM", "true").lower() in ("1", "true", "yes")
+        self.product_compression = CompressionRatio(os.getenv("QDRANT_PRODUCT_COMPRESSION", "x16").lower())
+        self.search_oversampling = float(os.getenv("QDRANT_SEARCH_OVERSAMPLING", "2.0"))
+        self.vectors_on_disk = os.getenv("QDRANT_VECTORS_ON_DISK", "false").lower() in ("1", "true", "yes")
+        self.payload_on_disk = os.getenv("QDRANT_PAYLOAD_ON_DISK", "false").lower() in ("1", "true", "yes")
+        self.hnsw_m = int(os.getenv("QDRANT_HNSW_M", "16"))
+        self.hnsw_ef_construct = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+        self.migrate_on_start = os.getenv("QDRANT_MIGRATE_ON_START", "false").lower() in ("1", "true", "yes")
         
     async def initialize(self):
         """Initialize Qdrant client and collections."""
@@ -55,16 +120,99 @@ class QdrantService:
                     vectors_config=VectorParams(
                         size=self.vector_size,
                         distance=Distance.COSINE,
+                        on_disk=self.vectors_on_disk,
                     ),
+                    hnsw_config=HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct),
+                    quantization_config=self.quantization_config(),
+                    on_disk_payload=self.payload_on_disk,
                 )
-                logger.info(f"Created collection: {self.collection_name}")
+                logger.info(f"Created collection: {self.collection_name} (quantization={self.quantization})")
             else:
                 logger.info(f"Collection {self.collection_name} already exists")
+                # Changing storage settings rebuilds segments, so it only happens when asked for
+                changes = await self.migrate_collection(dry_run=not self.migrate_on_start)
+                if changes and not self.migrate_on_start:
+                    logger.warning(
+                        f"Collection {self.collection_name} differs from configured settings ({', '.join(changes)}); "
+                        "run scripts.migrate_collection or set QDRANT_MIGRATE_ON_START=true"
+                    )
+            
+            await self._ensure_payload_indexes()
                 
         except Exception as e:
             logger.error(f"Error initializing collections: {e}")
             raise
     
+    def quantization_config(self):
+        """Quantization settings for the configured QDRANT_QUANTIZATION mode, or None."""
+        if self.quantization == "scalar":
+            return ScalarQuantization(scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8,
+                quantile=self.quantization_quantile,
+                always_ram=self.quantization_always_ram,
+            ))
+        if self.quantization == "product":
+            return ProductQuantization(product=ProductQuantizationConfig(
+                compression=self.product_compression,
+                always_ram=self.quantization_always_ram,
+            ))
+        if self.quantization != "none":
+            raise ValueError(f"Unknown QDRANT_QUANTIZATION: {self.quantization}")
+        return None
+    
+    def search_params(self) -> Optional[SearchParams]:
+        """Rescore oversampled quantized candidates with the original vectors."""
+        if self.quantization == "none":
+            return None
+        return SearchParams(quantization=QuantizationSearchParams(
+            rescore=True,
+            oversampling=self.search_oversampling,
+        ))
+    
+    async def migrate_collection(self, dry_run: bool = False) -> List[str]:
+        """
+        Bring an existing collection's storage settings in line with the configuration.
+        
+        Qdrant applies the changes in place and rebuilds affected segments in
+        the background, so the collection stays searchable. Returns the names
+        of the settings that differ (and were updated unless dry_run).
+        """
+        await self.initialize()
+        
+        config = (await self.client.get_collection(self.collection_name)).config
+        desired_quantization = self.quantization_config()
+        update = {}
+        
+        if bool(config.params.vectors.on_disk) != self.vectors_on_disk:
+            update["vectors_config"] = {"": VectorParamsDiff(on_disk=self.vectors_on_disk)}
+        if bool(config.params.on_disk_payload) != self.payload_on_disk:
+            update["collection_params"] = CollectionParamsDiff(on_disk_payload=self.payload_on_disk)
+        if (config.hnsw_config.m, config.hnsw_config.ef_construct) != (self.hnsw_m, self.hnsw_ef_construct):
+            update["hnsw_config"] = HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+        if config.quantization_config != desired_quantization:
+            update["quantization_config"] = desired_quantization or Disabled.DISABLED
+        
+        if update and not dry_run:
+            await self.client.update_collection(collection_name=self.collection_name, **update)
+            logger.info(f"Migrated collection {self.collection_name}: {', '.join(update)}")
+        
+        return list(update)
+    
+    async def _ensure_payload_indexes(self):
+        """Create any missing payload indexes on the conversations collection."""
+        collection = await self.client.get_collection(self.collection_name)
+        existing = collection.payload_schema or {}
+        
+        for field_name, field_schema in PAYLOAD_INDEXES.items():
+            if field_name not in existing:
+                await self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema,
+                    wait=True,
+                )
+                logger.info(f"Created {field_schema.value} payload index on {field_name}")
+    
     async def health_check(self) -> str:
         """Check Qdrant health."""
         try:
@@ -75,6 +223,67 @@ class QdrantService:
             logger.error(f"Qdrant health check failed: {e}")
             return "unhealthy"
     
+    async def _write_operations(self, operations: List[Any]):
+        """Write a batch of buffered points and payload updates in one request, in order."""
+        if all(isinstance(operation, PointStruct) for operation in operations):
+            await self.client.upsert(
+                collection_name=self.collection_name,
+                points=operations,
+                wait=self.upsert_wait,
+            )
+            return
+        
+        update_operations = []
+        for operation in operations:
+            if isinstance(operation, PointStruct):
+                # Consecutive points share one upsert
+                if update_operations and isinstance(update_operations[-1], UpsertOperation):
+                    update_operations[-1].upsert.points.append(operation)
+                else:
+                    update_operations.append(UpsertOperation(upsert=PointsList(points=[operation])))
+            else:
+                update_operations.append(operation)
+        
+        try:
+            await self.client.batch_update_points(
+                collection_name=self.collection_name,
+                update_operations=update_operations,
+                wait=self.upsert_wait,
+            )
+        except Exception as e:
+            # An update for a point that was never written fails the whole request;
+            # retry operations one at a time so the rest of the batch still lands
+            logger.warning(f"Batched Qdrant write failed, retrying operations individually: {e}")
+            error = None
+            for update_operation in update_operations:
+                try:
+                    await self.client.batch_update_points(
+                        collection_name=self.collection_name,
+                        update_operations=[update_operation],
+                        wait=self.upsert_wait,
+                    )
+                except Exception as operation_error:
+                    logger.error(f"Qdrant write operation failed: {operation_error}")
+                    error = operation_error
+            if error is not None:
+                raise error
+    
+    async def flush(self):
+        """Write out any buffered conversation points."""
+        await self.write_buffer.flush()
+    
+    async def close(self):
+        """Flush buffered writes and stop the write-behind buffer."""
+        await self.write_buffer.close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return write-behind buffer statistics."""
+        return {
+            "write_behind": self.write_behind,
+            "upsert_wait": self.upsert_wait,
+            "write_buffer": self.write_buffer.get_stats(),
+        }
+    
     async def store_conversation(
         self,
         user_id: str,
@@ -83,8 +292,14 @@ class QdrantService:
         sentiment: Dict[str, float] = None,
         embedding: List[float] = None,
         session_id: str = None,
+        wait: bool = True,
     ):
-        """Store a conversation in Qdrant."""
+        """
+        Store a conversation in Qdrant and return its point ID.
+        
+        With wait=False the point is only queued on the write-behind buffer;
+        the ID is assigned up front so it can be returned immediately.
+        """
         await self.initialize()
         
         try:
@@ -111,10 +326,10 @@ class QdrantService:
                 payload=payload,
             )
             
-            await self.client.upsert(
-                collection_name=self.collection_name,
-                points=[point],
-            )
+            if self.write_behind:
+                await self.write_buffer.submit(point, wait=wait)
+            else:
+                await self._write_operations([point])
             
             logger.info(f"Stored conversation for user {user_id}, session {session_id}")
             return point_id
@@ -146,16 +361,17 @@ class QdrantService:
                     ]
                 )
             
-            results = await self.client.search(
+            results = await self.client.query_points(
                 collection_name=self.collection_name,
-                query_vector=query_embedding,
+                query=query_embedding,
                 query_filter=query_filter,
                 limit=limit,
                 with_payload=True,
+                search_params=self.search_params(),
             )
             
             formatted_results = []
-            for result in results:
+            for result in results.points:
                 formatted_results.append({
                     "id": result.id,
                     "score": result.score,
@@ -197,22 +413,16 @@ class QdrantService:
             
             query_filter = Filter(must=filter_conditions)
             
-            # Use scroll to get all matching conversations without vector similarity
+            # Qdrant returns the newest matches first using the timestamp index
             results = await self.client.scroll(
                 collection_name=self.collection_name,
                 scroll_filter=query_filter,
                 limit=limit,
                 with_payload=True,
+                order_by=OrderBy(key="timestamp", direction=Direction.DESC),
             )
             
-            # Sort by timestamp (most recent first)
-            conversations = [result.payload for result in results[0]]
-            conversations.sort(
-                key=lambda x: x.get("timestamp", ""),
-                reverse=True,
-            )
-            
-            return conversations
+            return [result.payload for result in results[0]]
             
         except Exception as e:
             logger.error(f"Error fetching user conversations: {e}")
@@ -236,22 +446,16 @@ class QdrantService:
                 ]
             )
             
-            # Use scroll to get all matching conversations
+            # Fetch the newest turns server-side, then return them oldest first for conversation flow
             results = await self.client.scroll(
                 collection_name=self.collection_name,
                 scroll_filter=query_filter,
                 limit=limit,
                 with_payload=True,
+                order_by=OrderBy(key="timestamp", direction=Direction.DESC),
             )
             
-            # Sort by timestamp (chronological order, oldest first for conversation flow)
-            conversations = [result.payload for result in results[0]]
-            conversations.sort(
-                key=lambda x: x.get("timestamp", ""),
-                reverse=False,  # Oldest first for conversation context
-            )
-            
-            return conversations
+            return [result.payload for result in reversed(results[0])]
             
         except Exception as e:
             logger.error(f"Error fetching session conversations: {e}")
@@ -259,34 +463,116 @@ class QdrantService:
     
     async def update_conversation_response(
         self,
-        user_id: str,
-        session_id: str,
+        point_id: str,
         response: str,
         final_sentiment: Dict[str, float],
+        wait: bool = True,
     ):
-        """Update a conversation with the final response."""
-        # This is a simplified implementation
-        # In production, you'd want to track point IDs more carefully
-        logger.info(f"Updated conversation response for user {user_id}")
-    
-    async def get_sentiment_analytics(self, days: int = 7) -> Dict[str, Any]:
-        """Get sentiment analytics for the dashboard."""
+        """
+        Set the final response and sentiment on a stored conversation point.
+        
+        With write-behind enabled the update is queued behind the point's own
+        upsert; wait=False returns as soon as it is queued.
+        """
         await self.initialize()
         
+        payload = {
+            "response": response,
+            "sentiment": final_sentiment or {},
+        }
+        
         try:
-            # Calculate date range
-            end_date = datetime.utcnow()
-            start_date = end_date - timedelta(days=days)
+            if self.write_behind:
+                await self.write_buffer.submit(
+                    SetPayloadOperation(set_payload=SetPayload(payload=payload, points=[point_id])),
+                    wait=wait,
+                )
+            else:
+                await self.client.set_payload(
+                    collection_name=self.collection_name,
+                    payload=payload,
+                    points=[point_id],
+                    wait=self.upsert_wait,
+                )
             
-            # This is a simplified implementation
-            # In production, you'd want more sophisticated analytics
-            return {
-                "period": f"{days} days",
-                "avg_sentiment": {"positive": 0.6, "neutral": 0.3, "negative": 0.1},
-                "total_conversations": 150,
-                "trend": "improving",
-            }
+            logger.info(f"Updated conversation response for point {point_id}")
             
         except Exception as e:
-            logger.error(f"Error fetching sentiment analytics: {e}")
-            return {}
+            logger.error(f"Error updating conversation response: {e}")
+            raise
+    
+    async def compact_conversations(self, dry_run: bool = False, page_size: int = 256) -> Dict[str, int]:
+        """
+        Merge duplicate conversation pairs left by older versions of the chat flow.
+        
+        Each turn used to store an ingest point (real embedding, empty response)
+        and a second point with a zero vector carrying the response. The response
+        and sentiment are copied onto the ingest point and the zero-vector point
+        is deleted. Returns counts of points scanned and pairs merged.
+        """
+        await self.initialize()
+        
+        # Scan the collection, grouping turns by (user, session, message)
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        scanned = 0
+        offset = None
+        while True:
+            records, offset = await self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=Filter(must=[FieldCondition(key="type", match=MatchValue(value="conversation"))]),
+                limit=page_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            for record in records:
+                scanned += 1
+                payload = record.payload or {}
+                key = (payload.get("user_id"), payload.get("session_id"), payload.get("message"))
+                groups.setdefault(key, []).append({
+                    "id": record.id,
+                    "timestamp": payload.get("timestamp", ""),
+                    "response": payload.get("response", ""),
+                    "sentiment": payload.get("sentiment", {}),
+                    "zero_vector": not any(record.vector or []),
+                })
+            if offset is None:
+                break
+        
+        # Pair each zero-vector point with the earliest unmatched ingest point before it
+        merges = []
+        for points in groups.values():
+            points.sort(key=lambda point: point["timestamp"])
+            unmatched = []
+            for point in points:
+                if not point["zero_vector"]:
+                    if not point["response"]:
+                        unmatched.append(point)
+                elif unmatched:
+                    merges.append((unmatched.pop(0), point))
+        
+        if not dry_run:
+            for start in range(0, len(merges), page_size):
+                chunk = merges[start:start + page_size]
+                update_operations = [
+                    SetPayloadOperation(set_payload=SetPayload(
+                        payload={"response": duplicate["response"], "sentiment": duplicate["sentiment"]},
+                        points=[original["id"]],
+                    ))
+                    for original, duplicate in chunk
+                ]
+                update_operations.append(DeleteOperation(
+                    delete=PointIdsList(points=[duplicate["id"] for _, duplicate in chunk])
+                ))
+                await self.client.batch_update_points(
+                    collection_name=self.collection_name,
+                    update_operations=update_operations,
+                    wait=True,
+                )
+        
+        logger.info(f"Compacted conversations: scanned {scanned}, merged {len(merges)} duplicate pairs (dry_run={dry_run})")
+        return {"scanned": scanned, "merged": len(merges)}
+
+
+# Global Qdrant service instance
+qdrant_service = QdrantService()
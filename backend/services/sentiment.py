@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+import torch
+from transformers import pipeline, AutoModelForSequenceClassification, AutoTokenizer
+
+from .batching import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+
+class SentimentService:
+    """
+    RoBERTa sentiment inference kept off the event loop.
+
+    The pipeline is loaded lazily on first use and runs on a dedicated thread
+    pool. Concurrent messages are coalesced into batched pipeline calls.
+    Setting SENTIMENT_QUANTIZE=true loads an int8 dynamically quantized
+    variant of the model for CPU inference.
+    """
+
+    def __init__(self):
+        self.analyzer = None
+        self.model_name = os.getenv("SENTIMENT_MODEL", "cardiffnlp/twitter-roberta-base-sentiment-latest")
+        self.quantize = os.getenv("SENTIMENT_QUANTIZE", "false").lower() in ("1", "true", "yes")
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("SENTIMENT_WORKERS", "1")),
+            thread_name_prefix="sentiment",
+        )
+        self.batcher = MicroBatcher(
+            lambda texts: self._analyze_batch(texts),
+            max_batch_size=int(os.getenv("SENTIMENT_MAX_BATCH_SIZE", "16")),
+            max_wait_ms=float(os.getenv("SENTIMENT_MAX_WAIT_MS", "10")),
+            executor=self.executor,
+        )
+        self._init_lock = None
+
+    async def initialize(self):
+        """Lazy initialization of the sentiment pipeline (loaded on the inference pool)."""
+        if self.analyzer is not None:
+            return
+
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+
+        async with self._init_lock:
+            if self.analyzer is None:
+                loop = asyncio.get_running_loop()
+                self.analyzer = await loop.run_in_executor(self.executor, self._load_pipeline)
+
+    def _load_pipeline(self):
+        """Build the transformers pipeline (runs in thread pool)."""
+        logger.info(f"Loading sentiment model: {self.model_name} (quantized={self.quantize})")
+
+        if not self.quantize:
+            return pipeline("sentiment-analysis", model=self.model_name)
+
+        model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer, device=-1)
+
+    async def analyze(self, text: str) -> Dict[str, float]:
+        """Return label -> score for a single message."""
+        await self.initialize()
+        return await self.batcher.submit(text)
+
+    def _analyze_batch(self, texts: List[str]) -> List[Dict[str, float]]:
+        """Score a batch of messages in one pipeline call (runs in thread pool)."""
+        results = self.analyzer(texts, top_k=None, truncation=True, batch_size=len(texts))
+        return [{score["label"]: score["score"] for score in scores} for scores in results]
+
+    async def close(self):
+        """Stop batching and release the inference pool."""
+        await self.batcher.close()
+        self.executor.shutdown(wait=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return sentiment batcher statistics."""
+        return {
+            "model": self.model_name,
+            "quantized": self.quantize,
+            "batcher": self.batcher.get_stats(),
+        }
+
+
+# Global sentiment service instance
+sentiment_service = SentimentService()
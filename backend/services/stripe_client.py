@@ -1,35 +1,83 @@
 
 import logging
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 
 import stripe
 from stripe.error import StripeError
 
+from .mcp_client import mcp_client
+
 logger = logging.getLogger(__name__)
 
 
 class StripeService:
+    """
+    Non-blocking Stripe API access.
+    
+    Requests go through the SDK's async methods on one pooled httpx client, so
+    connections are reused and the event loop never waits on Stripe. POSTs
+    carry an idempotency key (the caller's, or one generated per call by the
+    SDK), so the SDK's retries of connection errors, 409s and 5xx responses
+    never create duplicate objects.
+    """
+    
     def __init__(self):
         self.api_key = os.getenv("STRIPE_API_KEY")
         self.webhook_secret = os.getenv("STRIPE_WEBHOOK_SECRET")
+        # Optional API base override, e.g. for stripe-mock or a local fake server
+        self.api_base = os.getenv("STRIPE_API_BASE")
+        self.max_network_retries = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", "2"))
+        self.timeout_seconds = float(os.getenv("STRIPE_TIMEOUT_SECONDS", "30"))
+        self._http_client: Optional[stripe.HTTPXClient] = None
+        self._client: Optional[stripe.StripeClient] = None
         
         if self.api_key:
             stripe.api_key = self.api_key
     
+    @property
+    def client(self) -> stripe.StripeClient:
+        """Async Stripe client, created on first use."""
+        if self._client is None:
+            # The global instance is created on import, before main.py loads .env
+            self.api_key = self.api_key or os.getenv("STRIPE_API_KEY")
+            self._http_client = stripe.HTTPXClient(timeout=self.timeout_seconds)
+            self._client = stripe.StripeClient(
+                self.api_key,
+                base_addresses={"api": self.api_base} if self.api_base else {},
+                max_network_retries=self.max_network_retries,
+                http_client=self._http_client,
+            )
+        return self._client
+    
+    async def close(self):
+        """Close pooled connections to Stripe."""
+        if self._http_client is not None:
+            await self._http_client.close_async()
+            self._http_client = None
+            self._client = None
+    
+    @staticmethod
+    def _request_options(idempotency_key: Optional[str]) -> Dict[str, Any]:
+        return {"idempotency_key": idempotency_key} if idempotency_key else {}
+    
     async def create_payment_intent(
         self,
         amount: int,
         currency: str = "usd",
         metadata: Dict[str, str] = None,
+        idempotency_key: Optional[str] = None,
     ) -> Dict[str, Any]:
-        """Create a Stripe payment intent."""
+        """Create a Stripe payment intent; repeating an idempotency key returns the original intent."""
         try:
-            payment_intent = stripe.PaymentIntent.create(
-                amount=amount,
-                currency=currency,
-                metadata=metadata or {},
-                automatic_payment_methods={"enabled": True},
+            payment_intent = await self.client.payment_intents.create_async(
+                params={
+                    "amount": amount,
+                    "currency": currency,
+                    "metadata": metadata or {},
+                    "automatic_payment_methods": {"enabled": True},
+                },
+                options=self._request_options(idempotency_key),
             )
             
             logger.info(f"Created payment intent: {payment_intent.id}")
@@ -55,19 +103,23 @@ class StripeService:
         success_url: str,
         cancel_url: str,
         metadata: Dict[str, str] = None,
+        idempotency_key: Optional[str] = None,
     ) -> Dict[str, Any]:
         """Create a Stripe checkout session."""
         try:
-            checkout_session = stripe.checkout.Session.create(
-                payment_method_types=["card"],
-                line_items=[{
-                    "price_data": price_data,
-                    "quantity": 1,
-                }],
-                mode="payment",
-                success_url=success_url,
-                cancel_url=cancel_url,
-                metadata=metadata or {},
+            checkout_session = await self.client.checkout.sessions.create_async(
+                params={
+                    "payment_method_types": ["card"],
+                    "line_items": [{
+                        "price_data": price_data,
+                        "quantity": 1,
+                    }],
+                    "mode": "payment",
+                    "success_url": success_url,
+                    "cancel_url": cancel_url,
+                    "metadata": metadata or {},
+                },
+                options=self._request_options(idempotency_key),
             )
             
             logger.info(f"Created checkout session: {checkout_session.id}")
@@ -88,7 +140,7 @@ class StripeService:
         """Verify Stripe webhook signature."""
         try:
             event = stripe.Webhook.construct_event(
-                payload, sig_header, self.webhook_secret
+                payload, sig_header, self.webhook_secret or os.getenv("STRIPE_WEBHOOK_SECRET")
             )
             return event
         except ValueError as e:
@@ -103,6 +155,10 @@ class StripeService:
         event_type = event["type"]
         
         try:
+            if event_type in ("payment_intent.succeeded", "payment_intent.payment_failed", "checkout.session.completed"):
+                # Payment state changed: drop cached lookups so the agent sees the update
+                self._invalidate_cached_orders(event["data"]["object"])
+            
             if event_type == "payment_intent.succeeded":
                 payment_intent = event["data"]["object"]
                 logger.info(f"Payment succeeded: {payment_intent['id']}")
@@ -125,10 +181,30 @@ class StripeService:
             logger.error(f"Error processing webhook event {event_type}: {e}")
             raise
     
-    async def get_recent_events(self, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get recent Stripe events for the dashboard."""
+    def _invalidate_cached_orders(self, payment_object: Dict[str, Any]):
+        """Invalidate cached MCP results for the order and customer a payment refers to."""
+        metadata = payment_object.get("metadata") or {}
+        order_number = metadata.get("order_number") or metadata.get("invoice_number")
+        customer_email = payment_object.get("receipt_email") or (payment_object.get("customer_details") or {}).get("email")
+        
+        if order_number or customer_email:
+            mcp_client.invalidate(order_number=order_number, customer_email=customer_email)
+    
+    async def list_events(
+        self,
+        limit: int = 100,
+        created_gte: Optional[int] = None,
+        starting_after: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """List events newest first; returns the page and whether more follow it."""
+        params: Dict[str, Any] = {"limit": limit}
+        if created_gte is not None:
+            params["created"] = {"gte": created_gte}
+        if starting_after:
+            params["starting_after"] = starting_after
+        
         try:
-            events = stripe.Event.list(limit=limit)
+            events = await self.client.events.list_async(params=params)
             
             formatted_events = []
             for event in events.data:
@@ -136,14 +212,15 @@ class StripeService:
                     "id": event.id,
                     "type": event.type,
                     "created": event.created,
-                    "data": event.data.object,
+                    "data": {"object": event.data.object},
                 })
             
-            return formatted_events
+            return formatted_events, events.has_more
             
         except StripeError as e:
-            logger.error(f"Error fetching Stripe events: {e}")
-            return []
-        except Exception as e:
-            logger.error(f"Error fetching Stripe events: {e}")
-            return []
+            logger.error(f"Error listing Stripe events: {e}")
+            raise
+
+
+# Global Stripe service instance
+stripe_service = StripeService()
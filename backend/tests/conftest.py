@@ -0,0 +1,10 @@
+import pytest
+
+from fake_stripe import FakeStripeServer
+
+
+@pytest.fixture
+def fake_stripe():
+    """A local fake Stripe API server."""
+    with FakeStripeServer() as server:
+        yield server
@@ -0,0 +1,191 @@
+"""
+Local fake of the Stripe API endpoints StripeService uses, for tests and benchmarks.
+
+Serves payment intents, checkout sessions and the event list over HTTP/1.1
+keep-alive on 127.0.0.1, with configurable latency and injectable failures.
+POSTs honour Idempotency-Key like Stripe does: a repeated key replays the
+original response instead of creating another object.
+
+    with FakeStripeServer(latency_seconds=0.05) as server:
+        os.environ["STRIPE_API_BASE"] = server.url
+"""
+
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+
+def parse_form(body: str) -> Dict[str, Any]:
+    """Decode Stripe's form encoding, including nested keys such as metadata[user_id]."""
+    params: Dict[str, Any] = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = key.replace("]", "").split("[")
+        target = params
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return params
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog of 5 drops bursts of concurrent connects
+    request_queue_size = 128
+
+
+class FakeStripeServer:
+    """Threaded fake Stripe API server; use as a context manager or call start()/stop()."""
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.requests: List[Dict[str, Any]] = []
+        self.connections = 0
+        self.events: List[Dict[str, Any]] = []
+        self._idempotent: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self._failures: List[int] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def fail_next(self, count: int = 1, status: int = 500):
+        """Answer the next `count` requests with an API error of the given status."""
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def start(self) -> "FakeStripeServer":
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; without TCP_NODELAY every
+            # keep-alive response would stall on delayed ACKs
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_GET(self):
+                self._respond(*server.handle("GET", self.path, self.headers, ""))
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+                self._respond(*server.handle("POST", self.path, self.headers, body))
+
+            def _respond(self, status: int, payload: Dict[str, Any], headers: Dict[str, str]):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = _Server(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeStripeServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, method: str, path: str, headers, body: str) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+        """Route one request; returns (status, JSON payload, extra headers)."""
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+        url = urlsplit(path)
+        params = parse_form(body if method == "POST" else url.query)
+        idempotency_key = headers.get("Idempotency-Key")
+
+        with self._lock:
+            self.requests.append({
+                "method": method,
+                "path": url.path,
+                "params": params,
+                "idempotency_key": idempotency_key,
+            })
+            if self._failures:
+                status = self._failures.pop(0)
+                return status, {"error": {"type": "api_error", "message": "Injected failure"}}, {}
+            if method == "POST" and idempotency_key in self._idempotent:
+                status, payload = self._idempotent[idempotency_key]
+                return status, payload, {"Idempotent-Replayed": "true"}
+
+            status, payload = self._route(method, url.path, params)
+            if method == "POST" and idempotency_key:
+                self._idempotent[idempotency_key] = (status, payload)
+            return status, payload, {}
+
+    def _route(self, method: str, path: str, params: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        number = next(self._ids)
+        if method == "POST" and path == "/v1/payment_intents":
+            intent = {
+                "id": f"pi_fake{number}",
+                "object": "payment_intent",
+                "amount": int(params["amount"]),
+                "currency": params.get("currency", "usd"),
+                "status": "requires_payment_method",
+                "client_secret": f"pi_fake{number}_secret",
+                "metadata": params.get("metadata", {}),
+            }
+            self.events.append(self._event(number, "payment_intent.created", intent))
+            return 200, intent
+        if method == "POST" and path == "/v1/checkout/sessions":
+            session = {
+                "id": f"cs_fake{number}",
+                "object": "checkout.session",
+                "url": f"https://checkout.stripe.com/c/pay/cs_fake{number}",
+                "metadata": params.get("metadata", {}),
+            }
+            return 200, session
+        if method == "GET" and path == "/v1/events":
+            limit = int(params.get("limit", 10))
+            events = list(reversed(self.events))
+            created_gte = params.get("created", {}).get("gte")
+            if created_gte is not None:
+                events = [event for event in events if event["created"] >= int(created_gte)]
+            if "starting_after" in params:
+                ids = [event["id"] for event in events]
+                events = events[ids.index(params["starting_after"]) + 1:]
+            return 200, {
+                "object": "list",
+                "url": "/v1/events",
+                "has_more": len(events) > limit,
+                "data": events[:limit],
+            }
+        return 404, {"error": {"type": "invalid_request_error", "message": f"Unrecognized request URL ({method}: {path})"}}
+
+    @staticmethod
+    def _event(number: int, event_type: str, obj: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": f"evt_fake{number}",
+            "object": "event",
+            "type": event_type,
+            "created": int(time.time()),
+            "data": {"object": obj},
+        }
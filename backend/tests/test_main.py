@@ -61,6 +61,42 @@ def test_chat_endpoint(mock_store_conversation, mock_graph_invoke):
     assert "actions_taken" in data
 
 
+@patch('main.qdrant_service.store_conversation')
+def test_chat_stream_endpoint(mock_store_conversation):
+    """Test the streaming chat endpoint emits node, token and done events."""
+    final_state = {
+        "response": "Your order has shipped.",
+        "sentiment": {"positive": 0.9},
+        "actions_taken": ["response_generated"],
+        "session_id": "test_session",
+    }
+    
+    async def fake_astream(initial_state, config=None, stream_mode=None):
+        yield "updates", {"ingest": {}}
+        yield "custom", {"type": "token", "content": "Your order "}
+        yield "custom", {"type": "token", "content": "has shipped."}
+        yield "updates", {"policy": final_state}
+        yield "values", final_state
+    
+    with patch('main.customer_service_graph.astream', fake_astream):
+        response = client.post(
+            "/chat/stream",
+            json={"user": "test_user", "message": "Where is my order #123?"}
+        )
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+        for block in response.text.strip().split("\n\n")
+    ]
+    assert [name for name, _ in events] == ["node", "token", "token", "node", "done"]
+    assert "".join(data["content"] for name, data in events if name == "token") == final_state["response"]
+    assert events[-1][1]["response"] == final_state["response"]
+    # The graph's memory node updates the point stored at ingest; no second point is written
+    mock_store_conversation.assert_not_called()
+
+
 @patch('main.embedding_service.get_text_embedding')
 @patch('main.qdrant_service.search_similar')
 def test_search_endpoint(mock_search_similar, mock_get_embedding):
@@ -151,3 +187,15 @@ def test_stripe_webhook_missing_signature():
     assert response.status_code == 400
     data = response.json()
     assert "stripe-signature" in data["detail"]
+
+
+@patch('main.stripe_event_store.list_events', new_callable=AsyncMock)
+def test_stripe_events_served_from_store(mock_list_events):
+    """Test the dashboard events feed reads the local store with a clamped page size."""
+    mock_list_events.return_value = {"events": [], "has_more": False, "next_cursor": None}
+    
+    response = client.get("/stripe/events", params={"limit": 500, "starting_after": "evt_123"})
+    
+    assert response.status_code == 200
+    assert response.json()["has_more"] is False
+    mock_list_events.assert_awaited_once_with(100, "evt_123")
@@ -0,0 +1,362 @@
+import asyncio
+import time
+
+import pytest
+from unittest.mock import patch, AsyncMock
+
+from langgraph.checkpoint.base import empty_checkpoint
+
+from graph import nodes
+from graph.checkpointer import CheckpointerManager, checkpoint_timestamp
+from graph.intent_router import INTENT_KEYWORDS, route_message
+from graph.build_graph import build_customer_service_graph
+from graph.state import new_turn_state
+
+
+def make_state(**overrides):
+    state = {
+        "user_id": "test_user",
+        "message": "Where is my order #123?",
+        "session_id": "test_session",
+        "conversation_history": [],
+        "sentiment": {},
+        "actions_taken": [],
+        "is_final": False,
+    }
+    state.update(overrides)
+    return state
+
+
+class TestIngestNode:
+    """Test the concurrent ingest retrieval stage."""
+
+    async def test_ingest_runs_sources_concurrently(self):
+        """Test the write and reads overlap instead of running serially."""
+        def slow(result):
+            async def call(**kwargs):
+                await asyncio.sleep(0.2)
+                return result
+            return call
+
+        with patch.object(nodes.embedding_service, 'get_text_embedding', AsyncMock(return_value=[0.1] * 512)), \
+             patch.object(nodes.qdrant_service, 'store_conversation', side_effect=slow("point-1")), \
+             patch.object(nodes.qdrant_service, 'get_session_conversations', side_effect=slow([{"message": "hi"}])), \
+             patch.object(nodes.qdrant_service, 'get_user_conversations', side_effect=slow([])), \
+             patch.object(nodes.qdrant_service, 'search_similar', side_effect=slow([])):
+
+            start = asyncio.get_running_loop().time()
+            state = await nodes.ingest_node(make_state())
+            elapsed = asyncio.get_running_loop().time() - start
+
+        assert elapsed < 0.6
+        assert state["conversation_history"] == [{"message": "hi"}]
+        assert state["point_id"] == "point-1"
+        assert "stored_interaction" in state["actions_taken"]
+
+    async def test_ingest_degrades_slow_source_to_empty_context(self):
+        """Test a timed-out source yields empty context without failing the turn."""
+        async def hang(**kwargs):
+            await asyncio.sleep(10)
+
+        with patch.object(nodes, 'INGEST_RETRIEVAL_TIMEOUT_SECONDS', 0.05), \
+             patch.object(nodes.embedding_service, 'get_text_embedding', AsyncMock(return_value=[0.1] * 512)), \
+             patch.object(nodes.qdrant_service, 'store_conversation', AsyncMock(return_value="point-1")), \
+             patch.object(nodes.qdrant_service, 'get_session_conversations', side_effect=hang), \
+             patch.object(nodes.qdrant_service, 'get_user_conversations', AsyncMock(side_effect=Exception("boom"))), \
+             patch.object(nodes.qdrant_service, 'search_similar', AsyncMock(return_value=[{"id": "x"}])):
+
+            state = await nodes.ingest_node(make_state())
+
+        assert state["conversation_history"] == []
+        assert state["user_conversations"] == []
+        assert state["similar_conversations"] == [{"id": "x"}]
+        assert "stored_interaction" in state["actions_taken"]
+        assert "ingest_error: session_history timed out" in state["actions_taken"]
+        assert any(a.startswith("ingest_error: user_history failed") for a in state["actions_taken"])
+
+
+class TestMemoryNode:
+    """Test memory_node updates the point stored at ingest."""
+
+    async def test_memory_updates_ingested_point(self):
+        """Test the final response is written onto the ingest point rather than a new one."""
+        with patch.object(nodes.qdrant_service, 'update_conversation_response', AsyncMock()) as mock_update, \
+             patch.object(nodes.qdrant_service, 'store_conversation', AsyncMock()) as mock_store, \
+             patch.object(nodes.sentiment_analytics, 'record') as mock_record:
+
+            state = await nodes.memory_node(make_state(
+                point_id="point-1",
+                response="Your order has shipped.",
+                sentiment={"positive": 0.9},
+            ))
+
+        mock_update.assert_awaited_once_with(
+            point_id="point-1",
+            response="Your order has shipped.",
+            final_sentiment={"positive": 0.9},
+            wait=False,
+        )
+        mock_store.assert_not_called()
+        mock_record.assert_called_once_with({"positive": 0.9})
+        assert "memory_updated" in state["actions_taken"]
+
+    async def test_memory_skips_update_without_point(self):
+        """Test a turn whose ingest write failed is not updated."""
+        with patch.object(nodes.qdrant_service, 'update_conversation_response', AsyncMock()) as mock_update, \
+             patch.object(nodes.sentiment_analytics, 'record'):
+            state = await nodes.memory_node(make_state(response="Hi"))
+
+        mock_update.assert_not_called()
+        assert "memory_skipped: no stored interaction" in state["actions_taken"]
+
+
+class TestActionNode:
+    """Test action_node tool usage."""
+
+    async def test_order_history_uses_single_composite_call(self):
+        """Test order history resolves the customer and orders in one MCP round-trip."""
+        history = {
+            "success": True,
+            "result": {
+                "success": True,
+                "customer": {"full_name": "John Doe", "email": "john.doe@email.com"},
+                "orders": [{"order_number": "1001"}],
+                "total_orders": 1,
+            },
+        }
+
+        with patch.object(nodes.mcp_client, 'client', object()), \
+             patch.object(nodes.mcp_client, 'get_order_details', AsyncMock(return_value={"success": False})), \
+             patch.object(nodes.mcp_client, 'get_customer_with_orders', AsyncMock(return_value=history)) as mock_history, \
+             patch.object(nodes.mcp_client, 'get_customer_by_identifier', AsyncMock()) as mock_lookup:
+
+            state = await nodes.action_node(make_state(
+                user_id="support_agent",
+                message="Show me the order history for customer1",
+            ))
+
+        mock_history.assert_awaited_once_with("customer1", limit=10)
+        mock_lookup.assert_not_called()
+        assert state["customer_order_history"]["orders"] == [{"order_number": "1001"}]
+        assert "order_history_retrieved: customer1" in state["actions_taken"]
+
+    async def test_independent_actions_run_concurrently_and_merge_in_plan_order(self):
+        """Test a multi-intent turn costs the slowest action and keeps a stable actions_taken order."""
+        def slow(delay, result):
+            async def call(*args, **kwargs):
+                await asyncio.sleep(delay)
+                return result
+            return call
+
+        order = {"success": True, "result": {"success": True, "order_number": "123"}}
+        customer = {"success": True, "result": {"success": True, "email": "test_user@email.com"}}
+
+        with patch.object(nodes.mcp_client, 'get_order_details', side_effect=slow(0.3, order)), \
+             patch.object(nodes.stripe_service, 'create_payment_intent', side_effect=slow(0.2, {"id": "pi_1"})), \
+             patch.object(nodes.mcp_client, 'get_customer_info', side_effect=slow(0.1, customer)):
+
+            start = asyncio.get_running_loop().time()
+            state = await nodes.action_node(make_state(
+                user_id="test_user@email.com",
+                message="Pay the invoice for order #123 and update my account",
+            ))
+            elapsed = asyncio.get_running_loop().time() - start
+
+        assert elapsed < 0.5
+        assert state["actions_taken"] == [
+            "order_lookup_success: 123",
+            "payment_intent_created: pi_1",
+            "customer_info_retrieved",
+        ]
+        assert state["order_data"]["order_number"] == "123"
+        assert state["payment_intent"] == {"id": "pi_1"}
+        assert state["customer_data"]["email"] == "test_user@email.com"
+
+    async def test_mcp_lookups_of_a_turn_share_one_batch_request(self):
+        """Test the turn's independent MCP lookups go out in a single /tools/batch round-trip."""
+        nodes.mcp_client.invalidate()
+        batch_results = [
+            {"success": True, "result": {"success": True, "order_number": "456"}},
+            {"success": True, "result": {"success": True, "email": "test_user@email.com"}},
+        ]
+
+        with patch.object(nodes.mcp_client, '_call_tools', AsyncMock(return_value=batch_results)) as mock_batch, \
+             patch.object(nodes.mcp_client, '_call_tool', AsyncMock()) as mock_single, \
+             patch.object(nodes.stripe_service, 'create_payment_intent', AsyncMock(return_value={"id": "pi_1"})):
+
+            state = await nodes.action_node(make_state(
+                user_id="test_user@email.com",
+                message="Pay the invoice for order #456 and update my account",
+            ))
+
+        mock_single.assert_not_called()
+        mock_batch.assert_awaited_once_with([
+            {"tool_name": "get_order_details", "parameters": {"order_number": "456"}},
+            {"tool_name": "get_customer_info", "parameters": {"email": "test_user@email.com"}},
+        ])
+        assert state["actions_taken"] == [
+            "order_lookup_success: 456",
+            "payment_intent_created: pi_1",
+            "customer_info_retrieved",
+        ]
+        nodes.mcp_client.invalidate()
+
+    async def test_action_timeout_does_not_block_other_actions(self):
+        """Test a timed-out action is recorded as an error while the rest of the plan completes."""
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        with patch.object(nodes, 'ACTION_TIMEOUTS', {"order_lookup": 0.05}), \
+             patch.object(nodes.mcp_client, 'get_order_details', side_effect=hang):
+
+            state = await nodes.action_node(make_state(message="Order #123 arrived broken, I want a refund"))
+
+        assert state["actions_taken"] == ["action_error: order_lookup timed out", "refund_requested"]
+        assert "order_data" not in state
+
+    def test_parse_action_timeouts_skips_malformed_entries(self):
+        """Test bad ACTION_TIMEOUTS entries are ignored instead of failing at import."""
+        timeouts = nodes.parse_action_timeouts("payment=10, order_history=abc,=3,refund=-1,customer_info, order_lookup=2.5,")
+
+        assert timeouts == {"payment": 10.0, "order_lookup": 2.5}
+
+
+class TestIntentRouter:
+    """Test single-pass intent and entity extraction."""
+
+    def test_intents_match_keyword_substring_scans(self):
+        """Test overlapping keywords report the same intents as per-keyword substring checks."""
+        for message in [
+            "Can you show my order list?",
+            "I was charged twice, please refund and cancel my subscription",
+            "Repayment for invoice #42 failed",
+            "hello there",
+        ]:
+            lowered = message.lower()
+            expected = {
+                intent for intent, keywords in INTENT_KEYWORDS.items()
+                if any(keyword in lowered for keyword in keywords)
+            }
+            assert route_message(message).intents == expected
+
+    def test_entities(self):
+        """Test the order/invoice number and customer identifier are extracted once per message."""
+        routed = route_message("Status of order #123 and my order history for jane.smith@email.com")
+        assert routed.number == "123"
+        assert routed.customer_identifier == "jane.smith@email.com"
+
+        assert route_message("Order history for customer 7").customer_identifier == "customer7"
+        assert route_message("Where is my order?").number is None
+        assert route_message("Refund please").customer_identifier is None
+
+
+class TestCheckpointer:
+    """Test the persistent checkpointer backends and pruning."""
+
+    async def test_checkpoint_timestamp_decodes_id(self):
+        """Test checkpoint IDs decode to their creation time."""
+        checkpoint = empty_checkpoint()
+        assert abs(checkpoint_timestamp(checkpoint["id"]) - time.time()) < 5
+
+    async def test_sqlite_prune_ttl_and_history_bound(self, tmp_path):
+        """Test expired threads are dropped and per-thread history is bounded."""
+        manager = CheckpointerManager()
+        manager.backend = "sqlite"
+        manager.sqlite_path = str(tmp_path / "checkpoints.sqlite")
+        manager.prune_interval_seconds = 0
+        manager.ttl_seconds = 0.2
+        manager.max_per_thread = 2
+        saver = await manager.open()
+
+        async def put(thread_id):
+            config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+            await saver.aput(config, empty_checkpoint(), {}, {})
+
+        await put("stale")
+        await asyncio.sleep(0.3)
+        for _ in range(4):
+            await put("active")
+
+        removed = await manager.prune()
+
+        assert removed == 1
+        assert [c async for c in saver.alist({"configurable": {"thread_id": "stale"}})] == []
+        assert len([c async for c in saver.alist({"configurable": {"thread_id": "active"}})]) == 2
+
+        await manager.close()
+
+
+class TestGraph:
+    """Test the fan-out workflow topology and per-turn state."""
+
+    @staticmethod
+    def patched_services(delay=0.0):
+        def slow(result):
+            async def call(*args, **kwargs):
+                await asyncio.sleep(delay)
+                return result
+            return call
+
+        order = {"success": True, "result": {
+            "success": True, "order_number": "123", "status": "shipped", "payment_status": "paid",
+            "total_amount": "59.99", "created_at": "2024-01-15", "items": [],
+        }}
+        return [
+            patch.object(nodes.embedding_service, 'get_text_embedding', AsyncMock(return_value=[0.1] * 512)),
+            patch.object(nodes.qdrant_service, 'store_conversation', side_effect=slow("point-1")),
+            patch.object(nodes.qdrant_service, 'get_session_conversations', AsyncMock(return_value=[])),
+            patch.object(nodes.qdrant_service, 'get_user_conversations', AsyncMock(return_value=[])),
+            patch.object(nodes.qdrant_service, 'search_similar', AsyncMock(return_value=[])),
+            patch.object(nodes.qdrant_service, 'update_conversation_response', AsyncMock()),
+            patch.object(nodes.sentiment_service, 'analyze', side_effect=slow({"positive": 0.9})),
+            patch.object(nodes.mcp_client, 'get_order_details', side_effect=slow(order)),
+            patch.object(nodes.sentiment_analytics, 'record'),
+        ]
+
+    async def test_branches_run_in_parallel_and_join_before_policy(self, monkeypatch):
+        """Test ingest, sentiment and action overlap and policy sees all of their results."""
+        monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+        graph = build_customer_service_graph()
+        config = {"configurable": {"thread_id": "parallel"}}
+
+        patches = self.patched_services(delay=0.2)
+        for p in patches:
+            p.start()
+        try:
+            start = asyncio.get_running_loop().time()
+            state = await graph.ainvoke(new_turn_state("test_user", "Status of order #123?", "s1"), config=config)
+            elapsed = asyncio.get_running_loop().time() - start
+        finally:
+            for p in patches:
+                p.stop()
+
+        assert elapsed < 0.5
+        assert state["point_id"] == "point-1"
+        assert state["sentiment"] == {"positive": 0.9}
+        assert state["order_data"]["order_number"] == "123"
+        assert set(state["actions_taken"][:3]) == {"stored_interaction", "sentiment_analyzed", "order_lookup_success: 123"}
+        assert state["actions_taken"][3:] == ["response_generated", "memory_updated"]
+
+    async def test_new_turn_resets_checkpointed_state(self, monkeypatch, tmp_path):
+        """Test a second turn on a persisted thread starts from fresh actions and tool results."""
+        monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+        manager = CheckpointerManager()
+        manager.backend = "sqlite"
+        manager.sqlite_path = str(tmp_path / "checkpoints.sqlite")
+        manager.prune_interval_seconds = 0
+        graph = build_customer_service_graph(await manager.open())
+        config = {"configurable": {"thread_id": "returning"}}
+
+        patches = self.patched_services()
+        for p in patches:
+            p.start()
+        try:
+            await graph.ainvoke(new_turn_state("test_user", "Status of order #123?", "s1"), config=config)
+            state = await graph.ainvoke(new_turn_state("test_user", "Thanks!", "s1"), config=config)
+        finally:
+            for p in patches:
+                p.stop()
+            await manager.close()
+
+        assert state["order_data"] is None
+        assert state["actions_taken"] == ["stored_interaction", "sentiment_analyzed", "response_generated", "memory_updated"]
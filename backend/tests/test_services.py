@@ -1,11 +1,26 @@
 
+import asyncio
+import time
+from datetime import datetime, timedelta
+
 import pytest
 from unittest.mock import patch, AsyncMock, MagicMock
+import httpx
+import stripe
 import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, PayloadSchemaType, ScalarType, UpsertOperation, SetPayloadOperation,
+)
 
-from services.qdrant_client import QdrantService
-from services.embeddings import EmbeddingService
+from services.qdrant_client import QdrantService, PAYLOAD_INDEXES
+from services.embeddings import EmbeddingService, EmbeddingCache
 from services.stripe_client import StripeService
+from services.sentiment import SentimentService
+from services.mcp_client import MCPClient, CircuitBreaker
+from services.batching import WriteBehindBuffer
+from services.analytics import SentimentAnalytics, SCHEMA
+from services.stripe_events import StripeEventStore
 
 
 class TestQdrantService:
@@ -58,6 +73,237 @@ class TestQdrantService:
             
             mock_client.upsert.assert_called_once()
             assert isinstance(result, str)  # Should return a UUID
+    
+    async def test_store_conversation_without_write_behind(self):
+        """Test stores are upserted directly when write-behind is disabled."""
+        self.qdrant_service.write_behind = False
+        with patch.object(self.qdrant_service, 'initialize'), \
+             patch.object(self.qdrant_service, 'client') as mock_client:
+            
+            mock_client.upsert = AsyncMock()
+            
+            point_id = await self.qdrant_service.store_conversation(
+                user_id="test_user", message="Test message", embedding=[0.1] * 512
+            )
+            
+            mock_client.upsert.assert_awaited_once()
+            assert mock_client.upsert.call_args.kwargs["points"][0].id == point_id
+            assert self.qdrant_service.write_buffer.get_stats()["written"] == 0
+    
+    async def test_concurrent_stores_share_one_upsert(self):
+        """Test concurrent stores are written in a single bulk upsert."""
+        with patch.object(self.qdrant_service, 'initialize'), \
+             patch.object(self.qdrant_service, 'client') as mock_client:
+            
+            mock_client.upsert = AsyncMock()
+            
+            point_ids = await asyncio.gather(*(
+                self.qdrant_service.store_conversation(user_id=f"user_{i}", message="hi", embedding=[0.1] * 512)
+                for i in range(5)
+            ))
+            
+            mock_client.upsert.assert_awaited_once()
+            points = mock_client.upsert.call_args.kwargs["points"]
+            assert [point.id for point in points] == point_ids
+            
+            await self.qdrant_service.close()
+    
+    async def test_store_without_wait_is_flushed_on_close(self):
+        """Test wait=False returns before the write and close flushes it."""
+        with patch.object(self.qdrant_service, 'initialize'), \
+             patch.object(self.qdrant_service, 'client') as mock_client, \
+             patch.object(self.qdrant_service.write_buffer, 'flush_interval_ms', 500):
+            
+            mock_client.upsert = AsyncMock()
+            
+            point_id = await self.qdrant_service.store_conversation(
+                user_id="test_user", message="Test message", wait=False
+            )
+            mock_client.upsert.assert_not_called()
+            
+            await self.qdrant_service.close()
+            
+            mock_client.upsert.assert_awaited_once()
+            assert mock_client.upsert.call_args.kwargs["points"][0].id == point_id
+    
+    async def test_response_update_is_written_after_its_point(self):
+        """Test a response update queued behind its point goes out in the same ordered request."""
+        with patch.object(self.qdrant_service, 'initialize'), \
+             patch.object(self.qdrant_service, 'client') as mock_client:
+            
+            mock_client.batch_update_points = AsyncMock()
+            
+            point_id = await self.qdrant_service.store_conversation(
+                user_id="test_user", message="Test message", embedding=[0.1] * 512, wait=False
+            )
+            await self.qdrant_service.update_conversation_response(
+                point_id=point_id, response="Test response", final_sentiment={"positive": 0.9}
+            )
+            
+            operations = mock_client.batch_update_points.call_args.kwargs["update_operations"]
+            assert [type(operation) for operation in operations] == [UpsertOperation, SetPayloadOperation]
+            assert operations[1].set_payload.points == [point_id]
+            assert operations[1].set_payload.payload["response"] == "Test response"
+            
+            await self.qdrant_service.close()
+    
+    async def test_compact_conversations_merges_duplicate_pairs(self):
+        """Test the zero-vector duplicate's response is merged onto the ingest point."""
+        with patch.object(self.qdrant_service, 'initialize'):
+            self.qdrant_service.client = AsyncQdrantClient(location=":memory:")
+            await self.qdrant_service.client.create_collection(
+                collection_name=self.qdrant_service.collection_name,
+                vectors_config=VectorParams(size=512, distance=Distance.COSINE),
+            )
+            
+            original = await self.qdrant_service.store_conversation(
+                user_id="test_user", message="Where is my order?", embedding=[0.1] * 512, session_id="s1"
+            )
+            duplicate = await self.qdrant_service.store_conversation(
+                user_id="test_user", message="Where is my order?", response="It has shipped.",
+                sentiment={"neutral": 0.7}, session_id="s1"
+            )
+            unrelated = await self.qdrant_service.store_conversation(
+                user_id="test_user", message="Hello", embedding=[0.1] * 512, session_id="s1"
+            )
+            
+            assert await self.qdrant_service.compact_conversations(dry_run=True) == {"scanned": 3, "merged": 1}
+            assert await self.qdrant_service.compact_conversations() == {"scanned": 3, "merged": 1}
+            
+            records = await self.qdrant_service.client.retrieve(
+                self.qdrant_service.collection_name, [original, duplicate, unrelated]
+            )
+            payloads = {record.id: record.payload for record in records}
+            assert set(payloads) == {original, unrelated}
+            assert payloads[original]["response"] == "It has shipped."
+            assert payloads[original]["sentiment"] == {"neutral": 0.7}
+            assert payloads[unrelated]["response"] == ""
+            
+            await self.qdrant_service.close()
+    
+    async def test_initialize_collections_creates_missing_payload_indexes(self):
+        """Test collection init creates only the payload indexes that are missing."""
+        with patch.object(self.qdrant_service, 'initialize'), \
+             patch.object(self.qdrant_service, 'client') as mock_client:
+            
+            mock_client.get_collections = AsyncMock(return_value=MagicMock(collections=[]))
+            mock_client.create_collection = AsyncMock()
+            mock_client.get_collection = AsyncMock(return_value=MagicMock(payload_schema={"user_id": MagicMock()}))
+            mock_client.create_payload_index = AsyncMock()
+            
+            await self.qdrant_service.initialize_collections()
+            
+            created = {call.kwargs["field_name"]: call.kwargs["field_schema"]
+                       for call in mock_client.create_payload_index.await_args_list}
+            assert created == {
+                "session_id": PayloadSchemaType.KEYWORD,
+                "type": PayloadSchemaType.KEYWORD,
+                "timestamp": PayloadSchemaType.DATETIME,
+            }
+    
+    async def test_history_scrolls_return_newest_turns(self):
+        """Test history scrolls return the newest N turns, not an arbitrary page."""
+        with patch.object(self.qdrant_service, 'initialize'):
+            self.qdrant_service.client = AsyncQdrantClient(location=":memory:")
+            await self.qdrant_service.client.create_collection(
+                collection_name=self.qdrant_service.collection_name,
+                vectors_config=VectorParams(size=512, distance=Distance.COSINE),
+            )
+            
+            for i in range(6):
+                await self.qdrant_service.store_conversation(
+                    user_id="test_user", message=f"message {i}", embedding=[0.1] * 512, session_id="s1"
+                )
+            
+            user_history = await self.qdrant_service.get_user_conversations("test_user", limit=3)
+            session_history = await self.qdrant_service.get_session_conversations("s1", limit=3)
+            
+            assert [c["message"] for c in user_history] == ["message 5", "message 4", "message 3"]
+            assert [c["message"] for c in session_history] == ["message 3", "message 4", "message 5"]
+            
+            await self.qdrant_service.close()
+    
+    async def test_collection_created_with_quantization_and_storage_settings(self):
+        """Test new collections get the configured quantization, on-disk and HNSW settings."""
+        self.qdrant_service.quantization = "scalar"
+        self.qdrant_service.vectors_on_disk = True
+        self.qdrant_service.hnsw_m = 32
+        
+        with patch.object(self.qdrant_service, 'initialize'), \
+             patch.object(self.qdrant_service, 'client') as mock_client:
+            
+            mock_client.get_collections = AsyncMock(return_value=MagicMock(collections=[]))
+            mock_client.create_collection = AsyncMock()
+            mock_client.get_collection = AsyncMock(return_value=MagicMock(payload_schema=dict(PAYLOAD_INDEXES)))
+            
+            await self.qdrant_service.initialize_collections()
+            
+            kwargs = mock_client.create_collection.call_args.kwargs
+            assert kwargs["vectors_config"].on_disk is True
+            assert kwargs["hnsw_config"].m == 32
+            assert kwargs["quantization_config"].scalar.type == ScalarType.INT8
+    
+    async def test_migrate_collection_updates_only_changed_settings(self):
+        """Test migration compares the live config and sends only the differences."""
+        self.qdrant_service.quantization = "scalar"
+        self.qdrant_service.payload_on_disk = True
+        
+        config = MagicMock()
+        config.params.vectors.on_disk = None
+        config.params.on_disk_payload = False
+        config.hnsw_config.m = 16
+        config.hnsw_config.ef_construct = 100
+        config.quantization_config = None
+        
+        with patch.object(self.qdrant_service, 'initialize'), \
+             patch.object(self.qdrant_service, 'client') as mock_client:
+            
+            mock_client.get_collection = AsyncMock(return_value=MagicMock(config=config))
+            mock_client.update_collection = AsyncMock()
+            
+            assert await self.qdrant_service.migrate_collection(dry_run=True) == ["collection_params", "quantization_config"]
+            mock_client.update_collection.assert_not_called()
+            
+            await self.qdrant_service.migrate_collection()
+            
+            kwargs = mock_client.update_collection.call_args.kwargs
+            assert kwargs["collection_params"].on_disk_payload is True
+            assert kwargs["quantization_config"] == self.qdrant_service.quantization_config()
+    
+    async def test_quantized_search_rescores_candidates(self):
+        """Test searches on a quantized collection rescore oversampled candidates."""
+        self.qdrant_service.quantization = "product"
+        
+        with patch.object(self.qdrant_service, 'initialize'), \
+             patch.object(self.qdrant_service, 'client') as mock_client:
+            
+            mock_client.query_points = AsyncMock(return_value=MagicMock(points=[]))
+            
+            await self.qdrant_service.search_similar([0.1] * 512)
+            
+            search_params = mock_client.query_points.call_args.kwargs["search_params"]
+            assert search_params.quantization.rescore is True
+            assert search_params.quantization.oversampling == self.qdrant_service.search_oversampling
+    
+    async def test_write_buffer_applies_backpressure(self):
+        """Test submits wait for room once max_pending items are queued."""
+        release = asyncio.Event()
+        
+        async def slow_write(items):
+            await release.wait()
+        
+        buffer = WriteBehindBuffer(slow_write, max_batch_size=1, flush_interval_ms=0, max_pending=2)
+        await buffer.submit("a", wait=False)
+        await asyncio.sleep(0)  # "a" is taken by the (blocked) flush loop
+        await buffer.submit("b", wait=False)
+        await buffer.submit("c", wait=False)
+        
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(buffer.submit("d", wait=False), timeout=0.05)
+        
+        release.set()
+        await buffer.close()
+        assert buffer.written == 3
 
 
 class TestEmbeddingService:
@@ -99,14 +345,245 @@ class TestEmbeddingService:
     async def test_get_text_embedding(self):
         """Test text embedding generation."""
         with patch.object(self.embedding_service, 'initialize') as mock_init, \
-             patch.object(self.embedding_service, '_generate_text_embedding') as mock_generate:
+             patch.object(self.embedding_service, '_generate_text_embeddings') as mock_generate:
             
-            mock_generate.return_value = [0.1] * 512
+            mock_generate.return_value = [[0.1] * 512]
             
             result = await self.embedding_service.get_text_embedding("test text")
             
             assert len(result) == 512
             assert all(isinstance(x, float) for x in result)
+            mock_generate.assert_called_once_with(["test text"])
+    
+    async def test_concurrent_text_embeddings_are_batched(self):
+        """Test concurrent requests are coalesced into one batch and sliced per caller."""
+        texts = ["first", "second", "third"]
+        
+        with patch.object(self.embedding_service, 'initialize') as mock_init, \
+             patch.object(self.embedding_service, '_generate_text_embeddings') as mock_generate:
+            
+            mock_generate.side_effect = lambda batch: [[float(len(t))] * 512 for t in batch]
+            self.embedding_service.text_batcher.max_wait_ms = 50
+            
+            results = await asyncio.gather(
+                *(self.embedding_service.get_text_embedding(t) for t in texts)
+            )
+            
+            mock_generate.assert_called_once_with(texts)
+            assert [r[0] for r in results] == [5.0, 6.0, 5.0]
+            stats = self.embedding_service.get_stats()["text_batcher"]
+            assert stats["batch_size"]["count"] == 1
+            assert stats["latency_ms"]["count"] == 3
+        
+        await self.embedding_service.close()
+
+
+    async def test_repeated_text_embedding_served_from_cache(self):
+        """Test normalized repeat texts reuse the cached embedding."""
+        with patch.object(self.embedding_service, 'initialize') as mock_init, \
+             patch.object(self.embedding_service, '_generate_text_embeddings') as mock_generate:
+            
+            mock_generate.return_value = [[0.1] * 512]
+            
+            first = await self.embedding_service.get_text_embedding("Where is my order?")
+            second = await self.embedding_service.get_text_embedding("  where is   MY order? ")
+            
+            assert first == second
+            mock_generate.assert_called_once()
+            stats = self.embedding_service.get_stats()["cache"]
+            assert stats["hits"] == 1
+            assert stats["misses"] == 1
+        
+        await self.embedding_service.close()
+
+
+class TestEmbeddingCache:
+    """Test EmbeddingCache eviction and persistence."""
+    
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted when full."""
+        cache = EmbeddingCache(max_entries=2)
+        cache.put("a", [1.0])
+        cache.put("b", [2.0])
+        cache.get("a")
+        cache.put("c", [3.0])
+        
+        assert cache.get("b") is None
+        assert cache.get("a") == [1.0]
+        assert cache.get_stats()["evictions"] == 1
+    
+    def test_ttl_expiry(self):
+        """Test entries older than the TTL are treated as misses."""
+        cache = EmbeddingCache(ttl_seconds=60)
+        cache.put("stale", [1.0], created=time.time() - 120)
+        
+        assert cache.get("stale") is None
+        assert cache.get_stats()["entries"] == 0
+    
+    def test_spill_round_trip(self, tmp_path):
+        """Test the cache survives a save/load cycle."""
+        path = str(tmp_path / "embeddings.npz")
+        cache = EmbeddingCache(spill_path=path)
+        key = EmbeddingCache.text_key("clip", "hello")
+        cache.put(key, [0.5] * 4)
+        cache.save()
+        
+        restored = EmbeddingCache(spill_path=path)
+        restored.load()
+        
+        assert restored.get(key) == [0.5] * 4
+
+
+class TestSentimentService:
+    """Test SentimentService functionality."""
+    
+    def setup_method(self):
+        self.sentiment_service = SentimentService()
+    
+    async def test_concurrent_messages_are_batched(self):
+        """Test concurrent messages share one pipeline call off the event loop."""
+        analyzer = MagicMock(side_effect=lambda texts, **kwargs: [
+            [{"label": "positive", "score": 0.9}, {"label": "negative", "score": 0.1}]
+            for _ in texts
+        ])
+        self.sentiment_service.analyzer = analyzer
+        self.sentiment_service.batcher.max_wait_ms = 50
+        
+        results = await asyncio.gather(
+            self.sentiment_service.analyze("great service"),
+            self.sentiment_service.analyze("thanks a lot"),
+        )
+        
+        analyzer.assert_called_once()
+        assert analyzer.call_args.args[0] == ["great service", "thanks a lot"]
+        assert results[0] == {"positive": 0.9, "negative": 0.1}
+        assert self.sentiment_service.get_stats()["batcher"]["batch_size"]["count"] == 1
+        
+        await self.sentiment_service.close()
+    
+    @patch('services.sentiment.pipeline')
+    async def test_initialize_is_lazy(self, mock_pipeline):
+        """Test the pipeline is only built once, on first use."""
+        mock_pipeline.return_value = MagicMock()
+        
+        assert self.sentiment_service.analyzer is None
+        await self.sentiment_service.initialize()
+        await self.sentiment_service.initialize()
+        
+        mock_pipeline.assert_called_once()
+
+
+class TestSentimentAnalytics:
+    """Test the per-day sentiment rollups behind /analytics/sentiment."""
+    
+    async def test_summary_reads_daily_rollups(self, tmp_path):
+        """Test turns roll up into per-day averages, period totals and a trend."""
+        analytics = SentimentAnalytics()
+        analytics.sqlite_path = str(tmp_path / "analytics.sqlite")
+        analytics.flush_interval_seconds = 0
+        await analytics.open()
+        
+        now = datetime.utcnow()
+        analytics.record({"positive": 0.1, "neutral": 0.2, "negative": 0.7}, now - timedelta(days=5))
+        analytics.record({"positive": 0.9, "neutral": 0.1, "negative": 0.0}, now)
+        await analytics.flush()
+        analytics.record({"positive": 0.7, "neutral": 0.2, "negative": 0.1}, now)
+        analytics.record({"error": "model unavailable"}, now)
+        
+        summary = await analytics.get_summary(days=7)
+        
+        assert summary["total_conversations"] == 3
+        assert summary["avg_sentiment"]["positive"] == pytest.approx(1.7 / 3, abs=1e-4)
+        assert summary["trend"] == "improving"
+        assert len(summary["daily"]) == 7
+        assert summary["daily"][0]["conversations"] == 0
+        today = summary["daily"][-1]
+        assert today["date"] == now.strftime("%Y-%m-%d")
+        assert today["conversations"] == 2
+        assert today["avg_sentiment"]["positive"] == pytest.approx(0.8)
+        assert today["dominant"]["positive"] == 2
+        
+        await analytics.close()
+    
+    async def test_close_flushes_pending_turns(self, tmp_path):
+        """Test turns recorded since the last flush survive a restart."""
+        path = str(tmp_path / "analytics.sqlite")
+        analytics = SentimentAnalytics()
+        analytics.sqlite_path = path
+        analytics.flush_interval_seconds = 0
+        await analytics.open()
+        analytics.record({"positive": 0.6, "negative": 0.4})
+        await analytics.close()
+        
+        reopened = SentimentAnalytics()
+        reopened.sqlite_path = path
+        reopened.flush_interval_seconds = 0
+        
+        summary = await reopened.get_summary(days=1)
+        
+        assert summary["total_conversations"] == 1
+        assert summary["trend"] == "insufficient_data"
+        
+        await reopened.close()
+    
+    async def test_failed_flush_keeps_pending_turns(self, tmp_path):
+        """Test a flush failing partway writes nothing and retries the same turns later."""
+        analytics = SentimentAnalytics()
+        analytics.sqlite_path = str(tmp_path / "analytics.sqlite")
+        analytics.flush_interval_seconds = 0
+        await analytics.open()
+        analytics.record({"positive": 0.6, "negative": 0.4})
+        await analytics._execute("DROP TABLE sentiment_daily_labels")
+        
+        with pytest.raises(Exception):
+            await analytics.flush()
+        
+        assert await analytics._execute("SELECT COUNT(*) FROM sentiment_daily") == [(0,)]
+        assert analytics.get_stats()["pending_conversations"] == 1
+        
+        await analytics._execute(SCHEMA[1])
+        analytics.record({"positive": 0.2, "negative": 0.8})
+        summary = await analytics.get_summary(days=1)
+        
+        assert summary["total_conversations"] == 2
+        assert summary["daily"][-1]["dominant"]["positive"] == 1
+        assert summary["daily"][-1]["dominant"]["negative"] == 1
+        
+        await analytics.close()
+    
+    async def test_failed_flush_with_concurrent_reads_writes_nothing(self, tmp_path):
+        """Test reads during a failing flush do not commit part of it."""
+        analytics = SentimentAnalytics()
+        analytics.sqlite_path = str(tmp_path / "analytics.sqlite")
+        analytics.flush_interval_seconds = 0
+        await analytics.open()
+        now = datetime.utcnow()
+        for offset in range(50):
+            analytics.record({"positive": 0.6, "negative": 0.4}, timestamp=now - timedelta(days=offset))
+        await analytics._execute(
+            "CREATE TRIGGER fail_labels BEFORE INSERT ON sentiment_daily_labels "
+            "BEGIN SELECT RAISE(ABORT, 'database is locked'); END"
+        )
+        
+        async def read_while_flushing():
+            while not flush.done():
+                await analytics._execute("SELECT COUNT(*) FROM sentiment_daily")
+                await asyncio.sleep(0)
+        
+        flush = asyncio.create_task(analytics.flush())
+        await read_while_flushing()
+        with pytest.raises(Exception):
+            await flush
+        
+        assert await analytics._execute("SELECT COUNT(*) FROM sentiment_daily") == [(0,)]
+        assert analytics.get_stats()["pending_conversations"] == 50
+        
+        await analytics._execute("DROP TRIGGER fail_labels")
+        summary = await analytics.get_summary(days=60)
+        
+        assert summary["total_conversations"] == 50
+        
+        await analytics.close()
 
 
 class TestStripeService:
@@ -115,35 +592,33 @@ class TestStripeService:
     def setup_method(self):
         self.stripe_service = StripeService()
     
-    @patch('stripe.PaymentIntent.create')
-    async def test_create_payment_intent(self, mock_create):
+    def use_fake_server(self, server):
+        self.stripe_service.api_key = "sk_test_fake"
+        self.stripe_service.api_base = server.url
+    
+    async def test_create_payment_intent(self, fake_stripe):
         """Test creating a Stripe payment intent."""
-        mock_create.return_value = MagicMock(
-            id="pi_test123",
-            amount=1000,
-            currency="usd",
-            status="requires_payment_method",
-            client_secret="pi_test123_secret"
-        )
+        self.use_fake_server(fake_stripe)
         
         result = await self.stripe_service.create_payment_intent(
             amount=1000,
             currency="usd",
             metadata={"user_id": "test_user"}
         )
+        await self.stripe_service.close()
         
-        assert result["id"] == "pi_test123"
+        assert result["id"].startswith("pi_")
         assert result["amount"] == 1000
         assert result["currency"] == "usd"
-        mock_create.assert_called_once()
+        assert result["client_secret"]
+        request = fake_stripe.requests[0]
+        assert request["path"] == "/v1/payment_intents"
+        assert request["params"]["metadata"] == {"user_id": "test_user"}
+        assert request["idempotency_key"]
     
-    @patch('stripe.checkout.Session.create')
-    async def test_create_checkout_session(self, mock_create):
+    async def test_create_checkout_session(self, fake_stripe):
         """Test creating a Stripe checkout session."""
-        mock_create.return_value = MagicMock(
-            id="cs_test123",
-            url="https://checkout.stripe.com/session123"
-        )
+        self.use_fake_server(fake_stripe)
         
         price_data = {
             "currency": "usd",
@@ -156,10 +631,47 @@ class TestStripeService:
             success_url="https://example.com/success",
             cancel_url="https://example.com/cancel"
         )
+        await self.stripe_service.close()
         
-        assert result["id"] == "cs_test123"
+        assert result["id"].startswith("cs_")
         assert "url" in result
-        mock_create.assert_called_once()
+        assert fake_stripe.requests[0]["params"]["line_items"]["0"]["price_data"]["unit_amount"] == "1000"
+    
+    async def test_idempotency_key_replays_payment_intent(self, fake_stripe):
+        """Test repeating an idempotency key returns the original intent instead of a new one."""
+        self.use_fake_server(fake_stripe)
+        
+        first = await self.stripe_service.create_payment_intent(amount=1000, idempotency_key="pay:s1:123")
+        second = await self.stripe_service.create_payment_intent(amount=1000, idempotency_key="pay:s1:123")
+        await self.stripe_service.close()
+        
+        assert first["id"] == second["id"]
+        assert len(fake_stripe.events) == 1
+    
+    async def test_retries_server_errors_with_same_idempotency_key(self, fake_stripe):
+        """Test a 5xx is retried with the same idempotency key and creates one intent."""
+        self.use_fake_server(fake_stripe)
+        fake_stripe.fail_next(1, status=500)
+        
+        with patch.object(stripe.HTTPXClient, '_sleep_time_seconds', return_value=0):
+            result = await self.stripe_service.create_payment_intent(amount=1000)
+        await self.stripe_service.close()
+        
+        assert result["id"].startswith("pi_")
+        assert len(fake_stripe.requests) == 2
+        assert fake_stripe.requests[0]["idempotency_key"] == fake_stripe.requests[1]["idempotency_key"]
+        assert len(fake_stripe.events) == 1
+    
+    async def test_requests_reuse_pooled_connection(self, fake_stripe):
+        """Test sequential calls share one keep-alive connection."""
+        self.use_fake_server(fake_stripe)
+        
+        for _ in range(5):
+            await self.stripe_service.create_payment_intent(amount=1000)
+        await self.stripe_service.close()
+        
+        assert len(fake_stripe.requests) == 5
+        assert fake_stripe.connections == 1
     
     @patch('stripe.Webhook.construct_event')
     def test_verify_webhook_valid(self, mock_construct):
@@ -201,23 +713,402 @@ class TestStripeService:
         # Should not raise any exceptions
         await self.stripe_service.process_webhook_event(event)
     
-    @patch('stripe.Event.list')
-    async def test_get_recent_events(self, mock_list):
-        """Test getting recent Stripe events."""
-        mock_events = MagicMock()
-        mock_events.data = [
-            MagicMock(
-                id="evt_test123",
-                type="payment_intent.succeeded",
-                created=1234567890,
-                data=MagicMock(object={"id": "pi_test123"})
-            )
+    async def test_process_webhook_event_invalidates_cached_order(self):
+        """Test payment events invalidate cached lookups for the referenced order."""
+        event = {
+            "type": "payment_intent.succeeded",
+            "data": {
+                "object": {
+                    "id": "pi_test123",
+                    "metadata": {"invoice_number": "123"},
+                    "receipt_email": "john.doe@email.com"
+                }
+            }
+        }
+        
+        with patch('services.stripe_client.mcp_client') as mock_mcp_client:
+            await self.stripe_service.process_webhook_event(event)
+        
+        mock_mcp_client.invalidate.assert_called_once_with(order_number="123", customer_email="john.doe@email.com")
+    
+    async def test_list_events(self, fake_stripe):
+        """Test listing Stripe events newest first, one page at a time."""
+        self.use_fake_server(fake_stripe)
+        first = await self.stripe_service.create_payment_intent(amount=1000)
+        second = await self.stripe_service.create_payment_intent(amount=2000)
+        
+        page, has_more = await self.stripe_service.list_events(limit=1, created_gte=0)
+        rest, rest_has_more = await self.stripe_service.list_events(limit=1, starting_after=page[0]["id"])
+        await self.stripe_service.close()
+        
+        assert page[0]["id"].startswith("evt_")
+        assert page[0]["type"] == "payment_intent.created"
+        assert page[0]["data"]["object"]["id"] == second["id"]
+        assert has_more is True
+        assert rest[0]["data"]["object"]["id"] == first["id"]
+        assert rest_has_more is False
+        assert fake_stripe.requests[-2]["params"] == {"limit": "1", "created": {"gte": "0"}}
+        assert fake_stripe.requests[-1]["params"] == {"limit": "1", "starting_after": page[0]["id"]}
+
+
+class TestStripeEventStore:
+    """Test the local Stripe event store behind /stripe/events."""
+    
+    async def open_store(self, tmp_path):
+        store = StripeEventStore()
+        store.sqlite_path = str(tmp_path / "stripe_events.sqlite")
+        store.sync_interval_seconds = 0
+        await store.open()
+        return store
+    
+    @staticmethod
+    def event(number, created, **obj):
+        return {
+            "id": f"evt_{number:03d}",
+            "type": "payment_intent.succeeded",
+            "created": created,
+            "data": {"object": {"id": f"pi_{number:03d}", "object": "payment_intent", **obj}},
+        }
+    
+    async def test_list_events_pages_trimmed_projections(self, tmp_path):
+        """Test events are deduplicated, trimmed and paged newest first by cursor."""
+        store = await self.open_store(tmp_path)
+        events = [self.event(n, 1000 + n // 2, amount=n, client_secret="secret", metadata={"invoice_number": "123"}) for n in range(5)]
+        
+        assert await store.add(events) == 5
+        assert await store.add(events[:2]) == 0
+        
+        first = await store.list_events(limit=2)
+        second = await store.list_events(limit=2, starting_after=first["next_cursor"])
+        last = await store.list_events(limit=2, starting_after=second["next_cursor"])
+        
+        ids = [event["id"] for page in (first, second, last) for event in page["events"]]
+        assert ids == ["evt_004", "evt_003", "evt_002", "evt_001", "evt_000"]
+        assert first["has_more"] is True
+        assert last["has_more"] is False
+        assert last["next_cursor"] is None
+        assert first["events"][0]["data"] == {
+            "id": "pi_004",
+            "object": "payment_intent",
+            "amount": 4,
+            "metadata": {"invoice_number": "123"},
+        }
+        
+        await store.close()
+    
+    def fake_service(self, server):
+        service = StripeService()
+        service.api_key = "sk_test_fake"
+        service.api_base = server.url
+        return service
+    
+    async def test_sync_backfills_gap_before_webhook_event(self, tmp_path, fake_stripe):
+        """Test a webhook delivered after an outage does not hide the events missed before it."""
+        service = self.fake_service(fake_stripe)
+        for amount in (1000, 2000, 3000):
+            await service.create_payment_intent(amount=amount)
+        
+        store = await self.open_store(tmp_path)
+        store.page_size = 2
+        await store.record_webhook_event(fake_stripe.events[-1])
+        
+        with patch('services.stripe_events.stripe_service', service):
+            added = await store.sync()
+            added_again = await store.sync()
+        await service.close()
+        
+        page = await store.list_events(limit=10)
+        
+        assert added == 2
+        assert added_again == 0
+        assert [event["data"]["amount"] for event in page["events"]] == [3000, 2000, 1000]
+        assert [r["params"].get("starting_after") for r in fake_stripe.requests if r["path"] == "/v1/events"][:2] == [
+            None, fake_stripe.events[1]["id"]
         ]
-        mock_list.return_value = mock_events
+        assert store.get_stats()["webhook_events"] == 1
+        
+        await store.close()
+    
+    async def test_sync_resumes_after_page_cap(self, tmp_path, fake_stripe):
+        """Test a run stopped by the page cap is continued by the next one instead of skipped."""
+        service = self.fake_service(fake_stripe)
+        for amount in (1000, 2000, 3000):
+            await service.create_payment_intent(amount=amount)
+        
+        store = await self.open_store(tmp_path)
+        store.page_size = 1
+        store.sync_max_pages = 1
+        
+        with patch('services.stripe_events.stripe_service', service):
+            added = [await store.sync() for _ in range(3)]
+            await service.create_payment_intent(amount=4000)
+            added_after_new_event = [await store.sync() for _ in range(3)]
+        await service.close()
         
-        result = await self.stripe_service.get_recent_events(limit=10)
+        page = await store.list_events(limit=10)
+        
+        assert added == [1, 1, 1]
+        assert added_after_new_event == [1, 0, 0]
+        assert [event["data"]["amount"] for event in page["events"]] == [4000, 3000, 2000, 1000]
+        
+        await store.close()
+
+
+class TestMCPClient:
+    """Test MCPClient functionality."""
+    
+    def setup_method(self):
+        self.mcp_client = MCPClient()
+    
+    async def test_call_tools_single_round_trip(self):
+        """Test batched tool calls are sent in one request and returned in order."""
+        calls = [
+            {"tool_name": "get_order_details", "parameters": {"order_number": "123"}},
+            {"tool_name": "get_support_tickets", "parameters": {"order_number": "123"}},
+        ]
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            "success": True,
+            "results": [
+                {"success": True, "result": {"order_number": "123"}},
+                {"success": False, "error": "boom"},
+            ],
+        }
+        self.mcp_client.client = AsyncMock()
+        self.mcp_client.client.post.return_value = response
+        
+        results = await self.mcp_client.call_tools(calls)
+        
+        self.mcp_client.client.post.assert_awaited_once()
+        assert self.mcp_client.client.post.call_args.args[0].endswith("/tools/batch")
+        assert results[0]["result"]["order_number"] == "123"
+        assert results[1]["success"] is False
+    
+    async def test_call_tools_server_error_fails_each_call(self):
+        """Test a failed batch request yields one error result per call."""
+        self.mcp_client.client = AsyncMock()
+        self.mcp_client.client.post.return_value = MagicMock(status_code=503, text="unavailable")
+        
+        results = await self.mcp_client.call_tools([
+            {"tool_name": "get_order_details", "parameters": {"order_number": "123"}},
+            {"tool_name": "get_customer_info", "parameters": {"email": "a@b.com"}},
+        ])
+        
+        assert len(results) == 2
+        assert all(result["success"] is False for result in results)
+    
+    def _tool_response(self, result):
+        response = MagicMock(status_code=200)
+        response.json.return_value = {"success": True, "result": result}
+        return response
+    
+    async def test_repeated_lookup_served_from_cache(self):
+        """Test identical tool calls within the TTL hit the MCP server once."""
+        self.mcp_client.client = AsyncMock()
+        self.mcp_client.client.post.return_value = self._tool_response({"success": True, "order_number": "123"})
+        
+        first = await self.mcp_client.get_order_details("123")
+        second = await self.mcp_client.call_tool("get_order_details", {"order_number": "123"})
+        
+        assert first == second
+        self.mcp_client.client.post.assert_awaited_once()
+        assert self.mcp_client.get_stats()["cache"]["hits"] == 1
+    
+    async def test_not_found_cached_but_errors_are_not(self):
+        """Test "not found" results are negatively cached while database errors are retried."""
+        self.mcp_client.client = AsyncMock()
+        self.mcp_client.client.post.side_effect = [
+            self._tool_response({"success": False, "error": "Order #999 not found"}),
+            self._tool_response({"success": False, "error": "Database error: timeout"}),
+            self._tool_response({"success": False, "error": "Database error: timeout"}),
+        ]
+        
+        await self.mcp_client.get_order_details("999")
+        await self.mcp_client.get_order_details("999")
+        await self.mcp_client.get_order_details("555")
+        await self.mcp_client.get_order_details("555")
+        
+        assert self.mcp_client.client.post.await_count == 3
+    
+    async def test_concurrent_identical_calls_are_coalesced(self):
+        """Test concurrent identical calls share one in-flight request."""
+        async def slow_post(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return self._tool_response({"success": True, "order_number": "123"})
+        
+        self.mcp_client.client = AsyncMock()
+        self.mcp_client.client.post.side_effect = slow_post
+        
+        results = await asyncio.gather(*(self.mcp_client.get_order_details("123") for _ in range(5)))
+        
+        assert all(result["result"]["order_number"] == "123" for result in results)
+        self.mcp_client.client.post.assert_awaited_once()
+        assert self.mcp_client.get_stats()["cache"]["coalesced"] == 4
+    
+    async def test_invalidate_by_order_and_customer(self):
+        """Test invalidation drops only entries tagged with the order or customer."""
+        self.mcp_client.client = AsyncMock()
+        self.mcp_client.client.post.side_effect = lambda url, json: self._tool_response({
+            "success": True,
+            "order_number": json["parameters"].get("order_number"),
+            "customer": {"email": "john.doe@email.com"},
+        })
+        
+        await self.mcp_client.get_order_details("123")
+        await self.mcp_client.get_order_details("456")
+        await self.mcp_client.get_customer_by_identifier("customer1")
+        
+        assert self.mcp_client.invalidate(order_number="123") == 1
+        assert self.mcp_client.invalidate(customer_email="JOHN.DOE@email.com") == 2
+        
+        await self.mcp_client.get_order_details("456")
+        assert self.mcp_client.client.post.await_count == 4
+    
+    async def test_call_tools_only_sends_cache_misses(self):
+        """Test batched calls are served from cache where possible."""
+        self.mcp_client.client = AsyncMock()
+        self.mcp_client.client.post.return_value = self._tool_response({"success": True, "order_number": "123"})
+        await self.mcp_client.get_order_details("123")
+        
+        batch = MagicMock(status_code=200)
+        batch.json.return_value = {"success": True, "results": [{"success": True, "result": {"tickets": []}}]}
+        self.mcp_client.client.post.return_value = batch
+        
+        results = await self.mcp_client.call_tools([
+            {"tool_name": "get_order_details", "parameters": {"order_number": "123"}},
+            {"tool_name": "get_support_tickets", "parameters": {"order_number": "123"}},
+        ])
+        
+        sent = self.mcp_client.client.post.call_args.kwargs["json"]["calls"]
+        assert [call["tool_name"] for call in sent] == ["get_support_tickets"]
+        assert results[0]["result"]["order_number"] == "123"
+        assert results[1]["result"] == {"tickets": []}
+    
+    async def test_idempotent_tool_retried_on_gateway_error(self):
+        """Test read-only tools are retried with backoff on 503 responses."""
+        self.mcp_client.retry_base_delay = 0
+        self.mcp_client.client = AsyncMock()
+        self.mcp_client.client.post.side_effect = [
+            MagicMock(status_code=503, text="unavailable"),
+            self._tool_response({"success": True, "order_number": "123"}),
+        ]
+        
+        result = await self.mcp_client.get_order_details("123")
+        
+        assert result["result"]["order_number"] == "123"
+        assert self.mcp_client.client.post.await_count == 2
+        assert self.mcp_client.get_stats()["pool"]["retries"] == 1
+    
+    async def test_non_idempotent_tool_not_retried(self):
+        """Test tools outside the read-only set are sent exactly once."""
+        self.mcp_client.retry_base_delay = 0
+        self.mcp_client.client = AsyncMock()
+        self.mcp_client.client.post.side_effect = httpx.ConnectError("refused")
+        
+        result = await self.mcp_client.call_tool("create_refund", {"order_number": "123"})
+        
+        assert result["success"] is False
+        self.mcp_client.client.post.assert_awaited_once()
+    
+    async def test_circuit_opens_after_repeated_failures(self):
+        """Test the circuit breaker fails fast once the failure threshold is reached."""
+        self.mcp_client.max_retries = 0
+        self.mcp_client.breaker = CircuitBreaker(failure_threshold=2, reset_timeout_seconds=60)
+        self.mcp_client.client = AsyncMock()
+        self.mcp_client.client.post.side_effect = httpx.ConnectError("refused")
+        
+        for order_number in ("1", "2", "3"):
+            result = await self.mcp_client.get_order_details(order_number)
+        
+        assert self.mcp_client.client.post.await_count == 2
+        assert "circuit breaker is open" in result["error"]
+        assert self.mcp_client.get_stats()["circuit_breaker"]["state"] == "open"
+    
+    async def test_circuit_half_open_trial_closes_on_success(self):
+        """Test a successful trial call after the reset timeout closes the circuit."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout_seconds=0.01)
+        breaker.record_failure()
+        assert breaker.allow() is False
+        
+        await asyncio.sleep(0.02)
+        assert breaker.allow() is True
+        assert breaker.allow() is False
+        breaker.record_success()
+        
+        assert breaker.state == "closed"
+        assert breaker.allow() is True
+    
+    async def test_batch_shares_one_request_and_survives_cancelled_caller(self):
+        """Test calls made together inside batch() share a request a timed-out caller does not cancel."""
+        self.mcp_client.client = AsyncMock()
+        
+        async def slow_batch(*args, **kwargs):
+            await asyncio.sleep(0.1)
+            response = MagicMock(status_code=200)
+            response.json.return_value = {"success": True, "results": [
+                {"success": True, "result": call["parameters"]} for call in kwargs["json"]["calls"]
+            ]}
+            return response
+        
+        self.mcp_client.client.post.side_effect = slow_batch
+        
+        with self.mcp_client.batch():
+            impatient, patient = await asyncio.gather(
+                asyncio.wait_for(self.mcp_client.get_order_details("1"), timeout=0.01),
+                self.mcp_client.get_order_details("2"),
+                return_exceptions=True,
+            )
+        
+        assert isinstance(impatient, asyncio.TimeoutError)
+        assert patient["result"]["order_number"] == "2"
+        self.mcp_client.client.post.assert_awaited_once()
+        assert self.mcp_client.client.post.call_args.args[0].endswith("/tools/batch")
+    
+    async def test_single_call_in_batch_uses_regular_path(self):
+        """Test a lone call inside batch() is sent to /tools/call."""
+        self.mcp_client.client = AsyncMock()
+        self.mcp_client.client.post.return_value = self._tool_response({"success": True, "order_number": "1"})
+        
+        with self.mcp_client.batch():
+            result = await self.mcp_client.get_order_details("1")
+        
+        assert result["result"]["order_number"] == "1"
+        assert self.mcp_client.client.post.call_args.args[0].endswith("/tools/call")
+    
+    async def test_cancelled_half_open_trial_is_released(self):
+        """Test a trial call cancelled mid-request does not leave the circuit rejecting every call."""
+        self.mcp_client.max_retries = 0
+        # Uncached calls run in the caller's task, so the action timeout cancels the request itself
+        self.mcp_client.cache.ttls = {}
+        self.mcp_client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout_seconds=0)
+        self.mcp_client.breaker.record_failure()
+        started = asyncio.Event()
+        
+        async def hang(*args, **kwargs):
+            started.set()
+            await asyncio.sleep(60)
+        
+        self.mcp_client.client = AsyncMock()
+        self.mcp_client.client.post.side_effect = hang
+        trial = asyncio.create_task(self.mcp_client.get_order_details("1"))
+        await started.wait()
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        
+        self.mcp_client.client.post.side_effect = [self._tool_response({"success": True, "order_number": "2"})]
+        result = await self.mcp_client.get_order_details("2")
+        
+        assert result["result"]["order_number"] == "2"
+        assert self.mcp_client.get_stats()["circuit_breaker"]["state"] == "closed"
+    
+    async def test_initialize_reuses_shared_client(self):
+        """Test the pooled client is created once with explicit limits and timeouts."""
+        await asyncio.gather(self.mcp_client.initialize(), self.mcp_client.initialize())
+        client = self.mcp_client.client
+        await self.mcp_client.initialize()
         
-        assert len(result) == 1
-        assert result[0]["id"] == "evt_test123"
-        assert result[0]["type"] == "payment_intent.succeeded"
-        mock_list.assert_called_once_with(limit=10)
+        assert self.mcp_client.client is client
+        assert client.timeout.connect == self.mcp_client.timeout.connect
+        await self.mcp_client.close()
+        assert self.mcp_client.client is None
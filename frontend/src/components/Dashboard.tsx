@@ -48,20 +48,13 @@ const Dashboard: React.FC<DashboardProps> = ({ systemHealth }) => {
   };
 
   const generateSentimentChart = (data: any) => {
-    // Generate mock sentiment data over time
-    const days = 7;
-    const chartData = [];
-    for (let i = days; i >= 0; i--) {
-      const date = new Date();
-      date.setDate(date.getDate() - i);
-      chartData.push({
-        date: date.toLocaleDateString(),
-        positive: 0.6 + Math.random() * 0.3,
-        neutral: 0.2 + Math.random() * 0.2,
-        negative: 0.1 + Math.random() * 0.1,
-      });
-    }
-    return chartData;
+    // One point per day from the backend's daily sentiment rollups
+    return (data.daily || []).map((day: any) => ({
+      date: new Date(`${day.date}T00:00:00Z`).toLocaleDateString(undefined, { timeZone: 'UTC' }),
+      positive: day.avg_sentiment.positive || 0,
+      neutral: day.avg_sentiment.neutral || 0,
+      negative: day.avg_sentiment.negative || 0,
+    }));
   };
 
   const performDashboardAnalysis = async (analysisType: string) => {
@@ -200,4 +200,24 @@ CREATE TRIGGER update_shipments_updated_at BEFORE UPDATE ON shipments
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
 CREATE TRIGGER update_support_tickets_updated_at BEFORE UPDATE ON support_tickets
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column(); 
\ No newline at end of file
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column(); 
+
+-- Search: trigram and full-text indexes backing order search and customer name lookup.
+-- Written idempotently so it can also be applied to an existing database; the MCP
+-- server applies the same statements at startup (SEARCH_MIGRATION in
+-- mcp_server/database_tools.py), since this file only runs when the database is created.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE customers ADD COLUMN IF NOT EXISTS full_name TEXT
+    GENERATED ALWAYS AS (first_name || ' ' || last_name) STORED;
+
+ALTER TABLE customers ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', first_name || ' ' || last_name), 'A') ||
+        setweight(to_tsvector('simple', email), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_customers_full_name_trgm ON customers USING GIN (full_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_customers_email_trgm ON customers USING GIN (email gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_customers_search_vector ON customers USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_orders_order_number_trgm ON orders USING GIN (order_number gin_trgm_ops);
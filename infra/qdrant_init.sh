@@ -57,7 +57,15 @@ curl -X PUT "$QDRANT_URL/collections/$COLLECTION_NAME/index" \
     "field_schema": "keyword"
   }'
 
-# Index for timestamp filtering
+# Index for session_id filtering
+curl -X PUT "$QDRANT_URL/collections/$COLLECTION_NAME/index" \
+  -H "Content-Type: application/json" \
+  -d '{
+    "field_name": "session_id",
+    "field_schema": "keyword"
+  }'
+
+# Index for timestamp filtering and ordering
 curl -X PUT "$QDRANT_URL/collections/$COLLECTION_NAME/index" \
   -H "Content-Type: application/json" \
   -d '{
@@ -86,5 +94,5 @@ echo ""
 echo "Collection '$COLLECTION_NAME' is ready with:"
 echo "- Vector size: $VECTOR_SIZE (CLIP embeddings)"
 echo "- Distance metric: Cosine similarity"
-echo "- Indexed fields: user_id, timestamp, type"
+echo "- Indexed fields: user_id, session_id, timestamp, type"
 echo "- Optimized for conversation storage and retrieval"
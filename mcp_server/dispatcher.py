@@ -1,15 +1,17 @@
 import logging
 import asyncio
 import json
-from typing import Dict, Any, List
+import os
+from typing import Dict, Any, List, Optional
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import httpx
 
 from database_tools import db_tools
+from tool_registry import tool_registry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -61,131 +63,188 @@ class ToolRequest(BaseModel):
     parameters: Dict[str, Any]
 
 
+class BatchToolRequest(BaseModel):
+    calls: List[ToolRequest]
+
+
 class NotificationRequest(BaseModel):
     message: str
     recipient: str
     type: str = "info"
 
 
-# MCP Tool definitions
-MCP_TOOLS = {
-    "get_order_details": {
-        "name": "get_order_details",
-        "description": "Get detailed information about a specific order including items, customer details, and shipping status",
-        "inputSchema": {
-            "type": "object",
-            "properties": {
-                "order_number": {
-                    "type": "string",
-                    "description": "The order number to look up (e.g., '123', '12345')"
-                }
-            },
-            "required": ["order_number"]
-        }
+# MCP tools: each registration declares the input schema, limits and handler
+IDENTIFIER_DESCRIPTION = "Customer identifier - can be email, UUID, friendly name (e.g., 'customer123'), or customer name"
+
+
+@tool_registry.tool(
+    "get_order_details",
+    "Get detailed information about a specific order including items, customer details, and shipping status",
+    {
+        "type": "object",
+        "properties": {
+            "order_number": {
+                "type": "string",
+                "description": "The order number to look up (e.g., '123', '12345')"
+            }
+        },
+        "required": ["order_number"]
     },
-    "get_customer_orders": {
-        "name": "get_customer_orders",
-        "description": "Get recent orders for a customer by their email address",
-        "inputSchema": {
-            "type": "object",
-            "properties": {
-                "customer_email": {
-                    "type": "string",
-                    "description": "Customer's email address"
-                },
-                "limit": {
-                    "type": "integer",
-                    "description": "Maximum number of orders to return (default: 10)",
-                    "default": 10
-                }
+)
+async def get_order_details(order_number: str):
+    return await db_tools.get_order_details(order_number)
+
+
+@tool_registry.tool(
+    "get_customer_orders",
+    "Get recent orders for a customer by their email address",
+    {
+        "type": "object",
+        "properties": {
+            "customer_email": {
+                "type": "string",
+                "description": "Customer's email address"
             },
-            "required": ["customer_email"]
-        }
+            "limit": {
+                "type": "integer",
+                "description": "Maximum number of orders to return (default: 10)",
+                "default": 10
+            }
+        },
+        "required": ["customer_email"]
     },
-    "get_customer_orders_by_id": {
-        "name": "get_customer_orders_by_id",
-        "description": "Get recent orders for a customer by their customer ID (UUID)",
-        "inputSchema": {
-            "type": "object",
-            "properties": {
-                "customer_id": {
-                    "type": "string",
-                    "description": "Customer's UUID identifier"
-                },
-                "limit": {
-                    "type": "integer",
-                    "description": "Maximum number of orders to return (default: 10)",
-                    "default": 10
-                }
+)
+async def get_customer_orders(customer_email: str, limit: int):
+    return await db_tools.get_customer_orders(customer_email, limit)
+
+
+@tool_registry.tool(
+    "get_customer_orders_by_id",
+    "Get recent orders for a customer by their customer ID (UUID)",
+    {
+        "type": "object",
+        "properties": {
+            "customer_id": {
+                "type": "string",
+                "description": "Customer's UUID identifier"
             },
-            "required": ["customer_id"]
-        }
+            "limit": {
+                "type": "integer",
+                "description": "Maximum number of orders to return (default: 10)",
+                "default": 10
+            }
+        },
+        "required": ["customer_id"]
     },
-    "get_customer_by_identifier": {
-        "name": "get_customer_by_identifier",
-        "description": "Get customer information by various identifiers (email, customer ID, or friendly name like 'customer123')",
-        "inputSchema": {
-            "type": "object",
-            "properties": {
-                "identifier": {
-                    "type": "string",
-                    "description": "Customer identifier - can be email, UUID, friendly name (e.g., 'customer123'), or customer name"
-                }
-            },
-            "required": ["identifier"]
-        }
+)
+async def get_customer_orders_by_id(customer_id: str, limit: int):
+    return await db_tools.get_customer_orders_by_id(customer_id, limit)
+
+
+@tool_registry.tool(
+    "get_customer_by_identifier",
+    "Get customer information by various identifiers (email, customer ID, or friendly name like 'customer123')",
+    {
+        "type": "object",
+        "properties": {
+            "identifier": {
+                "type": "string",
+                "description": IDENTIFIER_DESCRIPTION
+            }
+        },
+        "required": ["identifier"]
     },
-    "get_customer_info": {
-        "name": "get_customer_info",
-        "description": "Get customer information by email address",
-        "inputSchema": {
-            "type": "object",
-            "properties": {
-                "email": {
-                    "type": "string",
-                    "description": "Customer's email address"
-                }
+)
+async def get_customer_by_identifier(identifier: str):
+    return await db_tools.get_customer_by_identifier(identifier)
+
+
+@tool_registry.tool(
+    "get_customer_with_orders",
+    "Resolve a customer by identifier (email, customer ID, friendly name, or name) and return their recent orders in one call",
+    {
+        "type": "object",
+        "properties": {
+            "identifier": {
+                "type": "string",
+                "description": IDENTIFIER_DESCRIPTION
             },
-            "required": ["email"]
-        }
+            "limit": {
+                "type": "integer",
+                "description": "Maximum number of orders to return (default: 10)",
+                "default": 10
+            }
+        },
+        "required": ["identifier"]
     },
-    "get_support_tickets": {
-        "name": "get_support_tickets",
-        "description": "Get support tickets for a customer or order",
-        "inputSchema": {
-            "type": "object",
-            "properties": {
-                "customer_email": {
-                    "type": "string",
-                    "description": "Customer's email address (optional)"
-                },
-                "order_number": {
-                    "type": "string",
-                    "description": "Order number (optional)"
-                }
+)
+async def get_customer_with_orders(identifier: str, limit: int):
+    return await db_tools.get_customer_with_orders(identifier, limit)
+
+
+@tool_registry.tool(
+    "get_customer_info",
+    "Get customer information by email address",
+    {
+        "type": "object",
+        "properties": {
+            "email": {
+                "type": "string",
+                "description": "Customer's email address"
             }
-        }
+        },
+        "required": ["email"]
     },
-    "search_orders": {
-        "name": "search_orders",
-        "description": "Search orders by order number, customer name, or email",
-        "inputSchema": {
-            "type": "object",
-            "properties": {
-                "query": {
-                    "type": "string",
-                    "description": "Search query (order number, customer name, or email)"
-                },
-                "limit": {
-                    "type": "integer",
-                    "description": "Maximum number of results to return (default: 10)",
-                    "default": 10
-                }
+)
+async def get_customer_info(email: str):
+    return await db_tools.get_customer_by_email(email)
+
+
+@tool_registry.tool(
+    "get_support_tickets",
+    "Get support tickets for a customer or order",
+    {
+        "type": "object",
+        "properties": {
+            "customer_email": {
+                "type": "string",
+                "description": "Customer's email address (optional)"
             },
-            "required": ["query"]
+            "order_number": {
+                "type": "string",
+                "description": "Order number (optional)"
+            }
         }
-    }
-}
+    },
+)
+async def get_support_tickets(customer_email: Optional[str], order_number: Optional[str]):
+    return await db_tools.get_support_tickets(customer_email, order_number)
+
+
+@tool_registry.tool(
+    "search_orders",
+    "Search orders by order number, customer name, or email",
+    {
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "Search query (order number, customer name, or email)"
+            },
+            "limit": {
+                "type": "integer",
+                "description": "Maximum number of results to return (default: 10)",
+                "default": 10
+            }
+        },
+        "required": ["query"]
+    },
+    # Ranked search is the heaviest query; keep it from crowding out lookups
+    max_concurrency=4,
+    timeout=10,
+)
+async def search_orders(query: str, limit: int):
+    return await db_tools.search_orders(query, limit)
 
 
 @app.get("/")
@@ -197,14 +256,20 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "tools_available": len(MCP_TOOLS)}
+    return {"status": "healthy", "tools_available": len(tool_registry)}
+
+
+@app.get("/stats")
+async def get_stats():
+    """Prepared statement call counts and latency."""
+    return db_tools.get_stats()
 
 
 @app.get("/tools")
 async def list_tools():
     """List available MCP tools."""
     return {
-        "tools": list(MCP_TOOLS.values())
+        "tools": tool_registry.list_tools()
     }
 
 
@@ -212,92 +277,75 @@ async def list_tools():
 async def call_tool(request: ToolRequest):
     """Call a specific MCP tool."""
     tool_name = request.tool_name
-    parameters = request.parameters
     
-    logger.info(f"Calling tool: {tool_name} with parameters: {parameters}")
+    logger.info(f"Calling tool: {tool_name} with parameters: {request.parameters}")
     
     try:
-        if tool_name == "get_order_details":
-            order_number = parameters.get("order_number")
-            if not order_number:
-                raise HTTPException(status_code=400, detail="order_number is required")
-            
-            result = await db_tools.get_order_details(order_number)
-            return {"success": True, "result": result}
-        
-        elif tool_name == "get_customer_orders":
-            customer_email = parameters.get("customer_email")
-            limit = parameters.get("limit", 10)
-            if not customer_email:
-                raise HTTPException(status_code=400, detail="customer_email is required")
-            
-            result = await db_tools.get_customer_orders(customer_email, limit)
-            return {"success": True, "result": result}
-        
-        elif tool_name == "get_customer_orders_by_id":
-            customer_id = parameters.get("customer_id")
-            limit = parameters.get("limit", 10)
-            if not customer_id:
-                raise HTTPException(status_code=400, detail="customer_id is required")
-            
-            result = await db_tools.get_customer_orders_by_id(customer_id, limit)
-            return {"success": True, "result": result}
-        
-        elif tool_name == "get_customer_by_identifier":
-            identifier = parameters.get("identifier")
-            if not identifier:
-                raise HTTPException(status_code=400, detail="identifier is required")
-            
-            result = await db_tools.get_customer_by_identifier(identifier)
-            return {"success": True, "result": result}
-        
-        elif tool_name == "get_customer_info":
-            email = parameters.get("email")
-            if not email:
-                raise HTTPException(status_code=400, detail="email is required")
-            
-            result = await db_tools.get_customer_by_email(email)
-            return {"success": True, "result": result}
-        
-        elif tool_name == "get_support_tickets":
-            customer_email = parameters.get("customer_email")
-            order_number = parameters.get("order_number")
-            
-            result = await db_tools.get_support_tickets(customer_email, order_number)
-            return {"success": True, "result": result}
-        
-        elif tool_name == "search_orders":
-            query = parameters.get("query")
-            limit = parameters.get("limit", 10)
-            if not query:
-                raise HTTPException(status_code=400, detail="query is required")
-            
-            result = await db_tools.search_orders(query, limit)
-            return {"success": True, "result": result}
-        
-        else:
-            raise HTTPException(status_code=404, detail=f"Tool '{tool_name}' not found")
+        result = await tool_registry.call(tool_name, request.parameters)
+        return {"success": True, "result": result}
     
     except Exception as e:
         logger.error(f"Error calling tool {tool_name}: {e}")
         return {"success": False, "error": str(e)}
 
 
+@app.get("/tools/stats")
+async def get_tool_stats():
+    """Per-tool call counts, latency, errors and concurrency."""
+    return {"tools": tool_registry.get_stats()}
+
+
+# Upper bound on calls per batch so one request cannot monopolize the connection pool
+MAX_BATCH_TOOL_CALLS = int(os.getenv("MAX_BATCH_TOOL_CALLS", "20"))
+
+
+@app.post("/tools/batch")
+async def call_tools_batch(request: BatchToolRequest):
+    """
+    Call several MCP tools in one request.
+    
+    Calls run concurrently against the database pool. Results are returned in
+    request order, each in the same shape as /tools/call, so one failing call
+    does not affect the others.
+    """
+    if len(request.calls) > MAX_BATCH_TOOL_CALLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_TOOL_CALLS} tool calls are allowed per batch"
+        )
+    
+    logger.info(f"Calling {len(request.calls)} tools in batch: {[call.tool_name for call in request.calls]}")
+    
+    results = await asyncio.gather(*(call_tool(call) for call in request.calls))
+    return {"success": True, "results": results}
+
+
+WORKER_URL = os.getenv("WORKER_URL", "http://localhost:8002")
+
+# Worker task priorities (higher runs first)
+TASK_PRIORITIES = {"low": 0, "medium": 1, "high": 2}
+
+
 # Legacy endpoints for backward compatibility
 @app.post("/_queue")
-async def queue_task(request: TaskRequest, background_tasks: BackgroundTasks):
-    """Queue a task for processing."""
+async def queue_task(request: TaskRequest):
+    """Queue a task on the worker's durable task queue."""
     logger.info(f"Queuing task: {request.task_type}")
     
-    # For now, just return success - can be extended for actual task queuing
-    task_id = f"task_{request.task_type}_{asyncio.get_event_loop().time()}"
-    
-    return {
-        "task_id": task_id,
-        "status": "queued",
-        "task_type": request.task_type,
-        "priority": request.priority
-    }
+    try:
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            response = await client.post(f"{WORKER_URL}/tasks", json={
+                "task_type": request.task_type,
+                "payload": request.payload,
+                "priority": TASK_PRIORITIES.get(request.priority, TASK_PRIORITIES["medium"]),
+            })
+            response.raise_for_status()
+            return response.json()
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=e.response.text)
+    except httpx.HTTPError as e:
+        logger.error(f"Error queuing task {request.task_type}: {e}")
+        raise HTTPException(status_code=503, detail=f"Worker unavailable: {str(e)}")
 
 
 @app.post("/webhook")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The MCP server runs as a flat directory of modules rather than a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
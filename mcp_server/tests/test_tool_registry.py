@@ -0,0 +1,234 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+from tool_registry import (
+    Tool,
+    ToolRegistry,
+    ToolNotFoundError,
+    ToolTimeoutError,
+    ToolValidationError,
+    compile_schema,
+    format_validation_error,
+)
+
+ORDERS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "customer_email": {"type": "string"},
+        "limit": {"type": "integer", "default": 10},
+        "include_items": {"type": "boolean"},
+    },
+    "required": ["customer_email"],
+}
+
+
+def make_tool(handler, max_concurrency=10, timeout=5.0, input_schema=None):
+    return Tool(
+        "get_customer_orders",
+        "Get recent orders for a customer",
+        input_schema or ORDERS_SCHEMA,
+        handler,
+        max_concurrency=max_concurrency,
+        timeout=timeout,
+    )
+
+
+class TestCompileSchema:
+    """Test compiling tool input schemas into validators."""
+    
+    def setup_method(self):
+        self.model = compile_schema("get_customer_orders", ORDERS_SCHEMA)
+    
+    def test_optional_fields_take_schema_defaults(self):
+        """Missing optional fields get their schema default, or None without one."""
+        arguments = self.model.model_validate({"customer_email": "a@example.com"}).model_dump()
+        assert arguments == {"customer_email": "a@example.com", "limit": 10, "include_items": None}
+    
+    def test_values_are_coerced_to_schema_types(self):
+        """Values are coerced to the schema type where pydantic allows it."""
+        arguments = self.model.model_validate({"customer_email": "a@example.com", "limit": "5"}).model_dump()
+        assert arguments["limit"] == 5
+    
+    def test_missing_required_field(self):
+        """A missing required field is reported as required."""
+        with pytest.raises(ValidationError) as exc_info:
+            self.model.model_validate({"limit": 5})
+        assert format_validation_error(exc_info.value) == "customer_email is required"
+    
+    def test_empty_required_string(self):
+        """An empty required string is reported the same way as a missing one."""
+        with pytest.raises(ValidationError) as exc_info:
+            self.model.model_validate({"customer_email": ""})
+        assert format_validation_error(exc_info.value) == "customer_email is required"
+    
+    def test_empty_optional_string_is_allowed(self):
+        """Only required strings must be non-empty."""
+        model = compile_schema("search", {"properties": {"query": {"type": "string"}}})
+        assert model.model_validate({"query": ""}).model_dump() == {"query": ""}
+    
+    def test_wrong_type_reports_field_and_message(self):
+        """Type errors name the field and keep pydantic's message; several errors are joined."""
+        with pytest.raises(ValidationError) as exc_info:
+            self.model.model_validate({"limit": "many"})
+        message = format_validation_error(exc_info.value)
+        assert message.startswith("customer_email is required; limit: ")
+        assert "integer" in message
+    
+    def test_unknown_type_accepts_any_value(self):
+        """Properties without a known JSON schema type are passed through unchecked."""
+        model = compile_schema("lookup", {"properties": {"filter": {}}, "required": ["filter"]})
+        assert model.model_validate({"filter": {"status": "shipped"}}).model_dump() == {"filter": {"status": "shipped"}}
+
+
+class TestTool:
+    """Test tool calls, limits and statistics."""
+    
+    async def test_call_passes_validated_arguments(self):
+        """The handler receives validated arguments with defaults filled in."""
+        received = {}
+        
+        async def handler(**kwargs):
+            received.update(kwargs)
+            return {"success": True}
+        
+        tool = make_tool(handler)
+        assert await tool.call({"customer_email": "a@example.com", "limit": "3"}) == {"success": True}
+        assert received == {"customer_email": "a@example.com", "limit": 3, "include_items": None}
+        stats = tool.get_stats()
+        assert stats["calls"] == 1
+        assert stats["errors"] == 0
+        assert stats["in_flight"] == 0
+    
+    async def test_invalid_parameters_do_not_reach_handler(self):
+        """Validation failures raise ToolValidationError and are counted apart from calls."""
+        handler_calls = []
+        
+        async def handler(**kwargs):
+            handler_calls.append(kwargs)
+            return {}
+        
+        tool = make_tool(handler)
+        with pytest.raises(ToolValidationError, match="customer_email is required"):
+            await tool.call({"customer_email": ""})
+        
+        assert handler_calls == []
+        stats = tool.get_stats()
+        assert stats["invalid"] == 1
+        assert stats["calls"] == 0
+    
+    async def test_timeout_is_counted(self):
+        """A call running past the tool timeout raises ToolTimeoutError and counts as an error."""
+        async def hang(**kwargs):
+            await asyncio.Event().wait()
+        
+        tool = make_tool(hang, timeout=0.05)
+        with pytest.raises(ToolTimeoutError, match="timed out after 0.05s"):
+            await tool.call({"customer_email": "a@example.com"})
+        
+        stats = tool.get_stats()
+        assert stats["calls"] == 1
+        assert stats["timeouts"] == 1
+        assert stats["errors"] == 1
+        assert stats["in_flight"] == 0
+        assert stats["max_ms"] >= 50
+    
+    async def test_timeout_covers_waiting_for_a_slot(self):
+        """A call queued behind a full concurrency limit times out too."""
+        release = asyncio.Event()
+        
+        async def block(**kwargs):
+            await release.wait()
+            return {"success": True}
+        
+        tool = make_tool(block, max_concurrency=1, timeout=0.2)
+        holder = asyncio.create_task(tool.call({"customer_email": "a@example.com"}))
+        await asyncio.sleep(0.01)
+        
+        tool.timeout = 0.05
+        with pytest.raises(ToolTimeoutError):
+            await tool.call({"customer_email": "b@example.com"})
+        
+        release.set()
+        assert await holder == {"success": True}
+        assert tool.get_stats()["timeouts"] == 1
+    
+    async def test_concurrency_limit(self):
+        """No more than max_concurrency calls run at once; the rest wait for a slot."""
+        release = asyncio.Event()
+        peak = 0
+        
+        async def block(**kwargs):
+            nonlocal peak
+            peak = max(peak, tool.in_flight)
+            await release.wait()
+            return {"success": True}
+        
+        tool = make_tool(block, max_concurrency=2)
+        calls = [asyncio.create_task(tool.call({"customer_email": f"{i}@example.com"})) for i in range(5)]
+        await asyncio.sleep(0.01)
+        
+        assert tool.get_stats()["in_flight"] == 2
+        release.set()
+        await asyncio.gather(*calls)
+        
+        stats = tool.get_stats()
+        assert peak == 2
+        assert stats["in_flight"] == 0
+        assert stats["calls"] == 5
+        assert stats["max_concurrency"] == 2
+    
+    async def test_handler_error_is_counted(self):
+        """Handler exceptions propagate and count as errors but not timeouts."""
+        async def fail(**kwargs):
+            raise RuntimeError("database unavailable")
+        
+        tool = make_tool(fail)
+        with pytest.raises(RuntimeError):
+            await tool.call({"customer_email": "a@example.com"})
+        
+        stats = tool.get_stats()
+        assert stats["errors"] == 1
+        assert stats["timeouts"] == 0
+        assert stats["in_flight"] == 0
+
+
+class TestToolRegistry:
+    """Test tool registration and dispatch."""
+    
+    async def test_dispatch_and_stats(self):
+        """Registered tools are listed, dispatched by name and reported in stats."""
+        registry = ToolRegistry()
+        
+        @registry.tool("get_customer_orders", "Get recent orders", ORDERS_SCHEMA, max_concurrency=3, timeout=2)
+        async def get_customer_orders(customer_email: str, limit: int, include_items: bool):
+            return {"success": True, "limit": limit}
+        
+        assert len(registry) == 1
+        assert registry.list_tools() == [
+            {"name": "get_customer_orders", "description": "Get recent orders", "inputSchema": ORDERS_SCHEMA}
+        ]
+        assert await registry.call("get_customer_orders", {"customer_email": "a@example.com"}) == {
+            "success": True,
+            "limit": 10,
+        }
+        stats = registry.get_stats()["get_customer_orders"]
+        assert stats["calls"] == 1
+        assert stats["max_concurrency"] == 3
+        assert stats["timeout_seconds"] == 2
+    
+    async def test_unknown_tool(self):
+        """Calling an unregistered tool raises ToolNotFoundError."""
+        with pytest.raises(ToolNotFoundError):
+            await ToolRegistry().call("missing", {})
+    
+    def test_duplicate_registration(self):
+        """A tool name can only be registered once."""
+        async def handler(**kwargs):
+            return {}
+        
+        registry = ToolRegistry()
+        registry.tool("get_order_details", "Get an order", {})(handler)
+        with pytest.raises(ValueError):
+            registry.tool("get_order_details", "Get an order", {})(handler)
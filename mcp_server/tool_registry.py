@@ -0,0 +1,213 @@
+"""
+Table-driven registry of MCP tools.
+Each tool is registered once with its handler, input schema, concurrency limit and timeout.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type
+
+from pydantic import BaseModel, Field, ValidationError, create_model
+
+logger = logging.getLogger(__name__)
+
+# JSON schema types used by tool input schemas
+SCHEMA_TYPES = {
+    "string": str,
+    "integer": int,
+    "number": float,
+    "boolean": bool,
+    "object": Dict[str, Any],
+    "array": List[Any],
+}
+
+DEFAULT_TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "10"))
+DEFAULT_TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "30"))
+
+
+class ToolNotFoundError(Exception):
+    """Raised when a call names a tool that is not registered."""
+
+
+class ToolValidationError(Exception):
+    """Raised when tool parameters do not match the tool's input schema."""
+
+
+class ToolTimeoutError(Exception):
+    """Raised when a tool call exceeds its timeout."""
+
+
+def compile_schema(name: str, input_schema: Dict[str, Any]) -> Type[BaseModel]:
+    """Compile a tool's JSON input schema into a pydantic model used as its validator."""
+    required = set(input_schema.get("required", []))
+    fields = {}
+    for field_name, spec in input_schema.get("properties", {}).items():
+        field_type = SCHEMA_TYPES.get(spec.get("type"), Any)
+        if field_name in required:
+            # Required strings must also be non-empty, as the hand-written checks did
+            constraints = {"min_length": 1} if field_type is str else {}
+            fields[field_name] = (field_type, Field(..., **constraints))
+        else:
+            fields[field_name] = (Optional[field_type], spec.get("default"))
+    return create_model(f"{name}_parameters", **fields)
+
+
+def format_validation_error(error: ValidationError) -> str:
+    """Summarize a pydantic validation error the way the tools report missing parameters."""
+    messages = []
+    for detail in error.errors():
+        field_name = ".".join(str(part) for part in detail["loc"])
+        if detail["type"] in ("missing", "string_too_short"):
+            messages.append(f"{field_name} is required")
+        else:
+            messages.append(f"{field_name}: {detail['msg']}")
+    return "; ".join(messages)
+
+
+class Tool:
+    """A registered tool: handler, compiled validator, limits and call statistics."""
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        input_schema: Dict[str, Any],
+        handler: Callable[..., Awaitable[Dict[str, Any]]],
+        max_concurrency: int,
+        timeout: float,
+    ):
+        self.name = name
+        self.description = description
+        self.input_schema = input_schema
+        self.handler = handler
+        self.validator = compile_schema(name, input_schema)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.invalid = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created on first use so it binds to the server's event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def validate(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return self.validator.model_validate(parameters).model_dump()
+        except ValidationError as e:
+            self.invalid += 1
+            raise ToolValidationError(format_validation_error(e))
+
+    async def _run(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        async with self.semaphore:
+            self.in_flight += 1
+            try:
+                return await self.handler(**parameters)
+            finally:
+                self.in_flight -= 1
+
+    async def call(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate parameters and run the handler within the tool's concurrency limit and timeout."""
+        arguments = self.validate(parameters)
+
+        start = time.perf_counter()
+        try:
+            # The timeout covers waiting for a concurrency slot as well as execution
+            return await asyncio.wait_for(self._run(arguments), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.errors += 1
+            raise ToolTimeoutError(f"Tool '{self.name}' timed out after {self.timeout:g}s")
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.calls += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def definition(self) -> Dict[str, Any]:
+        """MCP tool definition as listed by /tools."""
+        return {
+            "name": self.name,
+            "description": self.description,
+            "inputSchema": self.input_schema,
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "invalid": self.invalid,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.timeout,
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+class ToolRegistry:
+    """Maps tool names to registered tools for O(1) dispatch."""
+
+    def __init__(self):
+        self._tools: Dict[str, Tool] = {}
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def tool(
+        self,
+        name: str,
+        description: str,
+        input_schema: Dict[str, Any],
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        """Decorator registering a handler coroutine as a tool."""
+        def register(handler: Callable[..., Awaitable[Dict[str, Any]]]):
+            if name in self._tools:
+                raise ValueError(f"Tool '{name}' is already registered")
+            self._tools[name] = Tool(
+                name,
+                description,
+                input_schema,
+                handler,
+                max_concurrency=max_concurrency or DEFAULT_TOOL_MAX_CONCURRENCY,
+                timeout=timeout or DEFAULT_TOOL_TIMEOUT_SECONDS,
+            )
+            return handler
+        return register
+
+    def get(self, name: str) -> Tool:
+        tool = self._tools.get(name)
+        if tool is None:
+            raise ToolNotFoundError(f"Tool '{name}' not found")
+        return tool
+
+    async def call(self, name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """Dispatch a call to a registered tool."""
+        return await self.get(name).call(parameters)
+
+    def list_tools(self) -> List[Dict[str, Any]]:
+        return [tool.definition() for tool in self._tools.values()]
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return per-tool latency, error and concurrency statistics."""
+        return {name: tool.get_stats() for name, tool in self._tools.items()}
+
+
+# Global tool registry instance
+tool_registry = ToolRegistry()
@@ -0,0 +1,377 @@
+"""
+Durable priority task queue for the worker.
+
+Tasks are stored in a local SQLite database so queued and in-progress work
+survives restarts. A pool of async consumers claims the highest-priority
+runnable task (higher priority first, then oldest), subject to a per-task-type
+concurrency cap. Failed tasks are retried with exponential backoff and moved
+to the dead-letter list once they run out of attempts.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+DEAD_LETTER = "dead_letter"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    task_type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    result TEXT,
+    error TEXT,
+    available_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_runnable ON tasks (status, priority DESC, created_at);
+"""
+
+
+def parse_type_limits(value: str) -> Dict[str, int]:
+    """Parse a "task_type=limit,task_type=limit" override string."""
+    limits = {}
+    for item in value.split(","):
+        if "=" in item:
+            task_type, limit = item.split("=", 1)
+            limits[task_type.strip()] = int(limit)
+    return limits
+
+
+class TaskHandler:
+    """A registered task type: handler coroutine, concurrency cap and retry budget."""
+
+    def __init__(
+        self,
+        task_type: str,
+        handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        max_concurrency: int,
+        max_attempts: int,
+    ):
+        self.task_type = task_type
+        self.handler = handler
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.running = 0
+        self.completed = 0
+        self.retried = 0
+        self.dead_lettered = 0
+
+
+class TaskQueue:
+    """SQLite-backed priority queue drained by a pool of async consumers."""
+
+    def __init__(
+        self,
+        path: str = "tasks.sqlite",
+        consumers: int = 4,
+        type_limits: Optional[Dict[str, int]] = None,
+        max_attempts: int = 3,
+        retry_base_delay: float = 1.0,
+        retry_max_delay: float = 60.0,
+        task_timeout: float = 300.0,
+        poll_interval: float = 1.0,
+    ):
+        self.path = path
+        self.consumers = consumers
+        self.type_limits = type_limits or {}
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.task_timeout = task_timeout
+        self.poll_interval = poll_interval
+        self.handlers: Dict[str, TaskHandler] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        # A single thread owns the connection, so every statement runs serially
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-queue")
+        self._consumer_tasks: List[asyncio.Task] = []
+        self._claim_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def handler(self, task_type: str, max_concurrency: Optional[int] = None, max_attempts: Optional[int] = None):
+        """Decorator registering a coroutine as the handler for a task type."""
+        def register(func: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]):
+            if task_type in self.handlers:
+                raise ValueError(f"Task type '{task_type}' is already registered")
+            self.handlers[task_type] = TaskHandler(
+                task_type,
+                func,
+                max_concurrency=self.type_limits.get(task_type) or max_concurrency or self.consumers,
+                max_attempts=max_attempts or self.max_attempts,
+            )
+            return func
+        return register
+
+    async def _run(self, func: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def start(self):
+        """Open the store, requeue work interrupted by a restart and start the consumers."""
+        self._claim_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        await self._run(self._open)
+        recovered = await self._run(self._recover)
+        if recovered:
+            logger.info(f"Requeued {recovered} tasks interrupted by a restart")
+
+        self._consumer_tasks = [asyncio.create_task(self._consume()) for _ in range(self.consumers)]
+        logger.info(f"Task queue started with {self.consumers} consumers ({self.path})")
+
+    async def stop(self):
+        """Stop the consumers; tasks they were running are requeued."""
+        for task in self._consumer_tasks:
+            task.cancel()
+        await asyncio.gather(*self._consumer_tasks, return_exceptions=True)
+        self._consumer_tasks = []
+
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=False)
+
+    def _open(self):
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def _recover(self) -> int:
+        cursor = self._conn.execute(
+            "UPDATE tasks SET status = ?, updated_at = ? WHERE status = ?",
+            (QUEUED, time.time(), RUNNING),
+        )
+        self._conn.commit()
+        return cursor.rowcount
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        task = dict(row)
+        task["payload"] = json.loads(task["payload"])
+        task["result"] = json.loads(task["result"]) if task["result"] is not None else None
+        return task
+
+    async def enqueue(
+        self,
+        task_type: str,
+        payload: Dict[str, Any],
+        priority: int = 1,
+    ) -> Dict[str, Any]:
+        """Persist a task and wake a consumer; returns the stored task."""
+        if task_type not in self.handlers:
+            raise ValueError(f"Unknown task type: {task_type}")
+
+        now = time.time()
+        task = {
+            "id": uuid.uuid4().hex,
+            "task_type": task_type,
+            "payload": json.dumps(payload),
+            "priority": priority,
+            "status": QUEUED,
+            "attempts": 0,
+            "max_attempts": self.handlers[task_type].max_attempts,
+            "available_at": now,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+        def insert():
+            self._conn.execute(
+                f"INSERT INTO tasks ({', '.join(task)}) VALUES ({', '.join('?' * len(task))})",
+                tuple(task.values()),
+            )
+            self._conn.commit()
+
+        await self._run(insert)
+        self._wakeup.set()
+        return {**task, "payload": payload, "result": None, "error": None}
+
+    async def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        def select():
+            return self._conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+
+        row = await self._run(select)
+        return self._to_dict(row) if row else None
+
+    async def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Tasks that exhausted their attempts, most recent first."""
+        def select():
+            return self._conn.execute(
+                "SELECT * FROM tasks WHERE status = ? ORDER BY updated_at DESC LIMIT ?",
+                (DEAD_LETTER, limit),
+            ).fetchall()
+
+        return [self._to_dict(row) for row in await self._run(select)]
+
+    async def retry(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Move a dead-lettered task back onto the queue with a fresh retry budget."""
+        def requeue():
+            now = time.time()
+            cursor = self._conn.execute(
+                "UPDATE tasks SET status = ?, attempts = 0, available_at = ?, updated_at = ? "
+                "WHERE id = ? AND status = ?",
+                (QUEUED, now, now, task_id, DEAD_LETTER),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+        if not await self._run(requeue):
+            return None
+        self._wakeup.set()
+        return await self.get(task_id)
+
+    async def purge(self, older_than_seconds: float) -> int:
+        """Delete completed tasks last updated before the cutoff; returns tasks removed."""
+        def delete():
+            cursor = self._conn.execute(
+                "DELETE FROM tasks WHERE status = ? AND updated_at < ?",
+                (COMPLETED, time.time() - older_than_seconds),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+        return await self._run(delete)
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        """Mark the next runnable task as running, skipping task types at their cap."""
+        async with self._claim_lock:
+            saturated = [h.task_type for h in self.handlers.values() if h.running >= h.max_concurrency]
+
+            def claim():
+                now = time.time()
+                exclude = f"AND task_type NOT IN ({', '.join('?' * len(saturated))})" if saturated else ""
+                row = self._conn.execute(
+                    f"SELECT * FROM tasks WHERE status = ? AND available_at <= ? {exclude} "
+                    "ORDER BY priority DESC, created_at LIMIT 1",
+                    (QUEUED, now, *saturated),
+                ).fetchone()
+                if row is None:
+                    return None
+                self._conn.execute(
+                    "UPDATE tasks SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (RUNNING, now, row["id"]),
+                )
+                self._conn.commit()
+                return self._conn.execute("SELECT * FROM tasks WHERE id = ?", (row["id"],)).fetchone()
+
+            row = await self._run(claim)
+            if row is None:
+                return None
+            task = self._to_dict(row)
+            self.handlers[task["task_type"]].running += 1
+            return task
+
+    async def _finish(self, task_id: str, status: str, result: Any = None, error: Optional[str] = None,
+                      available_at: Optional[float] = None):
+        def update():
+            now = time.time()
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, result = ?, error = ?, available_at = COALESCE(?, available_at), "
+                "updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, available_at, now, task_id),
+            )
+            self._conn.commit()
+
+        await self._run(update)
+
+    def _backoff(self, attempts: int) -> float:
+        # Full-jitter exponential backoff
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempts - 1)))
+
+    async def _execute(self, task: Dict[str, Any]):
+        handler = self.handlers[task["task_type"]]
+        try:
+            result = await asyncio.wait_for(handler.handler(task["payload"]), timeout=self.task_timeout)
+        except asyncio.CancelledError:
+            # Shutting down: give the attempt back so the task runs again after restart
+            await asyncio.shield(self._release(task))
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            if task["attempts"] < task["max_attempts"]:
+                delay = self._backoff(task["attempts"])
+                handler.retried += 1
+                logger.warning(f"Task {task['id']} ({task['task_type']}) failed, retrying in {delay:.1f}s: {error}")
+                await self._finish(task["id"], QUEUED, error=error, available_at=time.time() + delay)
+            else:
+                handler.dead_lettered += 1
+                logger.error(f"Task {task['id']} ({task['task_type']}) moved to dead letter: {error}")
+                await self._finish(task["id"], DEAD_LETTER, error=error)
+        else:
+            handler.completed += 1
+            await self._finish(task["id"], COMPLETED, result=result)
+        finally:
+            handler.running -= 1
+            # A freed slot may unblock a task type that was at its cap
+            self._wakeup.set()
+
+    async def _release(self, task: Dict[str, Any]):
+        def update():
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, attempts = attempts - 1, updated_at = ? WHERE id = ?",
+                (QUEUED, time.time(), task["id"]),
+            )
+            self._conn.commit()
+
+        await self._run(update)
+
+    async def _consume(self):
+        """Consumer loop: claim and run tasks until cancelled."""
+        while True:
+            try:
+                task = await self._claim()
+                if task is None:
+                    # Woken by new or freed work; polling picks up delayed retries.
+                    # The event is only cleared once a consumer has woken on it, so
+                    # work signalled while this consumer was busy is not lost.
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    else:
+                        self._wakeup.clear()
+                    continue
+                await self._execute(task)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in task consumer: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Return task counts by status and per-type consumer statistics."""
+        def count():
+            return self._conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+
+        return {
+            "consumers": self.consumers,
+            "tasks": {status: total for status, total in await self._run(count)},
+            "task_types": {
+                task_type: {
+                    "running": h.running,
+                    "max_concurrency": h.max_concurrency,
+                    "max_attempts": h.max_attempts,
+                    "completed": h.completed,
+                    "retried": h.retried,
+                    "dead_lettered": h.dead_lettered,
+                }
+                for task_type, h in self.handlers.items()
+            },
+        }
@@ -0,0 +1,205 @@
+import asyncio
+
+import pytest
+
+from task_queue import TaskQueue, parse_type_limits, QUEUED, RUNNING, COMPLETED, DEAD_LETTER
+
+
+@pytest.fixture
+async def make_queue(tmp_path):
+    """Build started task queues on a temporary SQLite file; all are stopped afterwards."""
+    queues = []
+
+    async def make(handlers, **kwargs):
+        queue = TaskQueue(path=str(tmp_path / "tasks.sqlite"), **kwargs)
+        for task_type, (func, options) in handlers.items():
+            queue.handler(task_type, **options)(func)
+        await queue.start()
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        if queue._conn is not None:
+            await queue.stop()
+
+
+async def noop(payload):
+    return {"ok": True}
+
+
+async def wait_for_status(queue, task_id, status, timeout=5.0):
+    """Poll until the task reaches the status."""
+    async def poll():
+        while True:
+            task = await queue.get(task_id)
+            if task["status"] == status:
+                return task
+            await asyncio.sleep(0.01)
+
+    return await asyncio.wait_for(poll(), timeout)
+
+
+class TestTaskQueue:
+    """Test TaskQueue scheduling, retries and recovery."""
+    
+    async def test_claims_highest_priority_first(self, make_queue):
+        """Higher priority tasks are claimed first, oldest first within a priority."""
+        # No consumers: tasks are claimed by hand
+        queue = await make_queue({"analysis": (noop, {"max_concurrency": 10})}, consumers=0)
+        low = await queue.enqueue("analysis", {"n": 1}, priority=1)
+        high = await queue.enqueue("analysis", {"n": 2}, priority=5)
+        high_later = await queue.enqueue("analysis", {"n": 3}, priority=5)
+        
+        claimed = [await queue._claim() for _ in range(3)]
+        
+        assert [task["id"] for task in claimed] == [high["id"], high_later["id"], low["id"]]
+        assert all(task["status"] == RUNNING and task["attempts"] == 1 for task in claimed)
+        assert claimed[0]["payload"] == {"n": 2}
+        assert await queue._claim() is None
+    
+    async def test_type_cap_skips_saturated_type(self, make_queue):
+        """A task type at its concurrency cap does not block other types."""
+        queue = await make_queue(
+            {
+                "payment": (noop, {"max_concurrency": 1}),
+                "analysis": (noop, {"max_concurrency": 10}),
+            },
+            consumers=0,
+        )
+        first = await queue.enqueue("payment", {}, priority=5)
+        second = await queue.enqueue("payment", {}, priority=5)
+        other = await queue.enqueue("analysis", {}, priority=1)
+        
+        assert (await queue._claim())["id"] == first["id"]
+        assert (await queue._claim())["id"] == other["id"]
+        assert await queue._claim() is None
+        
+        # Finishing the running payment frees its slot
+        await queue._execute(await queue.get(first["id"]))
+        assert (await queue._claim())["id"] == second["id"]
+    
+    async def test_failing_task_is_retried_then_dead_lettered(self, make_queue):
+        """A task that keeps failing is retried and then moved to the dead-letter list."""
+        calls = []
+        
+        async def fail(payload):
+            calls.append(payload)
+            raise ValueError("boom")
+        
+        queue = await make_queue(
+            {"payment": (fail, {"max_attempts": 2})},
+            consumers=1,
+            retry_base_delay=0,
+            poll_interval=0.01,
+        )
+        task = await queue.enqueue("payment", {"amount": 100})
+        
+        dead = await wait_for_status(queue, task["id"], DEAD_LETTER)
+        
+        assert len(calls) == 2
+        assert dead["attempts"] == 2
+        assert dead["error"] == "ValueError: boom"
+        assert [t["id"] for t in await queue.dead_letters()] == [task["id"]]
+        stats = await queue.get_stats()
+        assert stats["tasks"] == {DEAD_LETTER: 1}
+        assert stats["task_types"]["payment"]["retried"] == 1
+        assert stats["task_types"]["payment"]["dead_lettered"] == 1
+        assert stats["task_types"]["payment"]["running"] == 0
+    
+    async def test_retry_requeues_dead_letter(self, make_queue):
+        """retry() gives a dead-lettered task a fresh retry budget and runs it again."""
+        calls = []
+        
+        async def flaky(payload):
+            calls.append(payload)
+            if len(calls) == 1:
+                raise ConnectionError("down")
+            return {"charged": payload["amount"]}
+        
+        queue = await make_queue(
+            {"payment": (flaky, {"max_attempts": 1})},
+            consumers=1,
+            poll_interval=0.01,
+        )
+        task = await queue.enqueue("payment", {"amount": 100})
+        await wait_for_status(queue, task["id"], DEAD_LETTER)
+        
+        requeued = await queue.retry(task["id"])
+        assert requeued["status"] in (QUEUED, RUNNING, COMPLETED)
+        
+        completed = await wait_for_status(queue, task["id"], COMPLETED)
+        assert completed["result"] == {"charged": 100}
+        assert completed["attempts"] == 1
+        assert await queue.dead_letters() == []
+        # Only dead-lettered tasks can be retried
+        assert await queue.retry(task["id"]) is None
+        assert await queue.retry("missing") is None
+    
+    async def test_recover_requeues_interrupted_run(self, make_queue):
+        """Tasks left running by a crashed process are queued again on the next start."""
+        handlers = {"analysis": (noop, {"max_concurrency": 10})}
+        crashed = await make_queue(handlers, consumers=0)
+        task = await crashed.enqueue("analysis", {"n": 1})
+        await crashed._claim()
+        # Close the store without giving the attempt back, as a crash would
+        await crashed.stop()
+        
+        restarted = await make_queue(handlers, consumers=0)
+        recovered = await restarted.get(task["id"])
+        assert recovered["status"] == QUEUED
+        assert recovered["attempts"] == 1
+        
+        claimed = await restarted._claim()
+        assert claimed["id"] == task["id"]
+        assert claimed["attempts"] == 2
+    
+    async def test_stop_releases_running_attempt(self, make_queue):
+        """Stopping the consumers requeues a running task without using up an attempt."""
+        started = asyncio.Event()
+        
+        async def hang(payload):
+            started.set()
+            await asyncio.Event().wait()
+        
+        queue = await make_queue({"analysis": (hang, {})}, consumers=1, poll_interval=0.01)
+        task = await queue.enqueue("analysis", {})
+        await asyncio.wait_for(started.wait(), 5)
+        
+        for consumer in queue._consumer_tasks:
+            consumer.cancel()
+        await asyncio.gather(*queue._consumer_tasks, return_exceptions=True)
+        
+        released = await queue.get(task["id"])
+        assert released["status"] == QUEUED
+        assert released["attempts"] == 0
+    
+    async def test_enqueue_wakes_idle_consumers(self, make_queue):
+        """Tasks enqueued while consumers sleep start without waiting for the poll interval."""
+        running = []
+        release = asyncio.Event()
+        
+        async def block(payload):
+            running.append(payload["n"])
+            await release.wait()
+            return {}
+        
+        queue = await make_queue({"analysis": (block, {})}, consumers=2, poll_interval=30)
+        # Let both consumers go idle
+        await asyncio.sleep(0.05)
+        first = await queue.enqueue("analysis", {"n": 1})
+        second = await queue.enqueue("analysis", {"n": 2})
+        
+        async def both_running():
+            while len(running) < 2:
+                await asyncio.sleep(0.01)
+        
+        await asyncio.wait_for(both_running(), 5)
+        release.set()
+        await wait_for_status(queue, first["id"], COMPLETED)
+        await wait_for_status(queue, second["id"], COMPLETED)
+    
+    def test_parse_type_limits(self):
+        """Per-type caps are read from a comma-separated override string."""
+        assert parse_type_limits("payment=1, analysis = 2") == {"payment": 1, "analysis": 2}
+        assert parse_type_limits("") == {}
@@ -9,6 +9,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
 
+from task_queue import TaskQueue, parse_type_limits
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,9 +31,24 @@ app.add_middleware(
 )
 
 
+# Completed tasks are kept this long for status lookups
+TASK_RETENTION_SECONDS = float(os.getenv("TASK_RETENTION_SECONDS", "86400"))
+
+task_queue = TaskQueue(
+    path=os.getenv("WORKER_QUEUE_PATH", "tasks.sqlite"),
+    consumers=int(os.getenv("WORKER_CONSUMERS", "4")),
+    type_limits=parse_type_limits(os.getenv("TASK_TYPE_CONCURRENCY", "")),
+    max_attempts=int(os.getenv("TASK_MAX_ATTEMPTS", "3")),
+    retry_base_delay=float(os.getenv("TASK_RETRY_BASE_DELAY_SECONDS", "1")),
+    retry_max_delay=float(os.getenv("TASK_RETRY_MAX_DELAY_SECONDS", "60")),
+    task_timeout=float(os.getenv("TASK_TIMEOUT_SECONDS", "300")),
+)
+
+
 class TaskRequest(BaseModel):
     task_type: str
     payload: Dict[str, Any]
+    # Higher values are scheduled first
     priority: int = 1
 
 
@@ -49,16 +66,13 @@ async def health_check():
 
 @app.post("/process")
 async def process_task(task: TaskRequest):
-    """Process a task asynchronously."""
+    """Process a task inline and return its result."""
     try:
         logger.info(f"Processing task: {task.task_type}")
         
-        if task.task_type == "webhook_processing":
-            result = await process_webhook_task(task.payload)
-        elif task.task_type == "conversation_analysis":
-            result = await process_conversation_analysis(task.payload)
-        elif task.task_type == "payment_processing":
-            result = await process_payment_task(task.payload)
+        handler = task_queue.handlers.get(task.task_type)
+        if handler:
+            result = await handler.handler(task.payload)
         else:
             logger.warning(f"Unknown task type: {task.task_type}")
             result = {"status": "unknown_task_type"}
@@ -71,6 +85,55 @@ async def process_task(task: TaskRequest):
         raise HTTPException(status_code=500, detail=f"Task processing failed: {str(e)}")
 
 
+@app.post("/tasks", status_code=202)
+async def enqueue_task(task: TaskRequest):
+    """Queue a task for background processing and return its ID immediately."""
+    try:
+        queued = await task_queue.enqueue(task.task_type, task.payload, priority=task.priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    logger.info(f"Queued task {queued['id']}: {task.task_type} (priority {task.priority})")
+    return {
+        "task_id": queued["id"],
+        "status": queued["status"],
+        "task_type": queued["task_type"],
+        "priority": queued["priority"],
+    }
+
+
+@app.get("/tasks/dead_letter")
+async def list_dead_letter_tasks(limit: int = 100):
+    """List tasks that exhausted their retries."""
+    tasks = await task_queue.dead_letters(limit)
+    return {"tasks": tasks, "total": len(tasks)}
+
+
+@app.get("/tasks/{task_id}")
+async def get_task(task_id: str):
+    """Get a task's status, attempts and result."""
+    task = await task_queue.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task '{task_id}' not found")
+    return task
+
+
+@app.post("/tasks/{task_id}/retry")
+async def retry_task(task_id: str):
+    """Requeue a dead-lettered task."""
+    task = await task_queue.retry(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Dead-lettered task '{task_id}' not found")
+    return task
+
+
+@app.get("/stats")
+async def get_stats():
+    """Queue depth by status and per-task-type statistics."""
+    return await task_queue.get_stats()
+
+
+@task_queue.handler("webhook_processing")
 async def process_webhook_task(payload: Dict[str, Any]) -> Dict[str, Any]:
     """Process webhook-related tasks."""
     source = payload.get("source")
@@ -127,6 +190,7 @@ async def process_customer_portal_webhook(event_type: str, data: Dict[str, Any])
     return {"status": "portal_event_processed", "event_type": event_type}
 
 
+@task_queue.handler("conversation_analysis")
 async def process_conversation_analysis(payload: Dict[str, Any]) -> Dict[str, Any]:
     """Process conversation analysis tasks."""
     user_id = payload.get("user_id")
@@ -152,6 +216,8 @@ async def process_conversation_analysis(payload: Dict[str, Any]) -> Dict[str, An
     }
 
 
+# Payments are not idempotent, so a failure goes straight to the dead letter list
+@task_queue.handler("payment_processing", max_attempts=1)
 async def process_payment_task(payload: Dict[str, Any]) -> Dict[str, Any]:
     """Process payment-related tasks."""
     user_id = payload.get("user_id")
@@ -185,6 +251,10 @@ async def background_worker():
             # Perform periodic maintenance tasks
             logger.info("Running background maintenance...")
             
+            purged = await task_queue.purge(TASK_RETENTION_SECONDS)
+            if purged:
+                logger.info(f"Purged {purged} completed tasks")
+            
             # Example tasks:
             # - Clean up old conversation data
             # - Update analytics
@@ -200,10 +270,17 @@ async def background_worker():
 @app.on_event("startup")
 async def startup_event():
     """Start background tasks when the application starts."""
+    await task_queue.start()
     logger.info("Starting background worker...")
     asyncio.create_task(background_worker())
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the task consumers; interrupted tasks are requeued."""
+    await task_queue.stop()
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "worker:app",